@@ -1,7 +1,11 @@
 from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
+from typing import NamedTuple
 from jose import JWTError, jwt
 from dotenv import load_dotenv
 import os
+import threading
+import time
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
@@ -13,6 +17,66 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+# Other worker processes see user changes after at most this many seconds
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+
+class AuthenticatedUser(NamedTuple):
+    id: int
+    username: str
+    email: str
+
+
+class UserCache:
+    """
+    Bounded LRU cache mapping verified tokens to the users they belong to.
+
+    An entry is dropped after the TTL or when its token expires, whichever
+    comes first, and explicitly when the user is changed or deleted.
+    """
+
+    def __init__(self, max_entries: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token: str, user: AuthenticatedUser, token_expires_at: float):
+        with self._lock:
+            self._entries[token] = (min(time.time() + self.ttl, token_expires_at), user)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget_user(self, user_id: int):
+        with self._lock:
+            for token in [token for token, (_, user) in self._entries.items() if user.id == user_id]:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+user_cache = UserCache()
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -21,25 +85,47 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_access_token(token: str):
+def decode_access_token(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+        if payload.get("sub") is None:
             return None
-        return username
+        return payload
     except JWTError:
         return None
+
+def verify_access_token(token: str):
+    payload = decode_access_token(token)
+    return payload["sub"] if payload else None
+
+def remember_user(token: str, user):
+    """
+    Caches the user of a freshly issued token, so its first use skips the database.
+    """
+    expires_at = jwt.get_unverified_claims(token)["exp"]
+    user_cache.put(token, AuthenticatedUser(user.id, user.username, user.email), expires_at)
+
+def forget_user(user_id: int):
+    """
+    Drops cached tokens of a user, must be called after the user is changed or deleted.
+    """
+    user_cache.forget_user(user_id)
     
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    username = verify_access_token(token)
-    if username is None:
+    user = user_cache.get(token)
+    if user is not None:
+        return user
+
+    payload = decode_access_token(token)
+    if payload is None:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
     
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
+    row = db.query(User.id, User.username, User.email).filter(User.username == payload["sub"]).first()
+    if not row:
         raise HTTPException(status_code=404, detail="User not found")
     
+    user = AuthenticatedUser(*row)
+    user_cache.put(token, user, payload["exp"])
     return user
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+from app.dataset import get_dataset_version
+from app.serialization import dumps
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+
+class CachedResponse(NamedTuple):
+    version: int
+    body: bytes
+    etag: str
+    headers: dict
+    expires_at: float
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of serialized responses.
+
+    Every entry remembers the dataset version it was built from and is only
+    served while that version is current and its TTL has not expired.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version: int):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version or entry.expires_at < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, version: int, body: bytes, headers: dict) -> CachedResponse:
+        entry = CachedResponse(
+            version=version,
+            body=body,
+            etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+            headers=headers,
+            expires_at=time.monotonic() + self.ttl,
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+response_cache = ResponseCache()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Checks an If-None-Match header against an ETag using weak comparison.
+    """
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def cached_response(request: Request, session: Session, key, build,
+                    media_type: str = "application/json", serializer=dumps) -> Response:
+    """
+    Serves a response from the cache, building and storing it on a miss.
+
+    :param request: Incoming request, used for If-None-Match.
+    :param session: Database session, used to read the dataset version.
+    :param key: Hashable cache key built from the normalized query parameters.
+    :param build: Callable returning (payload, headers). Exceptions are not cached.
+    :param media_type: Media type of the response body.
+    :param serializer: Callable turning the payload into the response body, JSON by default.
+    :return: 200 response with the body, or 304 if the client copy is current.
+    """
+    version = get_dataset_version(session)
+    entry = response_cache.get(key, version)
+    if entry is None:
+        payload, headers = build()
+        entry = response_cache.put(key, version, serializer(payload), headers)
+
+    headers = {**entry.headers, "ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type=media_type, headers=headers)
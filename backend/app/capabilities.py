@@ -0,0 +1,57 @@
+# Connector types of the TomTom Search API, the position is the bit of the type
+# in `ev_chargers.connector_mask`. Only ever append to this list: stored masks
+# depend on the order.
+CONNECTOR_TYPES = (
+    "StandardHouseholdCountrySpecific",
+    "IEC62196Type1",
+    "IEC62196Type1CCS",
+    "IEC62196Type2CableAttached",
+    "IEC62196Type2Outlet",
+    "IEC62196Type2CCS",
+    "IEC62196Type3",
+    "Chademo",
+    "GBT20234Part2",
+    "GBT20234Part3",
+    "IEC60309AC3PhaseRed",
+    "IEC60309AC1PhaseBlue",
+    "IEC60309DCWhite",
+    "Tesla",
+)
+CONNECTOR_BITS = {connector_type: 1 << bit for bit, connector_type in enumerate(CONNECTOR_TYPES)}
+# Set for connector types missing from CONNECTOR_TYPES
+OTHER_CONNECTOR_BIT = 1 << 30
+
+
+def connector_mask(connector_types) -> int | None:
+    """
+    Returns the mask of the given connector types, None if one of them has no bit.
+    """
+    mask = 0
+    for connector_type in connector_types:
+        if connector_type not in CONNECTOR_BITS:
+            return None
+        mask |= CONNECTOR_BITS[connector_type]
+    return mask
+
+
+def summarize_connectors(connectors) -> dict:
+    """
+    Computes the capability summary stored on a charger row.
+
+    :param connectors: Connector rows, dictionaries with `connector_type`,
+        `rated_power_kw` and `current_type`.
+    :return: Dictionary with `max_power_kw`, `min_power_kw` (None without rated
+        connectors), `connector_mask`, `has_ac` and `has_dc`.
+    """
+    powers = [c["rated_power_kw"] for c in connectors if c["rated_power_kw"] is not None]
+    current_types = {c["current_type"] or "" for c in connectors}
+    mask = 0
+    for connector in connectors:
+        mask |= CONNECTOR_BITS.get(connector["connector_type"], OTHER_CONNECTOR_BIT)
+    return {
+        "max_power_kw": max(powers) if powers else None,
+        "min_power_kw": min(powers) if powers else None,
+        "connector_mask": mask,
+        "has_ac": any(current_type.startswith("AC") for current_type in current_types),
+        "has_dc": "DC" in current_types,
+    }
@@ -0,0 +1,158 @@
+import threading
+import numpy as np
+from sqlalchemy.orm import Session
+from app.dataset import get_dataset_version
+from app.models import EVCharger
+
+# Zoom levels follow the Web Mercator tiling used by the map widget
+MAX_CLUSTER_ZOOM = 12
+# Grid cells per tile edge, i.e. one cell is 64px on a 256px tile
+CELLS_PER_TILE = 4
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def mercator_xy(lats: np.ndarray, lons: np.ndarray):
+    """
+    Projects coordinates to normalized Web Mercator space, both axes in [0, 1].
+    """
+    lat_rad = np.radians(np.clip(lats, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    x = (lons + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / np.pi) / 2.0
+    return x, y
+
+
+class ClusterGrid:
+    """
+    Charger clusters precomputed for every zoom level up to MAX_CLUSTER_ZOOM.
+
+    The finest level groups chargers into grid cells of 1 / (2^zoom * CELLS_PER_TILE)
+    in Mercator space. Each coarser level is built by merging 2x2 blocks of the
+    level below, so every level costs time proportional to its number of
+    occupied cells, not to the number of chargers.
+    """
+
+    def __init__(self, rows, max_zoom: int = MAX_CLUSTER_ZOOM):
+        """
+        :param rows: Iterable of (charger_id, name, latitude, longitude, max_power_kw) tuples.
+        :param max_zoom: Deepest zoom level that is served as clusters.
+        """
+        rows = list(rows)
+        self.max_zoom = max_zoom
+        self.names = {row[0]: row[1] for row in rows}
+        self.levels = {}
+        if not rows:
+            return
+
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        lats = np.array([row[2] for row in rows], dtype=np.float64)
+        lons = np.array([row[3] for row in rows], dtype=np.float64)
+        powers = np.array([row[4] if row[4] is not None else np.nan for row in rows], dtype=np.float64)
+
+        x, y = mercator_xy(lats, lons)
+        cells = 2 ** max_zoom * CELLS_PER_TILE
+        cx = np.minimum((x * cells).astype(np.int64), cells - 1)
+        cy = np.minimum((y * cells).astype(np.int64), cells - 1)
+
+        level = self._aggregate(cx, cy, np.ones(len(ids), dtype=np.int64), lats, lons, powers, ids)
+        self.levels[max_zoom] = level
+        for zoom in range(max_zoom - 1, -1, -1):
+            level = self._aggregate(
+                level["cx"] // 2, level["cy"] // 2, level["count"],
+                level["lat_sum"], level["lon_sum"], level["max_power"], level["charger_id"]
+            )
+            self.levels[zoom] = level
+
+    @staticmethod
+    def _aggregate(cx, cy, count, lat_sum, lon_sum, max_power, charger_id):
+        keys = np.stack((cx, cy), axis=1)
+        unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        n = len(unique_keys)
+
+        merged_power = np.full(n, -np.inf)
+        np.fmax.at(merged_power, inverse, max_power)
+        merged_id = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(merged_id, inverse, charger_id)
+
+        return {
+            "cx": unique_keys[:, 0],
+            "cy": unique_keys[:, 1],
+            "count": np.bincount(inverse, weights=count, minlength=n).astype(np.int64),
+            "lat_sum": np.bincount(inverse, weights=lat_sum, minlength=n),
+            "lon_sum": np.bincount(inverse, weights=lon_sum, minlength=n),
+            "max_power": np.where(np.isinf(merged_power), np.nan, merged_power),
+            "charger_id": merged_id,
+        }
+
+    def query(self, zoom: int, south: float, west: float, north: float, east: float):
+        """
+        Returns clusters and single chargers whose position falls inside the bounds.
+
+        :param zoom: Map zoom level, capped at `max_zoom`.
+        :return: Tuple (clusters, chargers) of lists of dictionaries.
+        """
+        level = self.levels.get(min(zoom, self.max_zoom))
+        if level is None:
+            return [], []
+
+        count = level["count"]
+        lats = level["lat_sum"] / count
+        lons = level["lon_sum"] / count
+        inside = np.flatnonzero((lats >= south) & (lats <= north) & (lons >= west) & (lons <= east))
+
+        clusters = []
+        chargers = []
+        for i in inside.tolist():
+            if count[i] == 1:
+                charger_id = int(level["charger_id"][i])
+                chargers.append({
+                    "id": charger_id,
+                    "name": self.names.get(charger_id),
+                    "latitude": float(lats[i]),
+                    "longitude": float(lons[i]),
+                })
+            else:
+                max_power = level["max_power"][i]
+                clusters.append({
+                    "latitude": float(lats[i]),
+                    "longitude": float(lons[i]),
+                    "count": int(count[i]),
+                    "max_power_kw": None if np.isnan(max_power) else float(max_power),
+                })
+        return clusters, chargers
+
+
+# Tuple (dataset version, grid) of the last built grid
+_grid = None
+_grid_lock = threading.Lock()
+
+
+def build_cluster_grid(session: Session) -> ClusterGrid:
+    """
+    Builds the cluster grid from the `ev_chargers` table, the power of a
+    charger taken from its capability summary.
+
+    :param session: Database session.
+    :return: ClusterGrid over all chargers.
+    """
+    rows = session.query(
+        EVCharger.id, EVCharger.name, EVCharger.latitude, EVCharger.longitude, EVCharger.max_power_kw
+    ).all()
+    return ClusterGrid(rows)
+
+
+def get_cluster_grid(session: Session) -> ClusterGrid:
+    """
+    Returns the shared grid, rebuilding it whenever the dataset version changes.
+
+    :param session: Database session used if the grid has to be (re)built.
+    """
+    global _grid
+    version = get_dataset_version(session)
+    current = _grid
+    if current is None or current[0] != version:
+        with _grid_lock:
+            if _grid is None or _grid[0] != version:
+                _grid = (version, build_cluster_grid(session))
+            current = _grid
+    return current[1]
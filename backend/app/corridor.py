@@ -0,0 +1,345 @@
+import numpy as np
+from math import pi
+from app.geo import EARTH_RADIUS_KM, haversine_km
+from app.spatial import ChargerIndex
+
+# Widest corridor searched around a route
+MAX_CORRIDOR_KM = 50.0
+# Longest accepted encoded polyline, a 2000 km route with a point every 20 m
+MAX_POLYLINE_LENGTH = 1_000_000
+# Cells of the route grid are the corridor width, but not narrower
+MIN_CELL_KM = 1.0
+# Pieces of the route group this many pieces of the level below, the lowest level are the segments
+BRANCHING = 4
+# Chargers are measured in batches of about this many (charger, piece) pairs, bounds the memory of a long route
+PAIR_BATCH = 1 << 18
+
+KM_PER_DEGREE = EARTH_RADIUS_KM * pi / 180
+# A value of an encoded polyline has at most 7 chunks of 5 bits
+MAX_CHUNKS = 7
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Decodes an encoded polyline (the Google format, used by most routing engines).
+
+    Every character carries 5 bits of a value; values are zigzag-encoded
+    differences to the previous point. Decoding is vectorized, a route of
+    100 000 points takes a few milliseconds.
+
+    :param encoded: Encoded polyline.
+    :param precision: Decimal digits of the coordinates, 5 for Google and TomTom, 6 for OSRM and Valhalla.
+    :return: Tuple (latitudes, longitudes) of arrays.
+    :raises ValueError: If the polyline is malformed.
+    """
+    try:
+        data = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    except UnicodeEncodeError:
+        raise ValueError("Polyline contains non-ASCII characters.")
+    if not len(data) or data.min() < 0 or data.max() > 63:
+        raise ValueError("Polyline contains invalid characters.")
+
+    # A chunk without the 0x20 continuation bit ends its value
+    ends = np.flatnonzero((data & 0x20) == 0)
+    if not len(ends) or ends[-1] != len(data) - 1 or len(ends) % 2:
+        raise ValueError("Polyline is truncated.")
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    if (ends - starts).max() >= MAX_CHUNKS:
+        raise ValueError("Polyline contains a value out of range.")
+
+    shifts = 5 * (np.arange(len(data)) - np.repeat(starts, ends - starts + 1))
+    values = np.add.reduceat((data & 0x1f) << shifts, starts)
+    deltas = (values >> 1) ^ -(values & 1)
+
+    coordinates = np.cumsum(deltas.reshape(-1, 2), axis=0) / 10 ** precision
+    lats, lons = coordinates[:, 0], coordinates[:, 1]
+    if np.abs(lats).max() > 90 or np.abs(lons).max() > 180:
+        raise ValueError("Polyline contains coordinates out of range.")
+    return lats, lons
+
+
+def encode_polyline(points, precision: int = 5) -> str:
+    """
+    Encodes (latitude, longitude) points as a polyline, the inverse of `decode_polyline`.
+    """
+    factor = 10 ** precision
+    chars = []
+    previous = (0, 0)
+    for point in points:
+        current = tuple(round(value * factor) for value in point)
+        for value, last in zip(current, previous):
+            delta = value - last
+            delta = ~(delta << 1) if delta < 0 else delta << 1
+            while delta >= 0x20:
+                chars.append(chr((0x20 | (delta & 0x1f)) + 63))
+                delta >>= 5
+            chars.append(chr(delta + 63))
+        previous = current
+    return "".join(chars)
+
+
+def _expand(counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Enumerates groups of the given sizes.
+
+    :return: Tuple (groups, ranks) of arrays with `counts.sum()` items: the group of each item and its rank within it.
+    """
+    groups = np.repeat(np.arange(len(counts)), counts)
+    ranks = np.arange(len(groups)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return groups, ranks
+
+
+def project(lats, lons, start_lats, start_lons, delta_lats, delta_lons, scales=None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Distances from points to segments, and where on the segments the closest points lie.
+
+    Each point and its segment are projected on a plane (equirectangular,
+    scaled at the latitude halfway between the point and the segment), the
+    error stays within a few metres up to 50 km from the segment. A distance
+    only grows with the scale of longitudes.
+
+    :param lats: Latitudes of the points.
+    :param lons: Longitudes of the points.
+    :param start_lats: Latitudes of the segment starts, aligned with the points.
+    :param start_lons: Longitudes of the segment starts.
+    :param delta_lats: Latitude from the start to the end of each segment.
+    :param delta_lons: Longitude from the start to the end of each segment.
+    :param scales: Optional scales of longitudes, instead of the cosine of the latitude halfway.
+    :return: Tuple (distances_km, fractions) of arrays, the fraction of each segment before its closest point.
+    """
+    if scales is None:
+        scales = np.cos(np.radians((lats + start_lats + delta_lats / 2) / 2))
+    start_x = (start_lons - lons) * scales
+    start_y = start_lats - lats
+    delta_x = delta_lons * scales
+    delta_y = delta_lats
+
+    # Where the perpendicular from the point meets the segment, clamped to its ends. An empty
+    # segment has a zero numerator, the tiny denominator only avoids dividing by zero.
+    squared_length = delta_x * delta_x + delta_y * delta_y + 1e-300
+    fractions = np.clip(-(start_x * delta_x + start_y * delta_y) / squared_length, 0.0, 1.0)
+    closest_x = start_x + fractions * delta_x
+    closest_y = start_y + fractions * delta_y
+    distances = np.sqrt(closest_x * closest_x + closest_y * closest_y) * KM_PER_DEGREE
+    return distances, fractions
+
+
+class RouteIndex:
+    """
+    Index over a route for finding points within a corridor around it.
+
+    The segments of the route are grouped into pieces of BRANCHING
+    consecutive segments, those into pieces of BRANCHING pieces, and so on
+    until a piece is about as long as the corridor is wide. Each piece keeps
+    its chord, the straight line between its ends, and the largest distance of
+    its points from the chord; the distance from a point to the piece is the
+    distance to the chord give or take that deviation.
+
+    The top pieces are listed in the grid cells their bounding boxes, widened
+    by the corridor, touch. A point is paired with the pieces of its cell, and
+    level by level only the pieces that can hold its closest segment are split
+    into their children, down to the segments, which are measured exactly.
+    """
+
+    def __init__(self, lats: np.ndarray, lons: np.ndarray, corridor_km: float):
+        """
+        :param lats: Latitudes of the route points, at least two.
+        :param lons: Longitudes of the route points.
+        :param corridor_km: Distance from the route within which points are searched.
+        """
+        self.corridor_km = corridor_km
+        self.cell_size = max(corridor_km, MIN_CELL_KM) / KM_PER_DEGREE
+
+        # Segments, their lengths and the route distance at their start
+        segments = len(lats) - 1
+        self.lengths = haversine_km(lats[:-1], lons[:-1], lats[1:], lons[1:])
+        self.offsets = np.concatenate(([0.0], np.cumsum(self.lengths)[:-1]))
+
+        # Level l groups BRANCHING ** l segments per piece, up to pieces about as long as the corridor is wide
+        segment_km = np.median(self.lengths)
+        sizes = [1]
+        while sizes[-1] < segments and segment_km * sizes[-1] < corridor_km:
+            sizes.append(sizes[-1] * BRANCHING)
+
+        # Buffered bounding boxes of the top pieces. The longitude margin is taken at
+        # the latitude of the box edge closest to a pole, where a degree is shortest.
+        margin_lat = corridor_km / KM_PER_DEGREE
+        starts, ends = self._pieces(sizes[-1], segments)
+        south = np.minimum(np.minimum.reduceat(lats[:-1], starts), lats[ends]) - margin_lat
+        north = np.maximum(np.maximum.reduceat(lats[:-1], starts), lats[ends]) + margin_lat
+        polar = np.minimum(np.maximum(np.abs(south), np.abs(north)), 89.0)
+        margin_lon = margin_lat / np.cos(np.radians(polar))
+        west = np.minimum(np.minimum.reduceat(lons[:-1], starts), lons[ends]) - margin_lon
+        east = np.maximum(np.maximum.reduceat(lons[:-1], starts), lons[ends]) + margin_lon
+        self.boxes = (south, west, north, east)
+
+        # Chords, deviations and scale ratios of the pieces of every level. The ends of a piece lie on its chord.
+        self.levels = []
+        for size in sizes:
+            starts, ends = self._pieces(size, segments)
+            chords = (lats[starts], lons[starts], lats[ends] - lats[starts], lons[ends] - lons[starts])
+            piece_south = np.minimum(np.minimum.reduceat(lats[:-1], starts), lats[ends])
+            piece_north = np.maximum(np.maximum.reduceat(lats[:-1], starts), lats[ends])
+            # Points measured against a piece lie in a cell touching the box of its top piece
+            top = starts // sizes[-1]
+            reach_south = south[top] - self.cell_size
+            reach_north = north[top] + self.cell_size
+            polar = np.minimum(np.maximum(np.abs(reach_south), np.abs(reach_north)), 89.0)
+
+            # Measured at the largest scale a point of the reach gets, the deviation bounds it at any scale
+            equatorial = np.where(
+                (reach_south < 0) & (reach_north > 0), 0.0, np.minimum(np.abs(reach_south), np.abs(reach_north))
+            )
+            pieces = np.arange(segments) // size
+            deviations, _ = project(
+                lats[:-1], lons[:-1], *(chord[pieces] for chord in chords), scales=np.cos(np.radians(equatorial))[pieces]
+            )
+            deviations = np.maximum.reduceat(deviations, starts)
+            # A point is measured against the segments of a piece at scales differing by up to this ratio
+            ratios = np.cos(np.radians(np.maximum(polar - (piece_north - piece_south) / 2, 0.0))) / np.cos(np.radians(polar))
+            self.levels.append((chords, deviations, ratios))
+
+        # One (cell, piece) entry per cell of every box, sorted by cell
+        first_rows, first_cols = self._cells(south, west)
+        last_rows, last_cols = self._cells(north, east)
+        widths = last_cols - first_cols + 1
+        pieces, ranks = _expand((last_rows - first_rows + 1) * widths)
+        keys = self._keys(first_rows[pieces] + ranks // widths[pieces], first_cols[pieces] + ranks % widths[pieces])
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.pieces = pieces[order]
+
+    @staticmethod
+    def _pieces(size, segments):
+        starts = np.arange(0, segments, size)
+        return starts, np.minimum(starts + size, segments)
+
+    def _cells(self, lats, lons):
+        return np.floor(lats / self.cell_size).astype(np.int64), np.floor(lons / self.cell_size).astype(np.int64)
+
+    @staticmethod
+    def _keys(rows, cols):
+        # Columns stay within +-2^20 for cells of at least MIN_CELL_KM
+        return (rows << 21) + cols
+
+    def candidates(self, lats: np.ndarray, lons: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Finds the grid entries of points.
+
+        :param lats: Latitudes of the points.
+        :param lons: Longitudes of the points.
+        :return: Tuple (positions, first, last) of arrays: the positions of the
+            points in a cell with pieces, and the range of their cell's entries
+            in `self.pieces`.
+        """
+        keys = self._keys(*self._cells(lats, lons))
+        first = np.searchsorted(self.keys, keys, side="left")
+        last = np.searchsorted(self.keys, keys, side="right")
+        positions = np.flatnonzero(last > first)
+        return positions, first[positions], last[positions]
+
+    def closest(self, lats: np.ndarray, lons: np.ndarray, points: np.ndarray, pieces: np.ndarray):
+        """
+        Finds the closest segment of each point among the given top pieces.
+
+        :param lats: Latitudes of the points.
+        :param lons: Longitudes of the points.
+        :param points: Ascending array of (point, top piece) pairs, the point half.
+        :param pieces: The piece half of the pairs.
+        :return: Tuple (points, distances_km, route_km) of arrays, for the points
+            within the corridor: the distance to the closest segment and the
+            distance along the route to the closest point on it. On a tie the
+            earliest point on the route is taken.
+        """
+        for level in range(len(self.levels) - 1, -1, -1):
+            chords, deviations, ratios = self.levels[level]
+            distances, fractions = project(lats[points], lons[points], *(chord[pieces] for chord in chords))
+            first_pairs = np.diff(points, prepend=-1) != 0
+            groups = np.flatnonzero(first_pairs)
+            group_of_pairs = np.cumsum(first_pairs) - 1
+
+            if level == 0:
+                break
+            # No segment of a piece is closer than its chord minus its deviation, the closest
+            # segment is no farther than any chord plus its deviation, give or take the scale ratio
+            deviations, ratios = deviations[pieces], ratios[pieces]
+            upper = np.minimum.reduceat((distances + deviations) * ratios, groups)
+            keep = (distances - deviations) / ratios <= np.minimum(upper, self.corridor_km)[group_of_pairs]
+            points, pieces = points[keep], pieces[keep]
+
+            children, ranks = _expand(np.minimum(BRANCHING, len(self.levels[level - 1][1]) - pieces * BRANCHING))
+            points = points[children]
+            pieces = pieces[children] * BRANCHING + ranks
+
+        route_km = self.offsets[pieces] + fractions * self.lengths[pieces]
+        closest = np.minimum.reduceat(distances, groups)
+        earliest = np.minimum.reduceat(np.where(distances == closest[group_of_pairs], route_km, np.inf), groups)
+        within = closest <= self.corridor_km
+        return points[groups[within]], closest[within], earliest[within]
+
+
+def chargers_along_route(index: ChargerIndex, lats: np.ndarray, lons: np.ndarray, corridor_km: float,
+                         allowed=None, k: int = None, after=None):
+    """
+    Finds chargers within `corridor_km` of a route, in the order the route passes them.
+
+    Candidates come from the cells of the charger index, then of the
+    RouteIndex, around the route, and are measured in vectorized batches. A
+    charger the route passes more than once is placed at its closest pass.
+
+    :param index: Index of the chargers.
+    :param lats: Latitudes of the route points.
+    :param lons: Longitudes of the route points.
+    :param corridor_km: Maximum distance from the route.
+    :param allowed: Optional set of charger IDs the result is restricted to.
+    :param k: Maximum number of chargers to return (all when None).
+    :param after: Optional (route_km, charger_id) key; only chargers ordered after it are returned.
+    :return: List of (charger_id, route_km, distance_km) tuples ordered by route_km, then ID.
+    """
+    if len(lats) == 1:
+        # A single point is a route of one empty segment
+        lats, lons = np.repeat(lats, 2), np.repeat(lons, 2)
+    if not len(index) or k == 0:
+        return []
+
+    route = RouteIndex(lats, lons, corridor_km)
+    nearby = index.within_boxes(*route.boxes)
+    positions, first, last = route.candidates(index.lats[nearby], index.lons[nearby])
+    positions = nearby[positions]
+    if allowed is not None:
+        keep = np.isin(index.ids[positions], np.fromiter(allowed, dtype=np.int64, count=len(allowed)))
+        positions, first, last = positions[keep], first[keep], last[keep]
+
+    found_positions, found_distances, found_route_km = [], [], []
+    counts = last - first
+    cumulative = np.cumsum(counts)
+    batch_start = 0
+    while batch_start < len(positions):
+        pairs_before = cumulative[batch_start] - counts[batch_start]
+        batch_stop = max(int(np.searchsorted(cumulative, pairs_before + PAIR_BATCH, side="right")), batch_start + 1)
+        batch = slice(batch_start, batch_stop)
+        batch_start = batch_stop
+
+        # Pairs of a charger and a piece of its cell, grouped by charger
+        chargers, ranks = _expand(counts[batch])
+        closest, distances, route_km = route.closest(
+            index.lats[positions[batch]], index.lons[positions[batch]], chargers, route.pieces[first[batch][chargers] + ranks]
+        )
+        found_positions.append(positions[batch][closest])
+        found_distances.append(distances)
+        found_route_km.append(route_km)
+
+    if not found_positions:
+        return []
+    positions = np.concatenate(found_positions)
+    distances = np.concatenate(found_distances)
+    route_km = np.concatenate(found_route_km)
+    ids = index.ids[positions]
+
+    if after is not None:
+        after_km, after_id = after
+        keep = (route_km > after_km) | ((route_km == after_km) & (ids > after_id))
+        ids, distances, route_km = ids[keep], distances[keep], route_km[keep]
+
+    order = np.lexsort((ids, route_km))[:k]
+    return list(zip(ids[order].tolist(), route_km[order].tolist(), distances[order].tolist()))
@@ -1,106 +1,326 @@
-from sqlalchemy.orm import Session
-from app.models import EVCharger, Connector, User
-from passlib.context import CryptContext
+import hashlib
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import and_, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, joinedload
+from app.models import EVCharger, Connector, User, Favorite, ChargerTombstone, PasswordReset
+from app.dataset import bump_dataset_version, forget_dataset_version
+from app.auth import forget_user
+from app.capabilities import connector_mask, summarize_connectors
+from app.spatial_backend import get_spatial_backend
+from app.utils import RESET_CODE_EXPIRE_MINUTES, hash_reset_code
+
+UPSERT_BATCH_SIZE = 500
+CONNECTOR_FIELDS = ("connector_type", "rated_power_kw", "voltage_v", "current_a", "current_type")
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# Map a TomTom search result to database rows
+def parse_charger(charger: dict):
+    """
+    Converts a TomTom POI search result to an `ev_chargers` row and its `connectors` rows.
+
+    :param charger: Dictionary representing charger data.
+    :return: Tuple (charger row, list of connector rows). The charger row carries a
+        `content_hash` of all stored values, connectors included, and the capability
+        summary of its connectors.
+    """
+    poi = charger["poi"]
+    address = charger["address"]
+    row = {
+        "external_id": charger["id"],
+        "name": poi.get("name"),
+        "brand_name": poi["brands"][0]["name"] if poi.get("brands") else None,
+        "url": poi.get("url"),
+        "latitude": charger["position"]["lat"],
+        "longitude": charger["position"]["lon"],
+        "street_name": address.get("streetName"),
+        "municipality": address.get("municipality"),
+        "postal_code": address.get("postalCode"),
+        "freeform_address": address.get("freeformAddress"),
+        "charging_availability": charger.get("dataSources", {}).get("chargingAvailability", {}).get("id"),
+    }
+    connectors = [
+        {
+            "connector_type": connector["connectorType"],
+            "rated_power_kw": connector.get("ratedPowerKW"),
+            "voltage_v": connector.get("voltageV"),
+            "current_a": connector.get("currentA"),
+            "current_type": connector.get("currentType"),
+        }
+        for connector in charger.get("chargingPark", {}).get("connectors", [])
+    ]
+    content = json.dumps([row, sorted(connectors, key=lambda c: json.dumps(c, sort_keys=True))], sort_keys=True, default=str)
+    row["content_hash"] = hashlib.sha256(content.encode()).hexdigest()
+    # Derived from the connectors, so it changes exactly when the hash does
+    row.update(summarize_connectors(connectors))
+    return row, connectors
+
+
+def _connector_key(connector) -> tuple:
+    values = (connector[field] if isinstance(connector, dict) else getattr(connector, field) for field in CONNECTOR_FIELDS)
+    # Numbers are compared as floats, the database returns 22.0 for a stored 22
+    return tuple(float(value) if isinstance(value, (int, float)) else value for value in values)
+
+
+def _upsert_chargers(session: Session, rows: list[dict]):
+    """
+    Inserts or updates charger rows with a single INSERT ... ON CONFLICT statement.
+
+    :return: List of (id, external_id) tuples of the written rows.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        statement = postgresql.insert(EVCharger.__table__)
+    elif dialect == "sqlite":
+        statement = sqlite.insert(EVCharger.__table__)
+    else:
+        raise NotImplementedError(f"Bulk upsert is not supported for the {dialect} dialect")
+
+    statement = statement.values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[EVCharger.__table__.c.external_id],
+        set_={column: statement.excluded[column] for column in rows[0] if column != "external_id"},
+    ).returning(EVCharger.__table__.c.id, EVCharger.__table__.c.external_id)
+    return session.execute(statement).all()
+
+
+def _sync_connectors(session: Session, connectors_by_charger: dict[int, list[dict]]):
+    """
+    Brings the connectors of the given chargers in line with the incoming data.
+
+    Connectors that did not change are kept, only removed ones are deleted and
+    only new ones are inserted.
+    """
+    existing = defaultdict(list)
+    for chunk in _chunks(list(connectors_by_charger), UPSERT_BATCH_SIZE):
+        for connector in session.query(Connector).filter(Connector.charger_id.in_(chunk)):
+            existing[connector.charger_id].append(connector)
+
+    to_delete = []
+    to_insert = []
+    for charger_id, connectors in connectors_by_charger.items():
+        current = defaultdict(list)
+        for connector in existing[charger_id]:
+            current[_connector_key(connector)].append(connector.id)
+        for connector in connectors:
+            matching = current[_connector_key(connector)]
+            if matching:
+                matching.pop()
+            else:
+                to_insert.append({**connector, "charger_id": charger_id})
+        for leftover in current.values():
+            to_delete.extend(leftover)
+
+    for chunk in _chunks(to_delete, UPSERT_BATCH_SIZE):
+        session.query(Connector).filter(Connector.id.in_(chunk)).delete(synchronize_session=False)
+    if to_insert:
+        session.execute(insert(Connector.__table__), to_insert)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Create or Update chargers in the database
 def update_db(session: Session, chargers: list[dict]):
     """
     Updates the database with new or changed chargers.
 
+    Only chargers present in `chargers` are read back. Rows whose content hash
+    did not change are skipped, the rest are written with batched upserts and
+    their connectors are diffed against the stored ones. Written rows get the
+    new dataset version as their `change_version`.
+
     :param session: Database session.
     :param chargers: List of dictionaries representing charger data.
+    :return: Dictionary with the number of inserted, updated and unchanged chargers.
     """
-    existing_chargers = {c.external_id: c for c in session.query(EVCharger).all()}
-    
+    parsed = {}
     for charger in chargers:
-        external_id = charger["id"]
-        connectors_data = charger.get("chargingPark", {}).get("connectors", [])
-        charging_availability = charger.get("dataSources", {}).get("chargingAvailability", {}).get("id")
-        
-        # Update existing record
-        if external_id in existing_chargers:
-            ev_charger = existing_chargers[external_id]
-            ev_charger.name = charger["poi"].get("name")
-            ev_charger.brand_name = charger["poi"]["brands"][0]["name"] if charger["poi"].get("brands") else None
-            ev_charger.url = charger["poi"].get("url")
-            ev_charger.latitude = charger["position"]["lat"]
-            ev_charger.longitude = charger["position"]["lon"]
-            ev_charger.street_name = charger["address"].get("streetName")
-            ev_charger.municipality = charger["address"].get("municipality")
-            ev_charger.postal_code = charger["address"].get("postalCode")
-            ev_charger.freeform_address = charger["address"].get("freeformAddress")
-            ev_charger.charging_availability = charging_availability
-            
-            # Update connectors
-            ev_charger.connectors.clear()
-            for connector in connectors_data:
-                ev_charger.connectors.append(Connector(
-                    connector_type=connector["connectorType"],
-                    rated_power_kw=connector.get("ratedPowerKW"),
-                    voltage_v=connector.get("voltageV"),
-                    current_a=connector.get("currentA"),
-                    current_type=connector.get("currentType"),
-                ))
-        else:
-            # Create a new record
-            ev_charger = EVCharger(
-                external_id=external_id,
-                name=charger["poi"].get("name"),
-                brand_name=charger["poi"]["brands"][0]["name"] if charger["poi"].get("brands") else None,
-                url=charger["poi"].get("url"),
-                latitude=charger["position"]["lat"],
-                longitude=charger["position"]["lon"],
-                street_name=charger["address"].get("streetName"),
-                municipality=charger["address"].get("municipality"),
-                postal_code=charger["address"].get("postalCode"),
-                freeform_address=charger["address"].get("freeformAddress"),
-                charging_availability=charging_availability,
+        row, connectors = parse_charger(charger)
+        parsed[row["external_id"]] = (row, connectors)
+
+    existing = {}
+    for chunk in _chunks(list(parsed), UPSERT_BATCH_SIZE):
+        rows = session.query(EVCharger.external_id, EVCharger.content_hash).filter(EVCharger.external_id.in_(chunk))
+        existing.update(rows)
+
+    changed = [
+        external_id for external_id, (row, _) in parsed.items()
+        if existing.get(external_id, ...) != row["content_hash"]
+    ]
+    inserted = sum(1 for external_id in changed if external_id not in existing)
+    stats = {"inserted": inserted, "updated": len(changed) - inserted, "unchanged": len(parsed) - len(changed)}
+
+    if not changed:
+        return stats
+
+    # Changed rows are stamped with the new dataset version, which is committed together with them
+    version = bump_dataset_version(session)
+    charger_ids = {}
+    for chunk in _chunks(changed, UPSERT_BATCH_SIZE):
+        charger_ids.update(
+            (external_id, charger_id)
+            for charger_id, external_id in _upsert_chargers(
+                session, [{**parsed[external_id][0], "change_version": version} for external_id in chunk]
             )
-            for connector in connectors_data:
-                ev_charger.connectors.append(Connector(
-                    connector_type=connector["connectorType"],
-                    rated_power_kw=connector.get("ratedPowerKW"),
-                    voltage_v=connector.get("voltageV"),
-                    current_a=connector.get("currentA"),
-                    current_type=connector.get("currentType"),
-                ))
-            session.add(ev_charger)
-    
-    # Commit changes
+        )
+
+    _sync_connectors(session, {charger_ids[external_id]: parsed[external_id][1] for external_id in changed})
     session.commit()
+    forget_dataset_version()
+    return stats
 
 
 # Fetch chargers in a specific bounding box
 def get_chargers_in_bounds(session: Session, north_east: tuple[float, float], south_west: tuple[float, float]):
     """
-    Fetches chargers located within the given bounding box.
+    Fetches chargers located within the given bounding box, using the spatial
+    index of the database when it has one.
 
     :param session: Database session.
     :param north_east: Tuple with NE coordinates (latitude, longitude).
     :param south_west: Tuple with SW coordinates (latitude, longitude).
     :return: List of EVCharger objects.
     """
-    chargers = session.query(EVCharger).filter(
-        EVCharger.latitude.between(south_west[0], north_east[0]),
-        EVCharger.longitude.between(south_west[1], north_east[1])
-    ).all()
-    return chargers
+    query = get_spatial_backend(session).within_bounds(session.query(EVCharger), north_east, south_west)
+    return query.all()
+
+
+# Build a query for chargers matching connector filters
+def query_chargers(session: Session, min_power: float = None, max_power: float = None, connector_types: list[str] = None):
+    """
+    Builds a query for chargers that have at least one connector matching all given filters.
+
+    A single filter is answered from the capability summary of `ev_chargers`
+    alone. Several filters must hold for the same connector, which the summary
+    cannot tell, so they are checked with an EXISTS semi-join, still narrowed
+    down by the summary first. Either way every charger appears at most once.
+
+    :param session: Database session.
+    :param min_power: Minimal rated power of the connector (in kW).
+    :param max_power: Maximal rated power of the connector (in kW).
+    :param connector_types: List of accepted connector types.
+    :return: Query of EVCharger objects.
+    """
+    conditions = []
+    if min_power is not None:
+        conditions.append(Connector.rated_power_kw >= min_power)
+    if max_power is not None:
+        conditions.append(Connector.rated_power_kw <= max_power)
+    if connector_types is not None:
+        conditions.append(Connector.connector_type.in_(connector_types))
+
+    query = session.query(EVCharger)
+    if min_power is not None:
+        query = query.filter(EVCharger.max_power_kw >= min_power)
+    if max_power is not None:
+        query = query.filter(EVCharger.min_power_kw <= max_power)
+    mask = connector_mask(connector_types) if connector_types is not None else None
+    if mask is not None:
+        query = query.filter(EVCharger.connector_mask.op("&")(mask) != 0)
+
+    # Connector types without a bit in the mask are only found by the semi-join
+    if len(conditions) > 1 or (connector_types is not None and mask is None):
+        query = query.filter(EVCharger.connectors.any(and_(*conditions)))
+    return query
+
+
+# Fetch a single charger by its ID
+def get_charger_by_id(session: Session, charger_id: int):
+    """
+    Fetches a charger based on its `id`.
+
+    :param session: Database session.
+    :param charger_id: ID of the charger.
+    :return: EVCharger object or None.
+    """
+    return session.query(EVCharger).filter(EVCharger.id == charger_id).first()
+
+
+# Fetch availability IDs of many chargers at once
+def get_charging_availability_ids(session: Session, charger_ids: list[int]):
+    """
+    Fetches the `charging_availability` IDs of the given chargers in a single query.
+
+    :param session: Database session.
+    :param charger_ids: IDs of the chargers.
+    :return: Dictionary mapping charger ID to its availability ID (None if missing) for existing chargers.
+    """
+    rows = session.query(EVCharger.id, EVCharger.charging_availability).filter(EVCharger.id.in_(charger_ids)).all()
+    return {charger_id: charging_availability for charger_id, charging_availability in rows}
+
+
+# Fetch a single charger together with its connectors
+def get_charger_with_connectors(session: Session, charger_id: int):
+    """
+    Fetches a charger and its connectors in a single statement.
+
+    :param session: Database session.
+    :param charger_id: ID of the charger.
+    :return: EVCharger object or None.
+    """
+    return session.query(EVCharger).options(
+        joinedload(EVCharger.connectors)
+    ).filter(EVCharger.id == charger_id).first()
+
+
+# Fetch chargers a user marked as favorite
+def get_favorite_chargers(session: Session, user_id: int):
+    """
+    Fetches the favorite chargers of a user in a single statement.
+
+    :param session: Database session.
+    :param user_id: ID of the user.
+    :return: List of (id, name, freeform_address) rows.
+    """
+    return session.query(EVCharger.id, EVCharger.name, EVCharger.freeform_address).join(Favorite).filter(
+        Favorite.user_id == user_id
+    ).order_by(Favorite.id).all()
+
+
+# Fetch chargers changed after a dataset version
+def get_changes(session: Session, since: int, fields=("id", "external_id")):
+    """
+    Fetches chargers inserted, updated or deleted after the given dataset version.
+
+    :param session: Database session.
+    :param since: Dataset version the client is up to date with, 0 for a full snapshot.
+    :param fields: Names of the `ev_chargers` columns to return, must include `id`.
+    :return: Tuple (list of changed rows with the `fields` columns, list of deleted charger IDs).
+    """
+    query = session.query(*(getattr(EVCharger, field) for field in fields))
+    if since == 0:
+        return query.order_by(EVCharger.id).all(), []
+
+    # Sorted here rather than with ORDER BY id, which makes the planner walk the
+    # primary key through every row instead of using the `change_version` index
+    chargers = sorted(query.filter(EVCharger.change_version > since), key=lambda charger: charger.id)
+
+    # An ID that was deleted and then used again for a new row is not reported as deleted
+    live_ids = {charger.id for charger in chargers}
+    deleted = session.query(ChargerTombstone.id).filter(ChargerTombstone.deleted_version > since)
+    return chargers, sorted(charger_id for charger_id, in deleted if charger_id not in live_ids)
 
 
 # Delete a charger by its external ID
 def delete_charger(session: Session, external_id: str):
     """
-    Deletes a charger based on its `external_id`.
+    Deletes a charger based on its `external_id` and leaves a tombstone for delta sync.
 
     :param session: Database session.
     :param external_id: External ID of the charger.
     """
     charger = session.query(EVCharger).filter_by(external_id=external_id).first()
     if charger:
+        version = bump_dataset_version(session)
+        session.merge(ChargerTombstone(id=charger.id, external_id=charger.external_id, deleted_version=version))
         session.delete(charger)
         session.commit()
+        forget_dataset_version()
 
 
 # Fetch a single charger by its external ID
@@ -123,27 +343,85 @@ def get_user_by_email(db: Session, email: str):
 def get_user_by_id(db: Session, user_id: int):
     return db.query(User).filter(User.id == user_id).first()
 
-def create_user(db: Session, username: str, email: str, password: str):
-    hashed_password = pwd_context.hash(password)
+def add_user(db: Session, username: str, email: str, hashed_password: str):
     user = User(username=username, email=email, hashed_password=hashed_password)
     db.add(user)
     db.commit()
     db.refresh(user)
     return user
 
-def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def update_user_data(session: Session, user_id: int, username: str = None, email: str = None, password: str = None):
+# Passwords are hashed by the caller, with `password_hasher.hash` off the request thread
+def update_user_data(session: Session, user_id: int, username: str = None, email: str = None,
+                     hashed_password: str = None):
     user = session.query(User).filter(User.id == user_id).first()
     if user:
         if username:
             user.username = username
         if email:
             user.email = email
-        if password:
-            user.hashed_password = pwd_context.hash(password)
+        if hashed_password:
+            user.hashed_password = hashed_password
         session.commit()
+        forget_user(user_id)
         session.refresh(user)
         return user
     return None
+
+def create_password_reset(session: Session, user_id: int, code: str, expire_minutes: int = RESET_CODE_EXPIRE_MINUTES):
+    """
+    Stores the hash of a reset code sent to the user, earlier unused codes stop working.
+
+    The reset is only added to the session, it is stored when the caller commits.
+
+    :param session: Database session.
+    :param user_id: ID of the user.
+    :param code: Reset code, see `generate_reset_code`.
+    :param expire_minutes: Minutes the code can be used for.
+    :return: The new PasswordReset object.
+    """
+    now = datetime.utcnow()
+    session.query(PasswordReset).filter(
+        PasswordReset.user_id == user_id, PasswordReset.used_at.is_(None)
+    ).update({PasswordReset.used_at: now}, synchronize_session=False)
+    reset = PasswordReset(user_id=user_id, code_hash=hash_reset_code(code), expires_at=now + timedelta(minutes=expire_minutes))
+    session.add(reset)
+    return reset
+
+def get_password_reset(session: Session, email: str, code: str):
+    """
+    Finds the unused and unexpired reset of a user matching the code.
+
+    :param session: Database session.
+    :param email: Email address of the user.
+    :param code: Reset code the user entered.
+    :return: PasswordReset object or None.
+    """
+    return session.query(PasswordReset).join(User, User.id == PasswordReset.user_id).filter(
+        User.email == email,
+        PasswordReset.code_hash == hash_reset_code(code),
+        PasswordReset.used_at.is_(None),
+        PasswordReset.expires_at > datetime.utcnow()
+    ).first()
+
+def complete_password_reset(session: Session, reset_id: int, user_id: int, hashed_password: str) -> bool:
+    """
+    Sets a new password and uses up the reset code, in one transaction.
+
+    :param session: Database session.
+    :param reset_id: ID of the PasswordReset found by `get_password_reset`.
+    :param user_id: ID of the user.
+    :param hashed_password: The new password, already hashed.
+    :return: False if the code was used meanwhile, e.g. by a concurrent request.
+    """
+    used = session.query(PasswordReset).filter(
+        PasswordReset.id == reset_id, PasswordReset.used_at.is_(None)
+    ).update({PasswordReset.used_at: datetime.utcnow()}, synchronize_session=False)
+    if not used:
+        session.rollback()
+        return False
+    session.query(User).filter(User.id == user_id).update(
+        {User.hashed_password: hashed_password}, synchronize_session=False
+    )
+    session.commit()
+    forget_user(user_id)
+    return True
@@ -1,19 +1,95 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from dotenv import load_dotenv
 import os
+import time
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import sessionmaker, declarative_base
+from app.db_metrics import DatabaseMetrics, TimedQueuePool, count_query, db_metrics
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Connections kept open, and extra ones opened under load and closed when returned
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Seconds a request waits for a free connection before failing
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Seconds after which a connection is replaced, below the server's idle timeout
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Seconds a single statement may run, 0 for no limit
+DB_STATEMENT_TIMEOUT = float(os.getenv("DB_STATEMENT_TIMEOUT", "0"))
+
+
+def _limit_sqlite_statements(engine: Engine, timeout: float):
+    # SQLite has no server-side timeout, the progress handler interrupts statements running too long
+    @event.listens_for(engine, "connect")
+    def set_progress_handler(dbapi_connection, connection_record):
+        info = connection_record.info
+        dbapi_connection.set_progress_handler(
+            lambda: time.monotonic() > info.get("deadline", float("inf")), 1000
+        )
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def set_deadline(conn, cursor, statement, parameters, context, executemany):
+        conn.info["deadline"] = time.monotonic() + timeout
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def clear_deadline(conn, cursor, statement, parameters, context, executemany):
+        conn.info.pop("deadline", None)
+
+
+def create_db_engine(url: str = DATABASE_URL, pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW,
+                     pool_timeout: float = DB_POOL_TIMEOUT, pool_recycle: int = DB_POOL_RECYCLE,
+                     pool_pre_ping: bool = DB_POOL_PRE_PING, statement_timeout: float = DB_STATEMENT_TIMEOUT,
+                     metrics: DatabaseMetrics = db_metrics) -> Engine:
+    """
+    Creates an engine with a tuned, instrumented connection pool.
+
+    :param url: Database URL.
+    :param pool_size: Connections kept open in the pool.
+    :param max_overflow: Extra connections allowed when the pool is exhausted.
+    :param pool_timeout: Seconds to wait for a connection before raising TimeoutError.
+    :param pool_recycle: Seconds after which a connection is reopened, -1 to keep it forever.
+    :param pool_pre_ping: Whether to test connections on checkout.
+    :param statement_timeout: Seconds a statement may run, 0 for no limit.
+    :param metrics: DatabaseMetrics receiving checkout latencies and query counts.
+    :return: The new Engine.
+    """
+    url = make_url(url)
+    options = {"pool_pre_ping": pool_pre_ping, "pool_recycle": pool_recycle}
+    connect_args = {}
+    is_sqlite = url.get_backend_name() == "sqlite"
+
+    if is_sqlite and url.database in (None, "", ":memory:"):
+        # An in-memory database lives in a single connection, keep SQLAlchemy's default pool
+        connect_args["check_same_thread"] = False
+    else:
+        options.update(poolclass=TimedQueuePool, pool_size=pool_size, max_overflow=max_overflow,
+                       pool_timeout=pool_timeout)
+        if is_sqlite:
+            connect_args["check_same_thread"] = False
+    if statement_timeout and url.get_backend_name() == "postgresql":
+        connect_args["options"] = f"-c statement_timeout={int(statement_timeout * 1000)}"
+
+    engine = create_engine(url, connect_args=connect_args, **options)
+    if isinstance(engine.pool, TimedQueuePool):
+        engine.pool.metrics = metrics
+    if statement_timeout and is_sqlite:
+        _limit_sqlite_statements(engine, statement_timeout)
+    event.listen(engine, "before_cursor_execute", count_query)
+    return engine
+
 
-engine = create_engine(DATABASE_URL)
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 def get_db():
+    # A session only checks a connection out of the pool when it runs its first statement,
+    # so requests that never reach the database do not hold (or wait for) a connection
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        db.close()
\ No newline at end of file
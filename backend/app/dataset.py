@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models import DatasetVersion
+
+# How long a version read from the database is trusted before it is checked again
+VERSION_CHECK_INTERVAL = float(os.getenv("DATASET_VERSION_CHECK_INTERVAL", "5"))
+
+_version = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def bump_dataset_version(session: Session) -> int:
+    """
+    Increments the dataset version as part of the session's current transaction.
+
+    Must be called before the commit that publishes the changed chargers, and
+    followed by `forget_dataset_version` once that commit succeeded. The updated
+    row stays locked until then, so concurrent writers get consecutive versions
+    in commit order.
+
+    A single INSERT ... ON CONFLICT statement creates the row on the first bump,
+    so two first writers cannot both try to insert it.
+
+    :param session: Database session.
+    :return: The new version, used to stamp the rows changed in this transaction.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        statement = postgresql.insert(DatasetVersion.__table__)
+    elif dialect == "sqlite":
+        statement = sqlite.insert(DatasetVersion.__table__)
+    else:
+        raise NotImplementedError(f"Dataset versions are not supported for the {dialect} dialect")
+
+    table = DatasetVersion.__table__
+    now = datetime.utcnow()
+    statement = statement.values(id=1, version=1, updated_at=now).on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={table.c.version: table.c.version + 1, table.c.updated_at: now},
+    ).returning(table.c.version)
+    return session.execute(statement).scalar_one()
+
+
+def forget_dataset_version():
+    """
+    Drops the memoized version so the next read goes to the database.
+    """
+    global _version
+    with _lock:
+        _version = None
+
+
+def get_dataset_version(session: Session) -> int:
+    """
+    Returns the current dataset version.
+
+    The value is memoized for VERSION_CHECK_INTERVAL seconds, so changes made by
+    another process (e.g. `scripts/update_db.py`) become visible after at most
+    that delay. Changes made in this process are visible immediately.
+
+    :param session: Database session used if the version has to be read.
+    :return: Dataset version, 0 for a database that was never updated.
+    """
+    global _version, _checked_at
+    with _lock:
+        if _version is not None and time.monotonic() - _checked_at < VERSION_CHECK_INTERVAL:
+            return _version
+
+    version = session.query(DatasetVersion.version).filter(DatasetVersion.id == 1).scalar() or 0
+
+    with _lock:
+        _version = version
+        _checked_at = time.monotonic()
+    return version
@@ -0,0 +1,135 @@
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+# Mutable [count] of statements run by the current request, None outside requests
+_request_queries: ContextVar = ContextVar("request_queries", default=None)
+
+
+class DatabaseMetrics:
+    """
+    Counters of pool checkouts and of the statements run per request.
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checkout_seconds = 0.0
+        self.max_checkout_seconds = 0.0
+        self.checkout_timeouts = 0
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        # Route path -> [requests, queries, max queries of a request]
+        self.routes = {}
+        self._lock = threading.Lock()
+
+    def record_checkout(self, seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_seconds += seconds
+            self.max_checkout_seconds = max(self.max_checkout_seconds, seconds)
+
+    def record_timeout(self):
+        with self._lock:
+            self.checkout_timeouts += 1
+
+    def record_request(self, route: str, queries: int):
+        with self._lock:
+            self.requests += 1
+            self.queries += queries
+            self.max_queries = max(self.max_queries, queries)
+            if route is not None:
+                stats = self.routes.setdefault(route, [0, 0, 0])
+                stats[0] += 1
+                stats[1] += queries
+                stats[2] = max(stats[2], queries)
+
+    def snapshot(self, pool=None) -> dict:
+        """
+        :param pool: Optional connection pool whose current usage is included.
+        """
+        with self._lock:
+            data = {
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.checkout_timeouts,
+                "mean_checkout_ms": 1000 * self.checkout_seconds / self.checkouts if self.checkouts else None,
+                "max_checkout_ms": 1000 * self.max_checkout_seconds,
+                "requests": self.requests,
+                "mean_queries": self.queries / self.requests if self.requests else None,
+                "max_queries": self.max_queries,
+                "routes": {
+                    route: {"requests": requests, "mean_queries": queries / requests, "max_queries": max_queries}
+                    for route, (requests, queries, max_queries) in sorted(self.routes.items())
+                },
+            }
+        if isinstance(pool, QueuePool):
+            data["pool"] = {
+                "size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+            }
+        return data
+
+
+db_metrics = DatabaseMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool reporting how long every checkout waited for a connection.
+    """
+
+    def __init__(self, *args, metrics: DatabaseMetrics = db_metrics, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_checkout(time.perf_counter() - started_at)
+        return connection
+
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    """
+    `before_cursor_execute` listener counting statements of the current request.
+    """
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class QueryCountMiddleware:
+    """
+    ASGI middleware recording the number of statements each request ran, per route.
+    """
+
+    def __init__(self, app, metrics: DatabaseMetrics = db_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        # The list is shared with the threads sync routes and dependencies run in
+        counter = [0]
+        token = _request_queries.set(counter)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_queries.reset(token)
+            route = scope.get("route")
+            self.metrics.record_request(getattr(route, "path", None), counter[0])
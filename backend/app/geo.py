@@ -0,0 +1,69 @@
+import numpy as np
+from math import radians, cos, sin, sqrt, atan2
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """
+    Great-circle (haversine) distance between two points in kilometers.
+    """
+    lat1_rad = radians(lat1)
+    lon1_rad = radians(lon1)
+    lat2_rad = radians(lat2)
+    lon2_rad = radians(lon2)
+
+    dlon = lon2_rad - lon1_rad
+    dlat = lat2_rad - lat1_rad
+
+    a = sin(dlat / 2)**2 + cos(lat1_rad) * cos(lat2_rad) * sin(dlon / 2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Distances in kilometers from one point to many points in a single vectorized pass.
+
+    :param lat: Latitude of the origin.
+    :param lon: Longitude of the origin.
+    :param lats: Array of latitudes.
+    :param lons: Array of longitudes.
+    :return: Array of distances, aligned with `lats` / `lons`.
+    """
+    lat_rad = np.radians(lat)
+    lats_rad = np.radians(lats)
+    dlat = lats_rad - lat_rad
+    dlon = np.radians(lons) - np.radians(lon)
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat_rad) * np.cos(lats_rad) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def top_k(distances: np.ndarray, k: int = None, ids: np.ndarray = None) -> np.ndarray:
+    """
+    Positions of the `k` smallest distances, ordered ascending.
+
+    Uses partial selection, so only the candidates up to the `k`-th distance
+    are fully sorted. Every candidate tied with the `k`-th distance is kept
+    until the final sort, so the cut follows the tie-breaker.
+
+    :param distances: Array of distances.
+    :param k: Number of positions to return (all when None).
+    :param ids: Optional array of IDs breaking ties between equal distances (position otherwise).
+    :return: Array of positions into `distances`.
+    """
+    if k is not None and k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k is None or k >= len(distances):
+        selected = np.arange(len(distances))
+    else:
+        kth = np.partition(distances, k - 1)[k - 1]
+        selected = np.flatnonzero(distances <= kth)
+
+    if ids is None:
+        order = np.argsort(distances[selected], kind="stable")
+    else:
+        order = np.lexsort((ids[selected], distances[selected]))
+    return selected[order][:k]
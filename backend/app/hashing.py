@@ -0,0 +1,125 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Hashes computed at the same time, each one keeps a CPU core busy
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hashes running or waiting for a worker, further requests are rejected at once
+HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(HASH_WORKERS * 8)))
+
+
+class PasswordHashingOverloaded(Exception):
+    """
+    Raised when too many password hashes are already waiting for a worker.
+    """
+
+
+def _hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated process pool.
+
+    Hashing never holds the GIL of the API process, so a burst of logins does
+    not slow down other requests. At most `max_pending` hashes may be running or
+    queued; beyond that callers get PasswordHashingOverloaded instead of waiting.
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers do not inherit the server's threads, sockets or database connections
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _done(self, started_at: float):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+            self.total_seconds += time.monotonic() - started_at
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHashingOverloaded()
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+
+        started_at = time.monotonic()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._done(started_at)
+            raise
+        future.add_done_callback(lambda _: self._done(started_at))
+        return future
+
+    async def hash(self, password: str) -> str:
+        """
+        Hashes a password without blocking the event loop.
+
+        :raises PasswordHashingOverloaded: When the queue is full.
+        """
+        return await asyncio.wrap_future(self._submit(_hash_password, password))
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        Verifies a password without blocking the event loop.
+
+        :raises PasswordHashingOverloaded: When the queue is full.
+        """
+        return await asyncio.wrap_future(self._submit(_verify_password, plain_password, hashed_password))
+
+    def hash_sync(self, password: str) -> str:
+        return self._submit(_hash_password, password).result()
+
+    def verify_sync(self, plain_password: str, hashed_password: str) -> bool:
+        return self._submit(_verify_password, plain_password, hashed_password).result()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "queued": max(0, self.pending - self.workers),
+                "peak_pending": self.peak_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "mean_seconds": self.total_seconds / self.completed if self.completed else None,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,313 @@
+import os
+import smtplib
+import ssl
+import threading
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import EmailOutbox
+
+load_dotenv()
+
+SENDER_EMAIL = os.getenv("SENDER_EMAIL")
+SENDER_SMTP = os.getenv("SENDER_SMTP")
+SENDER_PASSWORD = os.getenv("SENDER_PASSWORD")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+# "ssl" (implicit TLS), "starttls" or "none"
+SMTP_SECURITY = os.getenv("SMTP_SECURITY", "ssl")
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "1"))
+# Idle connections older than this are closed instead of reused, most servers drop them anyway
+SMTP_MAX_IDLE = float(os.getenv("SMTP_MAX_IDLE", "60"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+# Seconds before the first retry, doubled after every failed attempt
+OUTBOX_RETRY_BACKOFF = float(os.getenv("OUTBOX_RETRY_BACKOFF", "30"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+MAX_RETRY_DELAY = 3600
+
+
+class SMTPPool:
+    """
+    Thread-safe pool of logged-in SMTP connections.
+
+    A connection is opened and authenticated once and then reused for every
+    message, so sending costs a single MAIL/RCPT/DATA exchange instead of a TCP
+    and TLS handshake plus a login.
+    """
+
+    def __init__(self, host: str, port: int, username: str = None, password: str = None,
+                 security: str = "ssl", size: int = 1, timeout: float = 10.0, max_idle: float = 60.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.security = security
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.connects = 0
+        self.reuses = 0
+        # List of (connection, time it was returned to the pool)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.security == "ssl":
+            connection = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout,
+                                          context=ssl.create_default_context())
+        else:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == "starttls":
+                connection.starttls(context=ssl.create_default_context())
+        try:
+            if self.username and self.password:
+                connection.login(self.username, self.password)
+        except BaseException:
+            self._close(connection)
+            raise
+        with self._lock:
+            self.connects += 1
+        return connection
+
+    @staticmethod
+    def _close(connection: smtplib.SMTP):
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+
+    def prune(self):
+        """
+        Closes connections that were idle for longer than `max_idle`.
+        """
+        now = time.monotonic()
+        with self._lock:
+            stale = [connection for connection, released_at in self._idle if now - released_at > self.max_idle]
+            self._idle = [entry for entry in self._idle if now - entry[1] <= self.max_idle]
+        for connection in stale:
+            self._close(connection)
+
+    def acquire(self) -> smtplib.SMTP:
+        self.prune()
+        with self._lock:
+            if self._idle:
+                self.reuses += 1
+                return self._idle.pop()[0]
+        return self._connect()
+
+    def release(self, connection: smtplib.SMTP):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((connection, time.monotonic()))
+                return
+        self._close(connection)
+
+    def send(self, message: EmailMessage):
+        """
+        Sends a message over a pooled connection.
+
+        A reused connection the server has meanwhile closed is replaced by a new one once.
+
+        :raises smtplib.SMTPException: When the server refuses the message.
+        :raises OSError: When the server cannot be reached.
+        """
+        connection = self.acquire()
+        for attempt in range(2):
+            try:
+                connection.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                connection.close()
+                if attempt:
+                    raise
+                connection = self._connect()
+                continue
+            except smtplib.SMTPResponseException:
+                # The server answered, the session is still usable after a reset
+                self._reset(connection)
+                raise
+            except smtplib.SMTPRecipientsRefused:
+                self.release(connection)
+                raise
+            except BaseException:
+                connection.close()
+                raise
+            self.release(connection)
+            return
+
+    def _reset(self, connection: smtplib.SMTP):
+        try:
+            connection.rset()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+        else:
+            self.release(connection)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
+
+
+def queue_email(session: Session, recipient: str, subject: str, body: str) -> EmailOutbox:
+    """
+    Adds a message to the outbox.
+
+    The message is only added to the session, it is stored (and later sent) when
+    the caller commits, together with the rest of the transaction.
+
+    :param session: Database session.
+    :param recipient: Email address of the recipient.
+    :param subject: Subject of the message.
+    :param body: Plain-text body of the message.
+    :return: The new EmailOutbox object.
+    """
+    email = EmailOutbox(recipient=recipient, subject=subject, body=body, next_attempt_at=datetime.utcnow())
+    session.add(email)
+    return email
+
+
+class OutboxSender:
+    """
+    Background worker delivering the messages of the `email_outbox` table.
+
+    Due messages are claimed by moving their next attempt `lease` seconds ahead,
+    so several API processes can run a sender side by side and a message whose
+    sender died mid-send is picked up again once the lease runs out. Failed
+    deliveries are retried with exponential backoff up to `max_attempts` times.
+    """
+
+    def __init__(self, session_factory=SessionLocal, pool: SMTPPool = None, sender: str = SENDER_EMAIL,
+                 batch_size: int = 20, max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+                 backoff: float = OUTBOX_RETRY_BACKOFF, poll_interval: float = OUTBOX_POLL_INTERVAL,
+                 lease: float = 60.0):
+        self.session_factory = session_factory
+        self.pool = pool if pool is not None else SMTPPool(
+            SENDER_SMTP, SMTP_PORT, SENDER_EMAIL, SENDER_PASSWORD, SMTP_SECURITY, SMTP_POOL_SIZE, max_idle=SMTP_MAX_IDLE
+        )
+        self.sender = sender
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _claim(self, session: Session, email_id: int, next_attempt_at: datetime, now: datetime) -> bool:
+        claimed = session.query(EmailOutbox).filter(
+            EmailOutbox.id == email_id,
+            EmailOutbox.status == "pending",
+            EmailOutbox.next_attempt_at == next_attempt_at
+        ).update({EmailOutbox.next_attempt_at: now + timedelta(seconds=self.lease)}, synchronize_session=False)
+        session.commit()
+        return claimed == 1
+
+    def _message(self, email: EmailOutbox) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = email.recipient
+        message["Subject"] = email.subject
+        message.set_content(email.body or "")
+        return message
+
+    def _failed(self, email: EmailOutbox, error: Exception):
+        email.attempts += 1
+        email.last_error = str(error)[:1000]
+        if email.attempts >= self.max_attempts or isinstance(error, smtplib.SMTPRecipientsRefused):
+            email.status = "failed"
+            email.body = None
+            self.failed += 1
+        else:
+            delay = min(MAX_RETRY_DELAY, self.backoff * 2 ** (email.attempts - 1))
+            email.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            self.retried += 1
+
+    def run_once(self) -> int:
+        """
+        Tries to deliver every message that is due.
+
+        :return: Number of messages attempted.
+        """
+        attempted = 0
+        with self.session_factory() as session:
+            now = datetime.utcnow()
+            due = session.query(EmailOutbox.id, EmailOutbox.next_attempt_at).filter(
+                EmailOutbox.status == "pending",
+                EmailOutbox.next_attempt_at <= now
+            ).order_by(EmailOutbox.next_attempt_at).limit(self.batch_size).all()
+
+            for email_id, next_attempt_at in due:
+                if not self._claim(session, email_id, next_attempt_at, now):
+                    continue
+                attempted += 1
+                email = session.get(EmailOutbox, email_id)
+                try:
+                    self.pool.send(self._message(email))
+                except (smtplib.SMTPException, OSError) as e:
+                    self._failed(email, e)
+                else:
+                    email.status = "sent"
+                    email.sent_at = datetime.utcnow()
+                    # Reset emails carry a password, it is not kept once delivered
+                    email.body = None
+                    self.sent += 1
+                session.commit()
+        return attempted
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                attempted = self.run_once()
+            except Exception:
+                # E.g. the database is unavailable, try again on the next poll
+                attempted = 0
+            if attempted < self.batch_size:
+                self.pool.prune()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+        self.pool.close()
+
+    def notify(self):
+        """
+        Wakes the worker up, e.g. right after a message was queued.
+        """
+        self._wake.set()
+
+    def start(self):
+        """
+        Starts the worker thread. Without SENDER_SMTP configured messages stay queued.
+        """
+        if self.pool.host is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        else:
+            self.pool.close()
+
+    def metrics(self) -> dict:
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "smtp_connects": self.pool.connects,
+            "smtp_reuses": self.pool.reuses,
+        }
+
+
+outbox_sender = OutboxSender()
@@ -1,13 +1,37 @@
-from fastapi import FastAPI
-from app.routers import chargers, auth, favorites, users
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.routers import chargers, auth, favorites, users, metrics
+from app.tomtom import availability_client
+from app.hashing import PasswordHashingOverloaded, password_hasher
+from app.mailer import outbox_sender
+from app.db_metrics import QueryCountMiddleware
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    outbox_sender.start()
+    yield
+    outbox_sender.stop()
+    await availability_client.aclose()
+    password_hasher.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(QueryCountMiddleware)
+
+@app.exception_handler(PasswordHashingOverloaded)
+def password_hashing_overloaded(request: Request, exc: PasswordHashingOverloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many sign-in requests, try again shortly."},
+        headers={"Retry-After": "1"}
+    )
 
 # Include the routers
 app.include_router(chargers.router, prefix="/api", tags=["chargers"])
 app.include_router(auth.router, prefix="/api", tags=["auth"])
 app.include_router(favorites.router, prefix="/api", tags=["favorites"])
 app.include_router(users.router, prefix="/api", tags=["users"])
+app.include_router(metrics.router, prefix="/api", tags=["metrics"])
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,180 @@
+import struct
+import threading
+import numpy as np
+from sqlalchemy.orm import Session
+from app.dataset import get_dataset_version
+from app.models import EVCharger
+
+# Binary marker feed, all numbers little-endian:
+#   header      magic "EVMK", uint16 format version, uint16 reserved,
+#               uint32 marker count N, uint32 string count S
+#   latitudes   int32[N], microdegrees
+#   longitudes  int32[N], microdegrees
+#   ids         varint[N], first ID followed by the differences of IDs sorted ascending
+#   names       varint[N], index into the string table
+#   strings     varint[S] byte lengths, then the UTF-8 bytes of all strings
+MAGIC = b"EVMK"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+COORDINATE_SCALE = 1_000_000
+MEDIA_TYPE = "application/vnd.wattway.markers"
+
+
+def encode_varints(values) -> bytes:
+    """
+    Encodes non-negative integers as unsigned LEB128 varints.
+    """
+    out = bytearray()
+    for value in values:
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def decode_varints(data: bytes, count: int, offset: int):
+    """
+    Decodes `count` varints starting at `offset`.
+
+    :return: Tuple (int64 array of values, offset after the last value).
+    """
+    if count == 0:
+        return np.zeros(0, dtype=np.int64), offset
+    chunk = np.frombuffer(data, dtype=np.uint8, offset=offset)
+    ends = np.flatnonzero(chunk < 0x80)[:count]
+    if len(ends) < count:
+        raise ValueError("Truncated varint data")
+    chunk = chunk[:ends[-1] + 1].astype(np.int64)
+
+    # Every byte belongs to the value ending at the next byte below 0x80
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    group = np.zeros(len(chunk), dtype=np.int64)
+    group[starts[1:]] = 1
+    group = np.cumsum(group)
+    shift = 7 * (np.arange(len(chunk)) - starts[group])
+
+    values = np.zeros(count, dtype=np.int64)
+    np.add.at(values, group, (chunk & 0x7F) << shift)
+    return values, offset + int(ends[-1]) + 1
+
+
+class MarkerFeed:
+    """
+    Columnar copy of the marker data the map needs: ID, position and name.
+    """
+
+    def __init__(self, rows):
+        """
+        :param rows: Iterable of (charger_id, name, latitude, longitude) tuples.
+        """
+        rows = sorted(rows, key=lambda row: row[0])
+        strings = {}
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.name_index = np.array([strings.setdefault(row[1] or "", len(strings)) for row in rows], dtype=np.int64)
+        self.strings = list(strings)
+        self.latitudes = np.round(np.array([row[2] for row in rows], dtype=np.float64) * COORDINATE_SCALE).astype("<i4")
+        self.longitudes = np.round(np.array([row[3] for row in rows], dtype=np.float64) * COORDINATE_SCALE).astype("<i4")
+        self.body = self.encode()
+
+    def encode(self, charger_ids=None) -> bytes:
+        """
+        Encodes all markers, or only those of the given chargers.
+
+        :param charger_ids: Optional collection of charger IDs to include.
+        """
+        if charger_ids is None:
+            selected = np.arange(len(self.ids))
+        else:
+            selected = np.flatnonzero(np.isin(self.ids, np.fromiter(charger_ids, dtype=np.int64)))
+
+        # Only strings used by the selected markers go to the string table
+        used, name_index = np.unique(self.name_index[selected], return_inverse=True)
+        ids = self.ids[selected]
+        id_deltas = np.diff(ids, prepend=0)
+        encoded_strings = [self.strings[i].encode("utf-8") for i in used.tolist()]
+
+        return b"".join([
+            HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(selected), len(encoded_strings)),
+            self.latitudes[selected].tobytes(),
+            self.longitudes[selected].tobytes(),
+            encode_varints(id_deltas.tolist()),
+            encode_varints(name_index.ravel().tolist()),
+            encode_varints([len(string) for string in encoded_strings]),
+            *encoded_strings,
+        ])
+
+
+def decode_marker_columns(body: bytes) -> dict:
+    """
+    Decodes a marker feed into columns: `ids`, `latitudes` and `longitudes` arrays,
+    `name_index` array and the `strings` table it points into.
+    """
+    magic, format_version, _, count, string_count = HEADER.unpack_from(body)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise ValueError("Not a marker feed")
+
+    offset = HEADER.size
+    latitudes = np.frombuffer(body, dtype="<i4", count=count, offset=offset) / COORDINATE_SCALE
+    longitudes = np.frombuffer(body, dtype="<i4", count=count, offset=offset + 4 * count) / COORDINATE_SCALE
+    id_deltas, offset = decode_varints(body, count, offset + 8 * count)
+    name_index, offset = decode_varints(body, count, offset)
+    lengths, offset = decode_varints(body, string_count, offset)
+    ends = (offset + np.cumsum(lengths)).tolist()
+    strings = [body[start:end].decode("utf-8") for start, end in zip([offset] + ends[:-1], ends)]
+
+    return {
+        "ids": np.cumsum(id_deltas),
+        "latitudes": latitudes,
+        "longitudes": longitudes,
+        "name_index": name_index,
+        "strings": strings,
+    }
+
+
+def decode_marker_feed(body: bytes) -> list[dict]:
+    """
+    Decodes a marker feed into dictionaries with `id`, `latitude`, `longitude` and `name`.
+    """
+    columns = decode_marker_columns(body)
+    strings = columns["strings"]
+    return [
+        {"id": charger_id, "latitude": lat, "longitude": lon, "name": strings[name]}
+        for charger_id, lat, lon, name in zip(
+            columns["ids"].tolist(), columns["latitudes"].tolist(),
+            columns["longitudes"].tolist(), columns["name_index"].tolist()
+        )
+    ]
+
+
+# Tuple (dataset version, feed) of the last built feed
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def build_marker_feed(session: Session) -> MarkerFeed:
+    """
+    Builds the marker feed from the `ev_chargers` table.
+
+    :param session: Database session.
+    :return: MarkerFeed over all chargers.
+    """
+    rows = session.query(EVCharger.id, EVCharger.name, EVCharger.latitude, EVCharger.longitude).all()
+    return MarkerFeed(rows)
+
+
+def get_marker_feed(session: Session) -> MarkerFeed:
+    """
+    Returns the shared feed, rebuilding it whenever the dataset version changes.
+
+    :param session: Database session used if the feed has to be (re)built.
+    """
+    global _feed
+    version = get_dataset_version(session)
+    current = _feed
+    if current is None or current[0] != version:
+        with _feed_lock:
+            if _feed is None or _feed[0] != version:
+                _feed = (version, build_marker_feed(session))
+            current = _feed
+    return current[1]
@@ -0,0 +1,60 @@
+import importlib
+import pkgutil
+import re
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select
+from sqlalchemy.engine import Engine
+
+# Every module named vNNNN_<description> in this package is a migration defining `upgrade(connection)`
+MIGRATION_MODULE = re.compile(r"v(\d{4})_(\w+)")
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def available_migrations() -> list:
+    """
+    Returns the migrations of this package as (version, name, module) tuples, oldest first.
+    """
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = MIGRATION_MODULE.fullmatch(module_info.name)
+        if match:
+            module = importlib.import_module(f"{__name__}.{module_info.name}")
+            migrations.append((int(match.group(1)), match.group(2), module))
+    return sorted(migrations, key=lambda migration: migration[0])
+
+
+def applied_versions(engine: Engine) -> set[int]:
+    schema_migrations.create(engine, checkfirst=True)
+    with engine.connect() as connection:
+        return set(connection.scalars(select(schema_migrations.c.version)))
+
+
+def migrate(engine: Engine, target: int = None) -> list[int]:
+    """
+    Applies the migrations missing from `schema_migrations`, each in its own transaction.
+
+    Migrations check the schema before changing it, so a database created by
+    `Base.metadata.create_all` or `scripts/create_db.py` is upgraded in place.
+
+    :param engine: Engine of the database to upgrade.
+    :param target: Last version to apply, all of them if None.
+    :return: Versions applied by this call.
+    """
+    applied = applied_versions(engine)
+    done = []
+    for version, name, module in available_migrations():
+        if version in applied or (target is not None and version > target):
+            continue
+        with engine.begin() as connection:
+            module.upgrade(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            ))
+        done.append(version)
+    return done
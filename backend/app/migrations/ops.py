@@ -0,0 +1,38 @@
+from sqlalchemy import Column, inspect, text
+from sqlalchemy.engine import Connection
+
+
+def has_table(connection: Connection, table: str) -> bool:
+    return inspect(connection).has_table(table)
+
+
+def has_column(connection: Connection, table: str, column: str) -> bool:
+    return any(existing["name"] == column for existing in inspect(connection).get_columns(table))
+
+
+def has_index(connection: Connection, table: str, name: str) -> bool:
+    inspector = inspect(connection)
+    names = {index["name"] for index in inspector.get_indexes(table)}
+    names.update(constraint["name"] for constraint in inspector.get_unique_constraints(table))
+    return name in names
+
+
+def add_column(connection: Connection, table: str, column: Column):
+    """
+    Adds a nullable column unless the table already has it.
+    """
+    if has_column(connection, table, column.name):
+        return
+    column_type = column.type.compile(dialect=connection.dialect)
+    connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column.name} {column_type}"))
+
+
+def create_index(connection: Connection, table: str, name: str, columns: list[str], unique: bool = False):
+    """
+    Creates an index unless one with the same name exists.
+    """
+    if has_index(connection, table, name):
+        return
+    connection.execute(text(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({', '.join(columns)})"
+    ))
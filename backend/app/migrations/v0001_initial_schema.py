@@ -0,0 +1,54 @@
+"""
+Tables of the original schema: chargers, connectors, users and favorites.
+"""
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, Text
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+Table(
+    "ev_chargers", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("external_id", String(255), unique=True, nullable=False),
+    Column("name", String(255)),
+    Column("brand_name", String(255)),
+    Column("url", Text),
+    Column("latitude", Float, nullable=False),
+    Column("longitude", Float, nullable=False),
+    Column("street_name", String(255)),
+    Column("municipality", String(255)),
+    Column("postal_code", String(10)),
+    Column("freeform_address", Text),
+    Column("charging_availability", Text),
+)
+
+Table(
+    "connectors", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("charger_id", Integer, ForeignKey("ev_chargers.id"), nullable=False),
+    Column("connector_type", String(50), nullable=False),
+    Column("rated_power_kw", Float),
+    Column("voltage_v", Integer),
+    Column("current_a", Integer),
+    Column("current_type", String(10)),
+)
+
+Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", String, unique=True, nullable=False),
+    Column("email", String, unique=True, nullable=False),
+    Column("hashed_password", String, nullable=False),
+    Column("created_at", DateTime),
+)
+
+Table(
+    "favorites", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("charger_id", Integer, ForeignKey("ev_chargers.id", ondelete="CASCADE"), nullable=False),
+)
+
+
+def upgrade(connection: Connection):
+    metadata.create_all(connection)
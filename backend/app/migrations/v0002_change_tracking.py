@@ -0,0 +1,29 @@
+"""
+Content hashes and change versions of chargers, the dataset version and charger tombstones.
+"""
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table
+from sqlalchemy.engine import Connection
+from app.migrations.ops import add_column, create_index
+
+metadata = MetaData()
+
+Table(
+    "dataset_version", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("version", Integer, nullable=False),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "charger_tombstones", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("external_id", String(255), nullable=False),
+    Column("deleted_version", Integer, nullable=False, index=True),
+)
+
+
+def upgrade(connection: Connection):
+    add_column(connection, "ev_chargers", Column("content_hash", String(64)))
+    add_column(connection, "ev_chargers", Column("change_version", Integer))
+    create_index(connection, "ev_chargers", "ix_ev_chargers_change_version", ["change_version"])
+    metadata.create_all(connection)
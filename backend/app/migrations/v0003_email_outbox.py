@@ -0,0 +1,26 @@
+"""
+Outbox of emails waiting to be sent.
+"""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, Text
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+Table(
+    "email_outbox", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("recipient", String(255), nullable=False),
+    Column("subject", String(255), nullable=False),
+    Column("body", Text),
+    Column("status", String(10), nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("next_attempt_at", DateTime, nullable=False),
+    Column("last_error", Text),
+    Column("created_at", DateTime),
+    Column("sent_at", DateTime),
+    Index("ix_email_outbox_due", "status", "next_attempt_at"),
+)
+
+
+def upgrade(connection: Connection):
+    metadata.create_all(connection)
@@ -0,0 +1,28 @@
+"""
+Indexes for bounding-box queries, connector filters and favorites lookups, and
+a unique (user_id, charger_id) pair per favorite.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from app.migrations.ops import create_index, has_index
+
+
+def upgrade(connection: Connection):
+    create_index(connection, "ev_chargers", "ix_ev_chargers_lat_lon", ["latitude", "longitude"])
+
+    # Connector filters are checked per charger, the index covers every filtered column
+    create_index(connection, "connectors", "ix_connectors_charger_type_power",
+                 ["charger_id", "connector_type", "rated_power_kw"])
+    # Lead with the filtered column, for plans that start from the connectors
+    create_index(connection, "connectors", "ix_connectors_type_power",
+                 ["connector_type", "rated_power_kw", "charger_id"])
+    create_index(connection, "connectors", "ix_connectors_power", ["rated_power_kw", "charger_id"])
+
+    if not has_index(connection, "favorites", "uq_favorites_user_charger"):
+        # Keep the oldest of duplicated favorites, the unique index cannot be built otherwise
+        connection.execute(text(
+            "DELETE FROM favorites WHERE id NOT IN "
+            "(SELECT min_id FROM (SELECT MIN(id) AS min_id FROM favorites GROUP BY user_id, charger_id) AS keep)"
+        ))
+        create_index(connection, "favorites", "uq_favorites_user_charger", ["user_id", "charger_id"], unique=True)
+    create_index(connection, "favorites", "ix_favorites_charger_id", ["charger_id"])
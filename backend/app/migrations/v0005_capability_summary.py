@@ -0,0 +1,36 @@
+"""
+Capability summary of the connectors of every charger: power range, connector type mask and AC/DC flags.
+"""
+from collections import defaultdict
+from sqlalchemy import Boolean, Column, Float, Integer, bindparam, text
+from sqlalchemy.engine import Connection
+from app.capabilities import summarize_connectors
+from app.migrations.ops import add_column, create_index
+
+BATCH_SIZE = 1000
+
+
+def upgrade(connection: Connection):
+    add_column(connection, "ev_chargers", Column("max_power_kw", Float))
+    add_column(connection, "ev_chargers", Column("min_power_kw", Float))
+    add_column(connection, "ev_chargers", Column("connector_mask", Integer))
+    add_column(connection, "ev_chargers", Column("has_ac", Boolean))
+    add_column(connection, "ev_chargers", Column("has_dc", Boolean))
+    create_index(connection, "ev_chargers", "ix_ev_chargers_max_power", ["max_power_kw"])
+    create_index(connection, "ev_chargers", "ix_ev_chargers_min_power", ["min_power_kw"])
+
+    connectors = defaultdict(list)
+    rows = connection.execute(text("SELECT charger_id, connector_type, rated_power_kw, current_type FROM connectors"))
+    for row in rows.mappings():
+        connectors[row["charger_id"]].append(row)
+    charger_ids = connection.execute(text("SELECT id FROM ev_chargers")).scalars().all()
+
+    update = text(
+        "UPDATE ev_chargers SET max_power_kw = :max_power_kw, min_power_kw = :min_power_kw, "
+        "connector_mask = :connector_mask, has_ac = :has_ac, has_dc = :has_dc WHERE id = :charger_id"
+    ).bindparams(bindparam("has_ac", type_=Boolean), bindparam("has_dc", type_=Boolean))
+    for start in range(0, len(charger_ids), BATCH_SIZE):
+        connection.execute(update, [
+            {**summarize_connectors(connectors[charger_id]), "charger_id": charger_id}
+            for charger_id in charger_ids[start:start + BATCH_SIZE]
+        ])
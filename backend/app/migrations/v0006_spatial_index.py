@@ -0,0 +1,81 @@
+"""
+Native spatial index of charger positions: an R*Tree virtual table on SQLite
+and a PostGIS geography column with GiST indexes on PostgreSQL. Skipped when
+the database has neither, the in-process index is used then.
+"""
+from sqlalchemy import exc, text
+from sqlalchemy.engine import Connection
+from app.migrations.ops import has_column
+
+
+def upgrade(connection: Connection):
+    if connection.dialect.name == "sqlite":
+        upgrade_sqlite(connection)
+    elif connection.dialect.name == "postgresql":
+        upgrade_postgresql(connection)
+
+
+def upgrade_sqlite(connection: Connection):
+    try:
+        connection.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS charger_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+        )
+    except exc.OperationalError:
+        # SQLite built without the R*Tree module
+        return
+
+    # Upserts of update_db fire the insert or the update trigger. Statements in a trigger
+    # take the conflict handling of the outer statement, so they must not rely on OR REPLACE
+    connection.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS ev_chargers_rtree_insert AFTER INSERT ON ev_chargers BEGIN "
+        "INSERT INTO charger_rtree VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude); "
+        "END"
+    )
+    connection.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS ev_chargers_rtree_update AFTER UPDATE OF latitude, longitude ON ev_chargers BEGIN "
+        "UPDATE charger_rtree SET min_lat = new.latitude, max_lat = new.latitude, "
+        "min_lon = new.longitude, max_lon = new.longitude WHERE id = new.id; "
+        "END"
+    )
+    connection.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS ev_chargers_rtree_delete AFTER DELETE ON ev_chargers BEGIN "
+        "DELETE FROM charger_rtree WHERE id = old.id; "
+        "END"
+    )
+    connection.exec_driver_sql(
+        "INSERT OR REPLACE INTO charger_rtree SELECT id, latitude, latitude, longitude, longitude FROM ev_chargers"
+    )
+
+
+def upgrade_postgresql(connection: Connection):
+    available = connection.execute(text("SELECT 1 FROM pg_available_extensions WHERE name = 'postgis'")).first()
+    if available is None:
+        return
+    try:
+        with connection.begin_nested():
+            connection.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS postgis")
+    except exc.DBAPIError:
+        # Installing the extension needs privileges the application role may not have
+        return
+
+    if not has_column(connection, "ev_chargers", "geog"):
+        connection.exec_driver_sql("ALTER TABLE ev_chargers ADD COLUMN geog geography(Point, 4326)")
+    connection.exec_driver_sql(
+        "CREATE OR REPLACE FUNCTION ev_chargers_set_geog() RETURNS trigger AS $$ BEGIN "
+        "NEW.geog := ST_SetSRID(ST_MakePoint(NEW.longitude, NEW.latitude), 4326)::geography; "
+        "RETURN NEW; "
+        "END $$ LANGUAGE plpgsql"
+    )
+    connection.exec_driver_sql("DROP TRIGGER IF EXISTS ev_chargers_geog ON ev_chargers")
+    connection.exec_driver_sql(
+        "CREATE TRIGGER ev_chargers_geog BEFORE INSERT OR UPDATE OF latitude, longitude ON ev_chargers "
+        "FOR EACH ROW EXECUTE FUNCTION ev_chargers_set_geog()"
+    )
+    connection.exec_driver_sql(
+        "UPDATE ev_chargers SET geog = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography"
+    )
+    # Distance and KNN queries on the geography, latitude/longitude boxes on the geometry
+    connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_ev_chargers_geog ON ev_chargers USING GIST (geog)")
+    connection.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_ev_chargers_geom ON ev_chargers USING GIST ((geog::geometry))"
+    )
@@ -0,0 +1,59 @@
+"""
+Text index over the name and address of chargers: an FTS5 table on SQLite and a
+generated tsvector column with a GIN index on PostgreSQL. Skipped when SQLite
+is built without FTS5, searches scan the chargers then.
+"""
+from sqlalchemy import exc
+from sqlalchemy.engine import Connection
+from app.migrations.ops import has_column
+
+COLUMNS = ("name", "brand_name", "street_name", "municipality", "postal_code", "freeform_address")
+
+
+def upgrade(connection: Connection):
+    if connection.dialect.name == "sqlite":
+        upgrade_sqlite(connection)
+    elif connection.dialect.name == "postgresql":
+        upgrade_postgresql(connection)
+
+
+def upgrade_sqlite(connection: Connection):
+    columns = ", ".join(COLUMNS)
+    try:
+        connection.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS charger_search USING fts5({columns}, "
+            "content='ev_chargers', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+    except exc.OperationalError:
+        # SQLite built without FTS5
+        return
+
+    # An external-content table only indexes what the triggers hand to it, a
+    # removed row has to be deleted with the values it was indexed with
+    new_values = ", ".join(f"new.{column}" for column in COLUMNS)
+    old_values = ", ".join(f"old.{column}" for column in COLUMNS)
+    insert = f"INSERT INTO charger_search (rowid, {columns}) VALUES (new.id, {new_values}); "
+    delete = f"INSERT INTO charger_search (charger_search, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+    connection.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS ev_chargers_search_insert AFTER INSERT ON ev_chargers BEGIN {insert}END"
+    )
+    connection.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS ev_chargers_search_update AFTER UPDATE OF {columns} ON ev_chargers "
+        f"BEGIN {delete}{insert}END"
+    )
+    connection.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS ev_chargers_search_delete AFTER DELETE ON ev_chargers BEGIN {delete}END"
+    )
+    connection.exec_driver_sql("INSERT INTO charger_search (charger_search) VALUES ('rebuild')")
+
+
+def upgrade_postgresql(connection: Connection):
+    if not has_column(connection, "ev_chargers", "search_vector"):
+        document = " || ' ' || ".join(f"coalesce({column}, '')" for column in COLUMNS)
+        connection.exec_driver_sql(
+            f"ALTER TABLE ev_chargers ADD COLUMN search_vector tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('simple'::regconfig, {document})) STORED"
+        )
+    connection.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_ev_chargers_search ON ev_chargers USING GIN (search_vector)"
+    )
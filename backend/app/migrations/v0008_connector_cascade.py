@@ -0,0 +1,57 @@
+"""
+ON DELETE CASCADE on connectors.charger_id, matching the cascade of the ORM
+relationship, in place of the plain foreign key created by v0001. PostgreSQL
+replaces the constraint, SQLite cannot alter one and rebuilds the table.
+Databases created from the models already have the cascade and are skipped.
+"""
+from sqlalchemy import Column, Float, ForeignKey, Integer, MetaData, String, Table, inspect, text
+from sqlalchemy.engine import Connection
+from app.migrations.ops import create_index
+
+metadata = MetaData()
+
+Table("ev_chargers", metadata, Column("id", Integer, primary_key=True))
+
+# Copy of `connectors` built next to the old table, then renamed over it
+connectors = Table(
+    "connectors_rebuild", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("charger_id", Integer, ForeignKey("ev_chargers.id", ondelete="CASCADE"), nullable=False),
+    Column("connector_type", String(50), nullable=False),
+    Column("rated_power_kw", Float),
+    Column("voltage_v", Integer),
+    Column("current_a", Integer),
+    Column("current_type", String(10)),
+)
+
+
+def charger_foreign_key(connection: Connection):
+    for foreign_key in inspect(connection).get_foreign_keys("connectors"):
+        if foreign_key["referred_table"] == "ev_chargers":
+            return foreign_key
+    return None
+
+
+def upgrade(connection: Connection):
+    foreign_key = charger_foreign_key(connection)
+    if foreign_key is None or (foreign_key["options"].get("ondelete") or "").upper() == "CASCADE":
+        return
+    if connection.dialect.name == "sqlite":
+        upgrade_sqlite(connection)
+    else:
+        name = foreign_key["name"]
+        connection.execute(text(
+            f"ALTER TABLE connectors DROP CONSTRAINT {name}, ADD CONSTRAINT {name} "
+            "FOREIGN KEY (charger_id) REFERENCES ev_chargers (id) ON DELETE CASCADE"
+        ))
+
+
+def upgrade_sqlite(connection: Connection):
+    indexes = inspect(connection).get_indexes("connectors")
+    connectors.create(connection)
+    columns = ", ".join(column.name for column in connectors.columns)
+    connection.execute(text(f"INSERT INTO {connectors.name} ({columns}) SELECT {columns} FROM connectors"))
+    connection.execute(text("DROP TABLE connectors"))
+    connection.execute(text(f"ALTER TABLE {connectors.name} RENAME TO connectors"))
+    for index in indexes:
+        create_index(connection, "connectors", index["name"], index["column_names"], unique=bool(index["unique"]))
@@ -0,0 +1,23 @@
+"""
+Single-use password reset codes, stored as hashes.
+"""
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+Table("users", metadata, Column("id", Integer, primary_key=True))
+
+Table(
+    "password_resets", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("code_hash", String(64), nullable=False),
+    Column("expires_at", DateTime, nullable=False),
+    Column("used_at", DateTime),
+    Index("ix_password_resets_user_code", "user_id", "code_hash"),
+)
+
+
+def upgrade(connection: Connection):
+    metadata.create_all(connection)
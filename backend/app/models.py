@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, Text, ForeignKey, DateTime, Index, Boolean
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -17,14 +17,30 @@ class EVCharger(Base):
     postal_code = Column(String(10))
     freeform_address = Column(Text)
     charging_availability = Column(Text)
+    content_hash = Column(String(64))
+    # Dataset version in which the row was last inserted or changed
+    change_version = Column(Integer, index=True)
+    # Summary of the connectors, written together with them by crud.update_db (see app/capabilities.py)
+    max_power_kw = Column(Float)
+    min_power_kw = Column(Float)
+    connector_mask = Column(Integer, default=0)
+    has_ac = Column(Boolean, default=False)
+    has_dc = Column(Boolean, default=False)
     connectors = relationship("Connector", back_populates="charger", cascade="all, delete-orphan")
 
     favorited_by = relationship("Favorite", back_populates="charger", cascade="all, delete-orphan")
 
+    # Schema changes also need a migration in app/migrations
+    __table_args__ = (
+        Index("ix_ev_chargers_lat_lon", "latitude", "longitude"),
+        Index("ix_ev_chargers_max_power", "max_power_kw"),
+        Index("ix_ev_chargers_min_power", "min_power_kw"),
+    )
+
 class Connector(Base):
     __tablename__ = 'connectors'
     id = Column(Integer, primary_key=True)
-    charger_id = Column(Integer, ForeignKey('ev_chargers.id'), nullable=False)
+    charger_id = Column(Integer, ForeignKey('ev_chargers.id', ondelete='CASCADE'), nullable=False)
     connector_type = Column(String(50), nullable=False)
     rated_power_kw = Column(Float)
     voltage_v = Column(Integer)
@@ -32,6 +48,12 @@ class Connector(Base):
     current_type = Column(String(10))
     charger = relationship("EVCharger", back_populates="connectors")
 
+    __table_args__ = (
+        Index("ix_connectors_charger_type_power", "charger_id", "connector_type", "rated_power_kw"),
+        Index("ix_connectors_type_power", "connector_type", "rated_power_kw", "charger_id"),
+        Index("ix_connectors_power", "rated_power_kw", "charger_id"),
+    )
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -41,6 +63,7 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     favorites = relationship("Favorite", back_populates="user", cascade="all, delete-orphan")
+    password_resets = relationship("PasswordReset", cascade="all, delete-orphan")
 
 class Favorite(Base):
     __tablename__ = "favorites"
@@ -50,3 +73,51 @@ class Favorite(Base):
 
     user = relationship("User", back_populates="favorites")
     charger = relationship("EVCharger", back_populates="favorited_by")
+
+    __table_args__ = (
+        Index("uq_favorites_user_charger", "user_id", "charger_id", unique=True),
+        Index("ix_favorites_charger_id", "charger_id"),
+    )
+
+class PasswordReset(Base):
+    __tablename__ = "password_resets"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # SHA-256 of the code sent by email, the code itself is never stored here
+    code_hash = Column(String(64), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_password_resets_user_code", "user_id", "code_hash"),
+    )
+
+class DatasetVersion(Base):
+    __tablename__ = "dataset_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ChargerTombstone(Base):
+    __tablename__ = "charger_tombstones"
+    id = Column(Integer, primary_key=True)
+    external_id = Column(String(255), nullable=False)
+    deleted_version = Column(Integer, nullable=False, index=True)
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    id = Column(Integer, primary_key=True)
+    recipient = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body = Column(Text)
+    # pending -> sent, or failed once every attempt is used up
+    status = Column(String(10), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_email_outbox_due", "status", "next_attempt_at"),
+    )
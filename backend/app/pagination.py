@@ -0,0 +1,34 @@
+import base64
+import binascii
+import json
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(position: dict) -> str:
+    """
+    Encodes the sort key of the last returned row as an opaque cursor.
+
+    :param position: Sort key, e.g. {"id": 42} or {"distance_km": 3.2, "id": 42}.
+    :return: URL-safe cursor string.
+    """
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: dict) -> tuple:
+    """
+    Decodes a cursor produced by `encode_cursor`.
+
+    :param cursor: Cursor string received from the client.
+    :param keys: Keys the cursor must contain mapped to their types, e.g. {"id": int}.
+    :return: Tuple of values for `keys`, in the same order.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+        return tuple(cast(position[key]) for key, cast in keys.items())
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
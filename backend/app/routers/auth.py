@@ -1,28 +1,33 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.crud import create_user, get_user_by_username, verify_password, get_user_by_email
-from app.auth import create_access_token
+from app.crud import add_user, get_user_by_username, get_user_by_email
+from app.auth import create_access_token, remember_user
+from app.hashing import password_hasher
 from app.schemas.auth import RegisterRequest, LoginRequest
 
 router = APIRouter()
 
+# Password hashing runs on the hasher's process pool, database calls on the threadpool
 @router.post("/register")
-def register(payload: RegisterRequest, db: Session = Depends(get_db)):
-    if get_user_by_username(db, payload.username):
+async def register(payload: RegisterRequest, db: Session = Depends(get_db)):
+    if await run_in_threadpool(get_user_by_username, db, payload.username):
         raise HTTPException(status_code=400, detail="Username already registered")
-    if get_user_by_email(db, payload.email):
+    if await run_in_threadpool(get_user_by_email, db, payload.email):
         raise HTTPException(status_code=400, detail="Email already registered")
-    user = create_user(db, payload.username, payload.email, payload.password)
+    hashed_password = await password_hasher.hash(payload.password)
+    user = await run_in_threadpool(add_user, db, payload.username, payload.email, hashed_password)
     return {"message": "User created successfully", "username": user.username}
 
 @router.post("/login")
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
-    user = get_user_by_username(db, payload.username)
-    if not user or not verify_password(payload.password, user.hashed_password):
+async def login(payload: LoginRequest, db: Session = Depends(get_db)):
+    user = await run_in_threadpool(get_user_by_username, db, payload.username)
+    if not user or not await password_hasher.verify(payload.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     access_token = create_access_token({"sub": user.username})
+    remember_user(access_token, user)
     
     return {
         "access_token": access_token,
@@ -1,80 +1,386 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.models import EVCharger, Connector
-from app.database import get_db
-import requests
-from dotenv import load_dotenv
-import os
-from math import radians, cos, sin, sqrt, atan2
+from app.models import EVCharger
+from app.database import get_db, SessionLocal
+from app.spatial import get_charger_index
+from app.spatial_backend import get_spatial_backend
+from app.corridor import chargers_along_route, decode_polyline
+from app.search import get_search_backend, nearest_matches, search_terms
+from app.clustering import get_cluster_grid, MAX_CLUSTER_ZOOM
+from app.crud import (
+    get_chargers_in_bounds, get_charger_by_id, get_charger_with_connectors, get_charging_availability_ids, get_changes,
+    query_chargers
+)
+from app.dataset import get_dataset_version
+from app.markers import MEDIA_TYPE as MARKERS_MEDIA_TYPE, get_marker_feed
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor
+from app.cache import cached_response
+from app.serialization import FastJSONResponse, dumps, to_rows
+from app.tomtom import availability_client
+from app.schemas.chargers import ChargingStatusBatchRequest, RouteChargersRequest
+import httpx
 from typing import Optional
 from urllib.parse import unquote
 
-load_dotenv()
 router = APIRouter()
-API_KEY = os.getenv("API_KEY")
-BASE_URL = "https://api.tomtom.com/search/2/chargingAvailability.json"
 
+# Rows fetched from the database cursor, and written to the response, at a time
+EXPORT_BATCH_SIZE = 1000
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    R = 6371.0
+# Columns published by the API, bookkeeping and connector summary columns stay internal
+CHARGER_FIELDS = (
+    "id", "external_id", "name", "brand_name", "url", "latitude", "longitude", "street_name", "municipality",
+    "postal_code", "freeform_address", "charging_availability"
+)
+SEARCH_FIELDS = (
+    "id", "name", "brand_name", "street_name", "municipality", "postal_code", "freeform_address", "latitude", "longitude"
+)
+DEFAULT_SEARCH_LIMIT = 10
 
-    lat1_rad = radians(lat1)
-    lon1_rad = radians(lon1)
-    lat2_rad = radians(lat2)
-    lon2_rad = radians(lon2)
 
-    dlon = lon2_rad - lon1_rad
-    dlat = lat2_rad - lat1_rad
+def select_columns(query, fields):
+    """
+    Narrows a charger query to plain column tuples, skipping ORM hydration.
 
-    a = sin(dlat / 2)**2 + cos(lat1_rad) * cos(lat2_rad) * sin(dlon / 2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    :param query: Query of EVCharger objects.
+    :param fields: Names of the columns to return.
+    :return: List of (charger ID, tuple of the `fields` values) tuples.
+    """
+    columns = list(fields) if "id" in fields else [*fields, "id"]
+    id_index = columns.index("id")
+    rows = query.with_entities(*(getattr(EVCharger, column) for column in columns))
+    return [(row[id_index], tuple(row[:len(fields)])) for row in rows]
 
-    distance = R * c
-    return distance
+def parse_fields(fields: Optional[str]):
+    if fields is None:
+        return None
+    selected = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = set(selected) - set(CHARGER_FIELDS) - {"distance_km"}
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return selected
+
+def list_chargers(
+    db: Session,
+    user_latitude: Optional[float],
+    user_longitude: Optional[float],
+    min_power: Optional[float],
+    max_power: Optional[float],
+    connector_types: Optional[list[str]],
+    limit: int,
+    radius_km: Optional[float],
+    cursor: Optional[str],
+    selected_fields: Optional[list[str]],
+):
+    """
+    Builds one page of the charger listing.
+
+    :return: Tuple (list of charger rows, response headers).
+    """
+    row_fields = [field for field in selected_fields if field != "distance_km"] if selected_fields else list(CHARGER_FIELDS)
+
+    query = query_chargers(db, min_power=min_power, max_power=max_power, connector_types=connector_types)
+    filtered = min_power is not None or max_power is not None or connector_types is not None
+
+    headers = {}
+
+    if user_latitude is None or user_longitude is None:
+        if cursor is not None:
+            after_id, = decode_cursor(cursor, {"id": int})
+            query = query.filter(EVCharger.id > after_id)
+
+        chargers = select_columns(query.order_by(EVCharger.id).limit(limit + 1), row_fields)
+        if not chargers and cursor is None:
+            raise HTTPException(status_code=404, detail="No chargers found with the specified filters.")
+
+        page = chargers[:limit]
+        if len(chargers) > limit:
+            headers["X-Next-Cursor"] = encode_cursor({"id": page[-1][0]})
+        return to_rows((values for _, values in page), row_fields), headers
+
+    # Ordering by distance is done by the spatial index of the database, or in process without one
+    after = decode_cursor(cursor, {"distance_km": float, "id": int}) if cursor is not None else None
+    nearest = get_spatial_backend(db).nearest(
+        query, user_latitude, user_longitude, k=limit + 1, radius_km=radius_km, after=after, filtered=filtered
+    )
+
+    if not nearest and cursor is None:
+        raise HTTPException(status_code=404, detail="No chargers found with the specified filters.")
+
+    page = nearest[:limit]
+    if len(nearest) > limit:
+        last_id, last_distance = page[-1]
+        headers["X-Next-Cursor"] = encode_cursor({"distance_km": last_distance, "id": last_id})
+
+    page_query = db.query(EVCharger).filter(EVCharger.id.in_([charger_id for charger_id, _ in page]))
+    chargers_by_id = dict(select_columns(page_query, row_fields))
+
+    if selected_fields is not None and "distance_km" not in selected_fields:
+        return to_rows((chargers_by_id[charger_id] for charger_id, _ in page if charger_id in chargers_by_id), row_fields), headers
+
+    return to_rows((
+        (*chargers_by_id[charger_id], round(distance, 3))
+        for charger_id, distance in page
+        if charger_id in chargers_by_id
+    ), (*row_fields, "distance_km")), headers
 
 @router.get("/chargers/")
 def get_chargers(
+    request: Request,
     user_latitude: Optional[float] = None,
     user_longitude: Optional[float] = None,
     min_power: float = Query(None, description="Minimal power of the connector (in kW)"),
     max_power: float = Query(None, description="Maximal power of the connector (in kW)"),
     connector_types: str = Query(None, description="Comma-separated list of connector types (e.g., 'IEC62196Type2CCS, IEC62196Type3, Chademo')"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximal number of chargers in one page"),
+    radius_km: Optional[float] = Query(None, gt=0, description="Only return chargers within this distance from the user (in km)"),
+    cursor: Optional[str] = Query(None, description="Value of the X-Next-Cursor header of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to return (e.g., 'id,latitude,longitude,name')"),
+    db: Session = Depends(get_db)
+):
+    selected_fields = parse_fields(fields)
+    connector_types_list = sorted(set(unquote(connector_types).split(','))) if connector_types is not None else None
+
+    if radius_km is not None and (user_latitude is None or user_longitude is None):
+        raise HTTPException(status_code=400, detail="radius_km requires user_latitude and user_longitude.")
+
+    key = (
+        "chargers", user_latitude, user_longitude, min_power, max_power,
+        tuple(connector_types_list) if connector_types_list is not None else None,
+        limit, radius_km, cursor,
+        tuple(selected_fields) if selected_fields is not None else None,
+    )
+    return cached_response(request, db, key, lambda: list_chargers(
+        db, user_latitude, user_longitude, min_power, max_power, connector_types_list,
+        limit, radius_km, cursor, selected_fields
+    ))
+
+@router.get("/chargers/viewport")
+def get_chargers_in_viewport(
+    request: Request,
+    ne_lat: float = Query(..., ge=-90, le=90, description="Latitude of the north-east corner of the map"),
+    ne_lon: float = Query(..., ge=-180, le=180, description="Longitude of the north-east corner of the map"),
+    sw_lat: float = Query(..., ge=-90, le=90, description="Latitude of the south-west corner of the map"),
+    sw_lon: float = Query(..., ge=-180, le=180, description="Longitude of the south-west corner of the map"),
+    zoom: int = Query(..., ge=0, le=22, description="Zoom level of the map"),
+    db: Session = Depends(get_db)
+):
+    if sw_lat > ne_lat or sw_lon > ne_lon:
+        raise HTTPException(status_code=400, detail="South-west corner must be below and left of the north-east corner.")
+
+    def build():
+        if zoom > MAX_CLUSTER_ZOOM:
+            chargers = [
+                {
+                    "id": charger.id,
+                    "name": charger.name,
+                    "latitude": charger.latitude,
+                    "longitude": charger.longitude,
+                }
+                for charger in get_chargers_in_bounds(db, (ne_lat, ne_lon), (sw_lat, sw_lon))
+            ]
+            return {"zoom": zoom, "clusters": [], "chargers": chargers}, {}
+
+        clusters, chargers = get_cluster_grid(db).query(zoom, sw_lat, sw_lon, ne_lat, ne_lon)
+        return {"zoom": zoom, "clusters": clusters, "chargers": chargers}, {}
+
+    return cached_response(request, db, ("viewport", ne_lat, ne_lon, sw_lat, sw_lon, zoom), build)
+
+def export_chargers(min_power, max_power, connector_types, fields):
+    """
+    Yields chargers as NDJSON, one batch of lines at a time.
+
+    Runs with its own session, because the request's session is closed before
+    a streaming response is sent. Rows are read as plain tuples through a
+    server-side cursor, so memory use does not depend on the number of chargers.
+    """
+    db = SessionLocal()
+    try:
+        query = query_chargers(db, min_power=min_power, max_power=max_power, connector_types=connector_types)
+        rows = query.with_entities(*(getattr(EVCharger, field) for field in fields)).order_by(EVCharger.id)
+        lines = []
+        for row in rows.yield_per(EXPORT_BATCH_SIZE):
+            lines.append(dumps(dict(zip(fields, row))))
+            if len(lines) == EXPORT_BATCH_SIZE:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+    finally:
+        db.close()
+
+@router.get("/chargers/export")
+def get_chargers_export(
+    min_power: float = Query(None, description="Minimal power of the connector (in kW)"),
+    max_power: float = Query(None, description="Maximal power of the connector (in kW)"),
+    connector_types: str = Query(None, description="Comma-separated list of connector types"),
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to return (e.g., 'id,latitude,longitude,name')"),
+):
+    selected_fields = parse_fields(fields) or list(CHARGER_FIELDS)
+    if "distance_km" in selected_fields:
+        raise HTTPException(status_code=400, detail="Unknown fields: distance_km")
+    connector_types_list = sorted(set(unquote(connector_types).split(','))) if connector_types is not None else None
+    return StreamingResponse(
+        export_chargers(min_power, max_power, connector_types_list, selected_fields),
+        media_type="application/x-ndjson"
+    )
+
+@router.get("/chargers/markers")
+def get_charger_markers(
+    request: Request,
+    min_power: float = Query(None, description="Minimal power of the connector (in kW)"),
+    max_power: float = Query(None, description="Maximal power of the connector (in kW)"),
+    connector_types: str = Query(None, description="Comma-separated list of connector types"),
     db: Session = Depends(get_db)
 ):
-    query = db.query(EVCharger)
+    connector_types_list = sorted(set(unquote(connector_types).split(','))) if connector_types is not None else None
+
+    def build():
+        feed = get_marker_feed(db)
+        if min_power is None and max_power is None and connector_types_list is None:
+            return feed.body, {}
+        query = query_chargers(db, min_power=min_power, max_power=max_power, connector_types=connector_types_list)
+        return feed.encode(charger_id for charger_id, in query.with_entities(EVCharger.id)), {}
+
+    key = ("markers", min_power, max_power, tuple(connector_types_list) if connector_types_list is not None else None)
+    return cached_response(request, db, key, build, media_type=MARKERS_MEDIA_TYPE, serializer=bytes)
+
+def search_chargers(
+    db: Session,
+    terms: list[str],
+    user_latitude: Optional[float],
+    user_longitude: Optional[float],
+    min_power: Optional[float],
+    max_power: Optional[float],
+    connector_types: Optional[list[str]],
+    limit: int,
+):
+    """
+    Finds chargers whose name or address matches all search terms.
+
+    Matches are ordered by distance from the user when a location is given,
+    by relevance otherwise.
+
+    :return: List of charger rows, with `distance_km` when ordered by distance.
+    """
+    query = query_chargers(db, min_power=min_power, max_power=max_power, connector_types=connector_types)
+
+    if user_latitude is None or user_longitude is None:
+        search_backend = get_search_backend(db)
+        query = search_backend.match(query, terms).order_by(*search_backend.relevance(terms)).limit(limit)
+        return to_rows((values for _, values in select_columns(query, SEARCH_FIELDS)), SEARCH_FIELDS)
+
+    filtered = min_power is not None or max_power is not None or connector_types is not None
+    nearest = nearest_matches(db, query, terms, user_latitude, user_longitude, limit, filtered=filtered)
+    page_query = db.query(EVCharger).filter(EVCharger.id.in_([charger_id for charger_id, _ in nearest]))
+    chargers_by_id = dict(select_columns(page_query, SEARCH_FIELDS))
+    return to_rows((
+        (*chargers_by_id[charger_id], round(distance, 3))
+        for charger_id, distance in nearest
+        if charger_id in chargers_by_id
+    ), (*SEARCH_FIELDS, "distance_km"))
 
+@router.get("/chargers/search")
+def get_chargers_search(
+    q: str = Query(..., max_length=200, description="Words to find in the name or address of a charger, the last one may be incomplete"),
+    user_latitude: Optional[float] = Query(None, ge=-90, le=90, description="Latitude of the user, orders matches by distance"),
+    user_longitude: Optional[float] = Query(None, ge=-180, le=180, description="Longitude of the user, orders matches by distance"),
+    min_power: float = Query(None, description="Minimal power of the connector (in kW)"),
+    max_power: float = Query(None, description="Maximal power of the connector (in kW)"),
+    connector_types: str = Query(None, description="Comma-separated list of connector types"),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_PAGE_SIZE, description="Maximal number of chargers"),
+    db: Session = Depends(get_db)
+):
+    terms = search_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search text must contain a word of at least two characters.")
+    connector_types_list = sorted(set(unquote(connector_types).split(','))) if connector_types is not None else None
+    # Not cached, autocomplete keys rarely repeat and would push the listing pages out of the cache
+    return FastJSONResponse(search_chargers(
+        db, terms, user_latitude, user_longitude, min_power, max_power, connector_types_list, limit
+    ))
+
+def route_chargers(
+    db: Session,
+    route_latitudes,
+    route_longitudes,
+    corridor_km: float,
+    min_power: Optional[float],
+    max_power: Optional[float],
+    connector_types: Optional[list[str]],
+    limit: int,
+    cursor: Optional[str],
+):
+    """
+    Builds one page of the chargers within `corridor_km` of a route, in the order the route passes them.
+
+    :return: Tuple (list of charger rows with `route_km` and `distance_km`, response headers).
+    """
+    allowed = None
     if min_power is not None or max_power is not None or connector_types is not None:
-        query = query.join(Connector)
+        query = query_chargers(db, min_power=min_power, max_power=max_power, connector_types=connector_types)
+        allowed = {charger_id for charger_id, in query.with_entities(EVCharger.id)}
 
-    if min_power is not None:
-        query = query.filter(Connector.rated_power_kw >= min_power)
-    if max_power is not None:
-        query = query.filter(Connector.rated_power_kw <= max_power)
+    after = decode_cursor(cursor, {"route_km": float, "id": int}) if cursor is not None else None
+    along = chargers_along_route(
+        get_charger_index(db), route_latitudes, route_longitudes, corridor_km, allowed=allowed, k=limit + 1, after=after
+    )
 
-    if connector_types is not None:
-        connector_types_list = unquote(connector_types).split(',')
-        query = query.filter(Connector.connector_type.in_(connector_types_list))
+    headers = {}
+    page = along[:limit]
+    if len(along) > limit:
+        last_id, last_route_km, _ = page[-1]
+        headers["X-Next-Cursor"] = encode_cursor({"route_km": last_route_km, "id": last_id})
 
-    chargers = query.all()
+    page_query = db.query(EVCharger).filter(EVCharger.id.in_([charger_id for charger_id, _, _ in page]))
+    chargers_by_id = dict(select_columns(page_query, CHARGER_FIELDS))
+    return to_rows((
+        (*chargers_by_id[charger_id], round(route_km, 3), round(distance, 3))
+        for charger_id, route_km, distance in page
+        if charger_id in chargers_by_id
+    ), (*CHARGER_FIELDS, "route_km", "distance_km")), headers
 
-    if not chargers:
-        raise HTTPException(status_code=404, detail="No chargers found with the specified filters.")
-    
-    if user_latitude is not None and user_longitude is not None:
-        chargers_with_distance = []
-        for charger in chargers:
-            distance = calculate_distance(user_latitude, user_longitude, charger.latitude, charger.longitude)
-            chargers_with_distance.append((charger, distance))
+@router.post("/chargers/route")
+def get_chargers_along_route(payload: RouteChargersRequest, db: Session = Depends(get_db)):
+    try:
+        route_latitudes, route_longitudes = decode_polyline(payload.polyline, payload.precision)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    connector_types_list = sorted(set(payload.connector_types)) if payload.connector_types is not None else None
+    rows, headers = route_chargers(
+        db, route_latitudes, route_longitudes, payload.corridor_km, payload.min_power, payload.max_power,
+        connector_types_list, payload.limit, payload.cursor
+    )
+    # Not cached, a route is rarely requested twice and its polyline would make a large key
+    return FastJSONResponse(rows, headers=headers)
 
-        chargers_with_distance.sort(key=lambda x: x[1])
+@router.get("/chargers/changes")
+def get_charger_changes(
+    request: Request,
+    since: int = Query(0, ge=0, description="Dataset version the client is up to date with, 0 for all chargers"),
+    db: Session = Depends(get_db)
+):
+    def build():
+        # Read the version first, rows committed in the meantime are sent again on the next sync
+        version = get_dataset_version(db)
+        # A client ahead of the server (restored or reseeded database) cannot be diffed, it gets a full snapshot
+        chargers, deleted = get_changes(db, since if since <= version else 0, CHARGER_FIELDS)
+        return {
+            "version": version,
+            "chargers": to_rows(chargers, CHARGER_FIELDS),
+            "deleted": deleted,
+        }, {}
+
+    return cached_response(request, db, ("changes", since), build)
 
-        return [charger for charger, _ in chargers_with_distance]
-    else:
-        return chargers
-    
 @router.get("/chargers/{charger_id}")
-def get_charger_details(charger_id: int, db: Session = Depends(get_db)):
-    charger = db.query(EVCharger).filter(EVCharger.id == charger_id).first()
+def get_charger_details(request: Request, charger_id: int, db: Session = Depends(get_db)):
+    return cached_response(request, db, ("charger", charger_id), lambda: (build_charger_details(db, charger_id), {}))
+
+def build_charger_details(db: Session, charger_id: int):
+    charger = get_charger_with_connectors(db, charger_id)
 
     if not charger:
         raise HTTPException(status_code=404, detail="Charger not found")
@@ -99,11 +405,11 @@ def get_charger_details(charger_id: int, db: Session = Depends(get_db)):
     return charger_data
 
 @router.get("/charging-status/{charger_id}")
-def get_charging_status(
+async def get_charging_status(
     charger_id: int,
     db: Session = Depends(get_db)
 ):
-    charger = db.query(EVCharger).filter(EVCharger.id == charger_id).first()
+    charger = await run_in_threadpool(get_charger_by_id, db, charger_id)
 
     if not charger:
         raise HTTPException(status_code=404, detail="Charger not found")
@@ -111,30 +417,43 @@ def get_charging_status(
     if not charger.charging_availability:
         raise HTTPException(status_code=400, detail="Charging availability not found for this charger")
 
-    url = f"{BASE_URL}?key={API_KEY}&chargingAvailability={charger.charging_availability}"
-
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-
-        availability_data = response.json()
-
-        connectors = availability_data.get("connectors", [])
-        status = {}
-        
-        for connector in connectors:
-            connector_type = connector.get("type")
-            availability = connector.get("availability", {}).get("current", {})
-            status[connector_type] = {
-                "available": availability.get("available"),
-                "occupied": availability.get("occupied"),
-                "reserved": availability.get("reserved"),
-                "outOfService": availability.get("outOfService")
-            }
+        return await availability_client.get_status(charger.charging_availability)
 
-        return status
-
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Error making the request: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
+@router.post("/charging-status/batch")
+async def get_charging_status_batch(
+    payload: ChargingStatusBatchRequest,
+    db: Session = Depends(get_db)
+):
+    charger_ids = list(dict.fromkeys(payload.charger_ids))
+    availability_ids = await run_in_threadpool(get_charging_availability_ids, db, charger_ids)
+
+    results = {}
+    errors = {}
+    for charger_id in charger_ids:
+        if charger_id not in availability_ids:
+            errors[charger_id] = "Charger not found"
+        elif not availability_ids[charger_id]:
+            errors[charger_id] = "Charging availability not found for this charger"
+
+    statuses = await availability_client.get_statuses(
+        availability_ids[charger_id] for charger_id in charger_ids if charger_id not in errors
+    )
+
+    for charger_id in charger_ids:
+        if charger_id in errors:
+            continue
+        status = statuses[availability_ids[charger_id]]
+        if isinstance(status, httpx.HTTPError):
+            errors[charger_id] = f"Error making the request: {status}"
+        elif isinstance(status, Exception):
+            errors[charger_id] = f"An unexpected error occurred: {status}"
+        else:
+            results[charger_id] = status
+
+    return {"results": results, "errors": errors}
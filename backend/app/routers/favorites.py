@@ -1,9 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import insert, literal, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.models import Favorite, User, EVCharger
+from app.models import Favorite, EVCharger
 from app.database import get_db
-from app.auth import get_current_user
+from app.auth import AuthenticatedUser, get_current_user
+from app.crud import get_favorite_chargers
 from app.schemas.favorites import FavoriteRequest
+from app.serialization import FastJSONResponse, to_rows
 
 router = APIRouter()
 
@@ -11,24 +15,22 @@ router = APIRouter()
 def add_to_favorites(
     favorite_request: FavoriteRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ):
     charger_id = favorite_request.charger_id
 
-    charger = db.query(EVCharger).filter(EVCharger.id == charger_id).first()
-    if not charger:
-        raise HTTPException(status_code=404, detail="Charger not found")
-
-    existing_favorite = db.query(Favorite).filter(
-        Favorite.user_id == current_user.id,
-        Favorite.charger_id == charger_id
-    ).first()
-
-    if existing_favorite:
+    # A single INSERT ... SELECT: no row is inserted for a missing charger, and
+    # the unique (user_id, charger_id) index rejects a charger that is already a favorite
+    charger = select(literal(current_user.id), EVCharger.id).where(EVCharger.id == charger_id)
+    try:
+        result = db.execute(insert(Favorite).from_select(["user_id", "charger_id"], charger))
+    except IntegrityError:
+        db.rollback()
         raise HTTPException(status_code=409, detail="Charger already in to favorites")
 
-    favorite = Favorite(user_id=current_user.id, charger_id=charger_id)
-    db.add(favorite)
+    if result.rowcount == 0:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Charger not found")
     db.commit()
 
     return {"message": "Charger added to favorites"}
@@ -36,23 +38,14 @@ def add_to_favorites(
 @router.get("/favorites/")
 def get_favorites(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ):
-    favorites = db.query(Favorite).filter(Favorite.user_id == current_user.id).all()
+    favorite_chargers = get_favorite_chargers(db, current_user.id)
     
-    if not favorites:
+    if not favorite_chargers:
         raise HTTPException(status_code=404, detail="No favorite chargers found.")
     
-    chargers = []
-    for favorite in favorites:
-        charger = favorite.charger
-        chargers.append({
-            "charger_id": charger.id,
-            "name": charger.name,
-            "freeform_address": charger.freeform_address,
-        })
-    
-    return chargers
+    return FastJSONResponse(to_rows(favorite_chargers, ("charger_id", "name", "freeform_address")))
 
 
 
@@ -60,7 +53,7 @@ def get_favorites(
 def remove_from_favorites(
     charger_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ):
     favorite = db.query(Favorite).filter(
         Favorite.user_id == current_user.id,
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+from app.auth import get_current_user, user_cache
+from app.cache import response_cache
+from app.database import engine
+from app.db_metrics import db_metrics
+from app.hashing import password_hasher
+from app.mailer import outbox_sender
+
+router = APIRouter()
+
+# Pool, cache and queue internals are only shown to signed-in users
+@router.get("/metrics", dependencies=[Depends(get_current_user)])
+def get_metrics():
+    return {
+        "database": db_metrics.snapshot(engine.pool),
+        "password_hashing": password_hasher.metrics(),
+        "response_cache": {"entries": len(response_cache), "hits": response_cache.hits, "misses": response_cache.misses},
+        "email_outbox": outbox_sender.metrics(),
+        "user_cache": {"entries": len(user_cache), "hits": user_cache.hits, "misses": user_cache.misses},
+    }
@@ -1,12 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.crud import update_user_data, get_user_by_id
+from app.auth import forget_user
+from app.crud import update_user_data, get_user_by_id, create_password_reset, get_password_reset, complete_password_reset
 from app.schemas.users import UpdateUserRequest
 from passlib.context import CryptContext
-from app.utils import send_reset_email, generate_random_password
+from app.hashing import password_hasher
+from app.utils import queue_reset_email, generate_reset_code
+from app.mailer import outbox_sender
 from app.crud import get_user_by_email
-from app.schemas.users import ResetPasswordRequest
+from app.schemas.users import ResetPasswordRequest, ConfirmResetPasswordRequest
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -25,9 +29,13 @@ def get_user_info(user_id: int, db: Session = Depends(get_db)):
         "created_at": user.created_at,
     }
 
+# Password hashing runs on the hasher's process pool, database calls on the threadpool
 @router.put("/user/{user_id}")
-def update_user(user_id: int, payload: UpdateUserRequest, db: Session = Depends(get_db)):
-    updated_user = update_user_data(db, user_id, username=payload.username, email=payload.email, password=payload.password)
+async def update_user(user_id: int, payload: UpdateUserRequest, db: Session = Depends(get_db)):
+    hashed_password = await password_hasher.hash(payload.password) if payload.password else None
+    updated_user = await run_in_threadpool(
+        update_user_data, db, user_id, username=payload.username, email=payload.email, hashed_password=hashed_password
+    )
     
     if not updated_user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -42,6 +50,7 @@ def delete_user_account(user_id: int, db: Session = Depends(get_db)):
     
     db.delete(user)
     db.commit()
+    forget_user(user_id)
     
     return {"message": "User account deleted successfully"}
 
@@ -51,13 +60,24 @@ def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    new_password = generate_random_password()
+    # Only the hash of the code is stored with the reset, the outbox holds the code until it is
+    # delivered, and the code is worthless once used or expired
+    code = generate_reset_code()
+    queue_reset_email(db, user.email, code)
+    create_password_reset(db, user.id, code)
+    db.commit()
+    outbox_sender.notify()
+
+    return {"message": "Password reset code sent."}
 
-    update_user_data(db, user.id, password=new_password)
+@router.post("/reset-password/confirm")
+async def confirm_reset_password(request: ConfirmResetPasswordRequest, db: Session = Depends(get_db)):
+    reset = await run_in_threadpool(get_password_reset, db, request.email, request.code)
+    if not reset:
+        raise HTTPException(status_code=400, detail="Invalid or expired reset code")
 
-    try:
-        send_reset_email(user.email, new_password)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Error sending email")
+    hashed_password = await password_hasher.hash(request.password)
+    if not await run_in_threadpool(complete_password_reset, db, reset.id, reset.user_id, hashed_password):
+        raise HTTPException(status_code=400, detail="Invalid or expired reset code")
 
-    return {"message": "Password reset successful, email sent."}
+    return {"message": "Password changed successfully"}
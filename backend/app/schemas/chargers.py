@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from app.corridor import MAX_CORRIDOR_KM, MAX_POLYLINE_LENGTH
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+class ChargingStatusBatchRequest(BaseModel):
+    charger_ids: list[int] = Field(..., min_length=1, max_length=100)
+
+class RouteChargersRequest(BaseModel):
+    polyline: str = Field(..., min_length=2, max_length=MAX_POLYLINE_LENGTH, description="Encoded polyline of the route")
+    precision: int = Field(5, ge=1, le=7, description="Decimal digits of the polyline coordinates, 6 for OSRM and Valhalla")
+    corridor_km: float = Field(5.0, gt=0, le=MAX_CORRIDOR_KM, description="Maximal distance from the route (in km)")
+    min_power: Optional[float] = Field(None, description="Minimal power of the connector (in kW)")
+    max_power: Optional[float] = Field(None, description="Maximal power of the connector (in kW)")
+    connector_types: Optional[list[str]] = Field(None, min_length=1, description="Connector types")
+    limit: int = Field(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximal number of chargers")
+    cursor: Optional[str] = Field(None, description="X-Next-Cursor of the previous page")
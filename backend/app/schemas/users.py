@@ -20,4 +20,9 @@ class UserResponse(BaseModel):
         from_attributes = True
 
 class ResetPasswordRequest(BaseModel):
-    email: EmailStr
\ No newline at end of file
+    email: EmailStr
+
+class ConfirmResetPasswordRequest(BaseModel):
+    email: EmailStr
+    code: str = Field(..., max_length=32)
+    password: str = Field(..., min_length=8)
\ No newline at end of file
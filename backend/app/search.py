@@ -0,0 +1,247 @@
+import re
+from math import ceil
+import threading
+import unicodedata
+from functools import lru_cache
+from sqlalchemy import Column, Integer, MetaData, Table, case, func, inspect, literal_column, or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Query, Session
+from app.models import EVCharger
+from app.spatial import ChargerIndex
+from app.spatial_backend import get_spatial_backend
+
+# Columns of `ev_chargers` the text search covers
+SEARCH_COLUMNS = ("name", "brand_name", "street_name", "municipality", "postal_code", "freeform_address")
+# Shorter words are not searched, every charger would match them
+MIN_TERM_LENGTH = 2
+MAX_TERMS = 8
+# Proximity search: text matches fetched before deciding how to find the closest ones
+PROBE_SIZE = 500
+# Chargers checked against the text are this many times the number expected to hold the requested matches
+WALK_MARGIN = 2
+# Cost of checking a charger found by distance, relative to ordering a text match
+WALK_COST = 3
+
+# Letters and digits, underscores separate words like other punctuation
+TERM = re.compile(r"[^\W_]+")
+
+# FTS5 table of the SQLite backend, an external-content index over `ev_chargers`
+# kept in sync by triggers. Not part of Base.metadata, it is created by the migrations only.
+charger_search = Table(
+    "charger_search", MetaData(),
+    Column("rowid", Integer, primary_key=True),
+)
+
+# Generated tsvector column added to `ev_chargers` by the migrations on PostgreSQL
+SEARCH_VECTOR = literal_column("ev_chargers.search_vector")
+
+
+def search_terms(search_text: str) -> list[str]:
+    """
+    Splits search text into lowercase words, dropping the ones too short to search.
+    """
+    terms = [term.lower() for term in TERM.findall(search_text)]
+    return [term for term in terms if len(term) >= MIN_TERM_LENGTH][:MAX_TERMS]
+
+
+@lru_cache(maxsize=65536)
+def fold(value: str) -> str:
+    """
+    Lowercases a string and strips diacritics, like the FTS5 `unicode61` tokenizer.
+
+    Cached, street names and municipalities repeat across chargers.
+    """
+    if value.isascii():
+        return value.lower()
+    return "".join(
+        char for char in unicodedata.normalize("NFKD", value.lower()) if not unicodedata.combining(char)
+    )
+
+
+def has_word_prefixes(values, terms: list[str]) -> bool:
+    """
+    Checks that every term starts a word of one of the values.
+    """
+    words = {word for value in values if value for word in TERM.findall(value)}
+    return all(any(word.startswith(term) for word in words) for term in terms)
+
+
+class TextSearchBackend:
+    """
+    Fallback for databases without a text index: every term has to be contained
+    in one of the searched columns, which scans the chargers. Indexed backends
+    match terms as word prefixes.
+    """
+
+    name = "like"
+
+    def match(self, query: Query, terms: list[str]) -> Query:
+        """
+        Restricts a charger query to chargers matching every term.
+
+        :param query: Query of EVCharger objects.
+        :param terms: Search terms, see `search_terms`.
+        :return: The filtered query.
+        """
+        for term in terms:
+            query = query.filter(or_(*(
+                getattr(EVCharger, column).icontains(term, autoescape=True) for column in SEARCH_COLUMNS
+            )))
+        return query
+
+    def matches(self, values, terms: list[str]) -> bool:
+        """
+        Checks in Python what `match` checks in SQL.
+
+        :param values: Values of the SEARCH_COLUMNS of a charger.
+        :param terms: Search terms, see `search_terms`.
+        """
+        values = [value.lower() for value in values if value]
+        return all(any(term in value for value in values) for term in terms)
+
+    def order(self):
+        """
+        SQL expression of the order `nearest_matches` reads matches in, the charger ID.
+        """
+        return EVCharger.id
+
+    def relevance(self, terms: list[str]) -> tuple:
+        """
+        ORDER BY clauses putting the best matches of a query filtered by `match` first,
+        here the chargers whose name starts with a term, then by ID.
+
+        :param terms: Search terms, see `search_terms`.
+        """
+        name_prefix = or_(*(EVCharger.name.istartswith(term, autoescape=True) for term in terms))
+        return case((name_prefix, 0), else_=1), EVCharger.id
+
+
+class FTS5SearchBackend(TextSearchBackend):
+    """
+    SQLite backend over the `charger_search` FTS5 table.
+
+    Terms are prefix queries answered by the prefix indexes of the table.
+    """
+
+    name = "fts5"
+
+    def match(self, query, terms):
+        # Quoted terms are plain strings to FTS5, whatever characters they contain
+        fts_query = " ".join(f'"{term}"*' for term in terms)
+        return query.join(charger_search, charger_search.c.rowid == EVCharger.id).filter(
+            literal_column("charger_search").match(fts_query)
+        )
+
+    def matches(self, values, terms):
+        return has_word_prefixes([fold(value) for value in values if value], [fold(term) for term in terms])
+
+    def order(self):
+        # Matches come out of the index in rowid order, a LIMIT stops the search early
+        return charger_search.c.rowid
+
+    def relevance(self, terms):
+        # BM25 scores are negative, the best match has the lowest one
+        return func.bm25(literal_column("charger_search")), charger_search.c.rowid
+
+
+class TSVectorSearchBackend(TextSearchBackend):
+    """
+    PostgreSQL backend over the generated `ev_chargers.search_vector` column and its GIN index.
+    """
+
+    name = "tsvector"
+
+    @staticmethod
+    def ts_query(terms):
+        return func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+
+    def match(self, query, terms):
+        return query.filter(SEARCH_VECTOR.op("@@")(self.ts_query(terms)))
+
+    def matches(self, values, terms):
+        return has_word_prefixes([value.lower() for value in values if value], terms)
+
+    def relevance(self, terms):
+        return func.ts_rank(SEARCH_VECTOR, self.ts_query(terms)).desc(), EVCharger.id
+
+
+def detect_search_backend(engine: Engine) -> TextSearchBackend:
+    """
+    Picks the text index installed by the migrations, the fallback when there is none.
+    """
+    if engine.dialect.name == "sqlite" and inspect(engine).has_table(charger_search.name):
+        return FTS5SearchBackend()
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            has_vector = conn.execute(text(
+                "SELECT 1 FROM information_schema.columns WHERE table_name = 'ev_chargers' AND column_name = 'search_vector'"
+            )).first()
+        if has_vector:
+            return TSVectorSearchBackend()
+    return TextSearchBackend()
+
+
+# Engine -> backend
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_search_backend(session: Session) -> TextSearchBackend:
+    """
+    Returns the text search backend of the session's database, detected on first use.
+    """
+    engine = session.get_bind()
+    backend = _backends.get(engine)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(engine)
+            if backend is None:
+                backend = _backends[engine] = detect_search_backend(engine)
+    return backend
+
+
+def nearest_matches(session: Session, query: Query, terms: list[str], lat: float, lon: float, limit: int,
+                    filtered: bool = True):
+    """
+    Finds the chargers of a query matching the search terms closest to the given point.
+
+    Short prefixes match a large share of all chargers, ordering all of them by
+    distance would cost tens of milliseconds. The text index returns matches in
+    ID order, so the first ones tell what share of the chargers match. When
+    that share is large, the chargers closest to the point are fetched through
+    the spatial index, as many as should hold `limit` matches, and checked
+    against the text in Python. Otherwise the remaining matches are fetched and
+    all of them are ordered by distance in one vectorized pass.
+
+    :param session: Database session.
+    :param query: Query of EVCharger objects, with the filters applied.
+    :param terms: Search terms, see `search_terms`.
+    :param lat: Latitude of the point.
+    :param lon: Longitude of the point.
+    :param limit: Maximum number of chargers to return.
+    :param filtered: False if the query matches every charger.
+    :return: List of (charger_id, distance_km) tuples ordered by distance, then ID.
+    """
+    search_backend = get_search_backend(session)
+    matched = search_backend.match(query, terms).with_entities(EVCharger.id, EVCharger.latitude, EVCharger.longitude)
+    matches = matched.order_by(search_backend.order()).limit(PROBE_SIZE).all()
+
+    if len(matches) == PROBE_SIZE:
+        last_id = matches[-1][0]
+        share = len(matches) / last_id
+        remaining = share * (session.query(func.max(EVCharger.id)).scalar() - last_id)
+        candidates = ceil(WALK_MARGIN * limit / share)
+        if candidates * WALK_COST < remaining:
+            # Every match not among the closest chargers is farther than all of them
+            closest = get_spatial_backend(session).nearest(query, lat, lon, k=candidates, filtered=filtered)
+            columns = [getattr(EVCharger, column) for column in SEARCH_COLUMNS]
+            values = {row[0]: row[1:] for row in session.query(EVCharger.id, *columns).filter(
+                EVCharger.id.in_([charger_id for charger_id, _ in closest])
+            )}
+            found = [item for item in closest if search_backend.matches(values[item[0]], terms)]
+            if len(found) >= limit or len(closest) < candidates:
+                return found[:limit]
+
+        matches.extend(matched.filter(EVCharger.id > last_id).order_by(search_backend.order()))
+
+    return ChargerIndex(matches).nearest(lat, lon, k=limit)
@@ -0,0 +1,49 @@
+from dataclasses import make_dataclass
+from functools import lru_cache
+import orjson
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def dumps(payload) -> bytes:
+    """
+    Serializes a payload to compact UTF-8 JSON with orjson.
+
+    Dataclasses, dictionaries, lists and datetimes are handled natively, anything
+    else (e.g. Decimal) falls back to FastAPI's `jsonable_encoder`.
+    """
+    return orjson.dumps(payload, default=jsonable_encoder, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response rendered with orjson.
+
+    Routes return it directly, so FastAPI skips `jsonable_encoder` on the content.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+@lru_cache(maxsize=128)
+def row_class(fields: tuple[str, ...]):
+    """
+    Returns a slotted, read-only dataclass with the given fields, one class per field set.
+    """
+    return make_dataclass("Row", fields, slots=True, frozen=True)
+
+
+def to_rows(rows, fields) -> list:
+    """
+    Wraps column tuples, in the order of `fields`, into row objects.
+
+    :param rows: Iterable of tuples, e.g. the result of a column query.
+    :param fields: Names of the columns.
+    """
+    cls = row_class(tuple(fields))
+    return [cls(*row) for row in rows]
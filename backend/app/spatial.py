@@ -0,0 +1,240 @@
+import threading
+import numpy as np
+from math import radians, cos, sin, sqrt, asin, floor
+from sqlalchemy.orm import Session
+from app.dataset import get_dataset_version
+from app.models import EVCharger
+from app.geo import EARTH_RADIUS_KM, haversine_km, top_k
+
+CELL_SIZE_DEG = 0.25
+
+
+class ChargerIndex:
+    """
+    Grid bucket index over charger coordinates.
+
+    Chargers are sorted by grid cell of `cell_size` degrees and kept in
+    contiguous arrays, each cell owning one slice. Nearest and radius queries
+    scan rings of cells around the query point, compute distances for a whole
+    ring at once and stop as soon as no unvisited cell can hold a closer
+    charger. Longitude wrap-around at the antimeridian is not handled, which
+    is fine for a single-country dataset.
+    """
+
+    def __init__(self, points, cell_size: float = CELL_SIZE_DEG):
+        """
+        :param points: Iterable of (charger_id, latitude, longitude) tuples.
+        :param cell_size: Edge of a grid cell in degrees.
+        """
+        self.cell_size = cell_size
+        points = list(points)
+        ids = np.fromiter((p[0] for p in points), dtype=np.int64, count=len(points))
+        lats = np.fromiter((p[1] for p in points), dtype=np.float64, count=len(points))
+        lons = np.fromiter((p[2] for p in points), dtype=np.float64, count=len(points))
+
+        rows = np.floor(lats / cell_size).astype(np.int64)
+        cols = np.floor(lons / cell_size).astype(np.int64)
+        order = np.lexsort((cols, rows))
+
+        self.ids = ids[order]
+        self.lats = lats[order]
+        self.lons = lons[order]
+        rows = rows[order]
+        cols = cols[order]
+
+        self._cells = {}
+        if len(points):
+            boundaries = np.flatnonzero((np.diff(rows) != 0) | (np.diff(cols) != 0)) + 1
+            starts = np.concatenate(([0], boundaries))
+            stops = np.concatenate((boundaries, [len(points)]))
+            for start, stop in zip(starts.tolist(), stops.tolist()):
+                self._cells[(int(rows[start]), int(cols[start]))] = (start, stop)
+            self._extent = (int(rows.min()), int(rows.max()), int(cols.min()), int(cols.max()))
+        else:
+            self._extent = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _cell(self, lat, lon):
+        return floor(lat / self.cell_size), floor(lon / self.cell_size)
+
+    def _ring(self, row, col, r):
+        if r == 0:
+            yield row, col
+            return
+        for c in range(col - r, col + r + 1):
+            yield row - r, c
+            yield row + r, c
+        for rr in range(row - r + 1, row + r):
+            yield rr, col - r
+            yield rr, col + r
+
+    def _ring_positions(self, row, col, r):
+        slices = [self._cells[cell] for cell in self._ring(row, col, r) if cell in self._cells]
+        if not slices:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate([np.arange(start, stop) for start, stop in slices])
+
+    def _covers_extent(self, row, col, r):
+        min_row, max_row, min_col, max_col = self._extent
+        return row - r <= min_row and row + r >= max_row and col - r <= min_col and col + r >= max_col
+
+    def _lower_bound(self, lat, lon, row, col, r):
+        """
+        Smallest possible distance (km) from the query point to any charger
+        outside the (2r+1) x (2r+1) block of cells centred on (row, col).
+        """
+        lat_lo = (row - r) * self.cell_size
+        lat_hi = (row + r + 1) * self.cell_size
+        lon_lo = (col - r) * self.cell_size
+        lon_hi = (col + r + 1) * self.cell_size
+
+        lat_gap = min(lat - lat_lo, lat_hi - lat)
+        lat_bound = EARTH_RADIUS_KM * radians(lat_gap)
+
+        # A charger beyond the longitude edges but inside the latitude band is at
+        # least this far away, taking the band latitude closest to a pole.
+        lon_gap = min(lon - lon_lo, lon_hi - lon)
+        band_cos = cos(radians(min(90.0, max(abs(lat_lo), abs(lat_hi)))))
+        h = cos(radians(lat)) * band_cos * sin(radians(lon_gap) / 2) ** 2
+        lon_bound = 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(max(0.0, h))))
+
+        return min(lat_bound, lon_bound)
+
+    def _allowed_mask(self, allowed):
+        if allowed is None:
+            return None
+        return np.isin(self.ids, np.fromiter(allowed, dtype=np.int64, count=len(allowed)))
+
+    def within_boxes(self, south: np.ndarray, west: np.ndarray, north: np.ndarray, east: np.ndarray) -> np.ndarray:
+        """
+        Finds the chargers in the grid cells touching any of the given boxes.
+
+        :param south: Array of the southern edges of the boxes, in degrees.
+        :param west: Array of the western edges.
+        :param north: Array of the northern edges.
+        :param east: Array of the eastern edges.
+        :return: Ascending array of positions into `ids` / `lats` / `lons`, every charger inside a box among them.
+        """
+        if self._extent is None or not len(south):
+            return np.empty(0, dtype=np.intp)
+        first_rows = np.floor(south / self.cell_size).astype(np.int64)
+        first_cols = np.floor(west / self.cell_size).astype(np.int64)
+        heights = np.floor(north / self.cell_size).astype(np.int64) - first_rows + 1
+        widths = np.floor(east / self.cell_size).astype(np.int64) - first_cols + 1
+
+        counts = heights * widths
+        boxes = np.repeat(np.arange(len(counts)), counts)
+        ranks = np.arange(len(boxes)) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = first_rows[boxes] + ranks // widths[boxes]
+        cols = first_cols[boxes] + ranks % widths[boxes]
+
+        slices = sorted(self._cells[cell] for cell in set(zip(rows.tolist(), cols.tolist())) if cell in self._cells)
+        if not slices:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate([np.arange(start, stop) for start, stop in slices])
+
+    def nearest(self, lat: float, lon: float, k: int = None, radius_km: float = None, allowed=None, after=None):
+        """
+        Finds chargers closest to the given point.
+
+        :param lat: Latitude of the query point.
+        :param lon: Longitude of the query point.
+        :param k: Maximum number of chargers to return (all when None).
+        :param radius_km: Only return chargers within this distance (unbounded when None).
+        :param allowed: Optional set of charger IDs the result is restricted to.
+        :param after: Optional (distance_km, charger_id) key; only chargers ordered after it are returned.
+        :return: List of (charger_id, distance_km) tuples ordered by distance, then ID.
+        """
+        if self._extent is None or k == 0:
+            return []
+
+        mask = self._allowed_mask(allowed)
+
+        if k is None and radius_km is None:
+            positions = np.flatnonzero(mask) if mask is not None else np.arange(len(self.ids))
+            distances = haversine_km(lat, lon, self.lats[positions], self.lons[positions])
+            positions, distances = self._after(positions, distances, after)
+            return self._result(positions, distances, None)
+
+        row, col = self._cell(lat, lon)
+        found_positions = []
+        found_distances = []
+        found = 0
+        r = 0
+        while True:
+            positions = self._ring_positions(row, col, r)
+            if mask is not None:
+                positions = positions[mask[positions]]
+            if len(positions):
+                distances = haversine_km(lat, lon, self.lats[positions], self.lons[positions])
+                if radius_km is not None:
+                    within = distances <= radius_km
+                    positions = positions[within]
+                    distances = distances[within]
+                positions, distances = self._after(positions, distances, after)
+                found_positions.append(positions)
+                found_distances.append(distances)
+                found += len(positions)
+
+            if self._covers_extent(row, col, r):
+                break
+            bound = self._lower_bound(lat, lon, row, col, r)
+            if radius_km is not None and bound > radius_km:
+                break
+            if k is not None and found >= k:
+                distances = np.concatenate(found_distances)
+                # Strictly closer, an unvisited charger at exactly the k-th distance could have a smaller ID
+                if np.partition(distances, k - 1)[k - 1] < bound:
+                    break
+            r += 1
+
+        if not found:
+            return []
+        return self._result(np.concatenate(found_positions), np.concatenate(found_distances), k)
+
+    def _after(self, positions, distances, after):
+        if after is None:
+            return positions, distances
+        after_distance, after_id = after
+        keep = (distances > after_distance) | ((distances == after_distance) & (self.ids[positions] > after_id))
+        return positions[keep], distances[keep]
+
+    def _result(self, positions, distances, k):
+        # The ID breaks ties, also among chargers tied at the k-th distance, so pages are stable
+        order = top_k(distances, k, self.ids[positions])
+        return list(zip(self.ids[positions[order]].tolist(), distances[order].tolist()))
+
+
+# Tuple (dataset version, index) of the last built index
+_index = None
+_index_lock = threading.Lock()
+
+
+def build_charger_index(session: Session) -> ChargerIndex:
+    """
+    Builds a fresh index from the `ev_chargers` table.
+
+    :param session: Database session.
+    :return: ChargerIndex over all chargers.
+    """
+    points = session.query(EVCharger.id, EVCharger.latitude, EVCharger.longitude).all()
+    return ChargerIndex(points)
+
+
+def get_charger_index(session: Session) -> ChargerIndex:
+    """
+    Returns the shared index, rebuilding it whenever the dataset version changes.
+
+    :param session: Database session used if the index has to be (re)built.
+    """
+    global _index
+    version = get_dataset_version(session)
+    current = _index
+    if current is None or current[0] != version:
+        with _index_lock:
+            if _index is None or _index[0] != version:
+                _index = (version, build_charger_index(session))
+            current = _index
+    return current[1]
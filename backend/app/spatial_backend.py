@@ -0,0 +1,320 @@
+import os
+import threading
+from math import asin, cos, degrees, pi, radians, sin, sqrt
+from sqlalchemy import Column, Float, Integer, MetaData, Table, and_, func, inspect, literal_column, or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Query, Session
+from app.geo import EARTH_RADIUS_KM, calculate_distance
+from app.models import EVCharger
+from app.spatial import get_charger_index
+
+# auto, postgis, rtree or memory; auto picks the native index the database has
+SPATIAL_BACKEND = os.getenv("SPATIAL_BACKEND", "auto").lower()
+
+# Radius of the first box of a nearest query without radius_km, grown until k chargers are found
+KNN_START_RADIUS_KM = 10.0
+# Bounds of the factor the radius grows by, the expected radius is overshot by the smaller one
+KNN_MARGIN = 1.25
+KNN_GROWTH = 4.0
+# Statements a nearest query without radius_km issues at most, the last one has no radius
+KNN_MAX_ROUNDS = 4
+# Half the circumference, every point on Earth is within this distance
+MAX_DISTANCE_KM = pi * EARTH_RADIUS_KM
+
+# R*Tree virtual table of the SQLite backend, kept in sync with `ev_chargers` by triggers.
+# Not part of Base.metadata, it is created by the migrations only.
+charger_rtree = Table(
+    "charger_rtree", MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("min_lat", Float),
+    Column("max_lat", Float),
+    Column("min_lon", Float),
+    Column("max_lon", Float),
+)
+
+# Columns added to `ev_chargers` by the migrations on PostGIS, unknown to the ORM model
+GEOGRAPHY = literal_column("ev_chargers.geog")
+GEOMETRY = literal_column("ev_chargers.geog::geometry")
+
+
+def bounding_box(lat: float, lon: float, radius_km: float):
+    """
+    Smallest latitude/longitude box holding every point within `radius_km` of the given point.
+
+    A box that would cross the antimeridian spans every longitude instead of
+    being split in two, so west <= east always holds; callers recheck the
+    exact distance anyway.
+
+    :return: Tuple (south, west, north, east) in degrees.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    south = lat - degrees(angle)
+    north = lat + degrees(angle)
+    if angle >= pi / 2 or south <= -90 or north >= 90:
+        return max(south, -90.0), -180.0, min(north, 90.0), 180.0
+
+    # Meridians tangent to the circle, closer to the poles the circle spans more longitude
+    ratio = sin(angle) / cos(radians(lat))
+    if ratio >= 1:
+        return south, -180.0, north, 180.0
+    span = degrees(asin(ratio))
+    if lon - span < -180 or lon + span > 180:
+        return south, -180.0, north, 180.0
+    return south, lon - span, north, lon + span
+
+
+class SpatialBackend:
+    """
+    In-process fallback for databases without a native spatial index.
+
+    Bounding boxes are BETWEEN predicates on the coordinate columns, nearest and
+    radius queries resolve the filters to a set of IDs and order the chargers
+    with the shared ChargerIndex.
+    """
+
+    name = "memory"
+
+    def __init__(self, dialect: str = "sqlite"):
+        """
+        :param dialect: Name of the database dialect the backend builds statements for.
+        """
+        self.dialect = dialect
+
+    def prepare(self, session: Session):
+        """
+        Called before a statement using `distance`, registers `haversine_km` on SQLite connections.
+        """
+        if self.dialect != "sqlite":
+            return
+        connection = session.connection().connection
+        if "haversine_km" not in connection.info:
+            connection.driver_connection.create_function("haversine_km", 4, calculate_distance, deterministic=True)
+            connection.info["haversine_km"] = True
+
+    def distance(self, lat: float, lon: float):
+        """
+        SQL expression of the distance (km) of a charger from the given point.
+        """
+        if self.dialect == "sqlite":
+            return func.haversine_km(lat, lon, EVCharger.latitude, EVCharger.longitude, type_=Float)
+        # Haversine in plain SQL, e.g. PostgreSQL without PostGIS
+        dlat = func.radians(EVCharger.latitude - lat, type_=Float) * 0.5
+        dlon = func.radians(EVCharger.longitude - lon, type_=Float) * 0.5
+        a = (func.power(func.sin(dlat), 2)
+             + cos(radians(lat)) * func.cos(func.radians(EVCharger.latitude)) * func.power(func.sin(dlon), 2))
+        return 2 * EARTH_RADIUS_KM * func.asin(func.sqrt(a), type_=Float)
+
+    def within_bounds(self, query: Query, north_east: tuple[float, float], south_west: tuple[float, float]) -> Query:
+        """
+        Restricts a charger query to a bounding box.
+
+        :param query: Query of EVCharger objects.
+        :param north_east: Tuple with NE coordinates (latitude, longitude).
+        :param south_west: Tuple with SW coordinates (latitude, longitude).
+        :return: The filtered query.
+        """
+        return query.filter(
+            EVCharger.latitude.between(south_west[0], north_east[0]),
+            EVCharger.longitude.between(south_west[1], north_east[1])
+        )
+
+    def nearest(self, query: Query, lat: float, lon: float, k: int = None, radius_km: float = None,
+                after=None, filtered: bool = True):
+        """
+        Finds the chargers of a query closest to the given point.
+
+        :param query: Query of EVCharger objects, with the filters applied.
+        :param lat: Latitude of the query point.
+        :param lon: Longitude of the query point.
+        :param k: Maximum number of chargers to return (all when None).
+        :param radius_km: Only return chargers within this distance (unbounded when None).
+        :param after: Optional (distance_km, charger_id) key; only chargers ordered after it are returned.
+        :param filtered: False if the query matches every charger, which spares resolving it to IDs.
+        :return: List of (charger_id, distance_km) tuples ordered by distance, then ID.
+        """
+        allowed = {charger_id for charger_id, in query.with_entities(EVCharger.id)} if filtered else None
+        return get_charger_index(query.session).nearest(lat, lon, k=k, radius_km=radius_km, allowed=allowed, after=after)
+
+
+class DatabaseSpatialBackend(SpatialBackend):
+    """
+    Backend answering nearest queries in the database: the distance is computed,
+    ordered and limited by the query itself.
+    """
+
+    def order(self, lat: float, lon: float):
+        """
+        SQL expression ordering chargers by distance from the given point, None
+        to order by the selected distance.
+        """
+        return None
+
+    def within_radius(self, query: Query, lat: float, lon: float, radius_km: float) -> Query:
+        """
+        Restricts a charger query to the chargers within `radius_km` of the given point.
+
+        Prefilters on the bounding box of the circle, which the coordinate
+        indexes answer, then checks the exact distance.
+        """
+        south, west, north, east = bounding_box(lat, lon, radius_km)
+        query = self.within_bounds(query, (north, east), (south, west))
+        return query.filter(self.distance(lat, lon) <= radius_km)
+
+    def nearest_query(self, query: Query, lat: float, lon: float, k: int = None, radius_km: float = None,
+                      after=None) -> Query:
+        """
+        Builds the statement of one nearest query, see `nearest`.
+
+        :return: Query of (charger ID, distance_km) rows.
+        """
+        distance = self.distance(lat, lon)
+        distance_km = distance.label("distance_km")
+        query = query.with_entities(EVCharger.id, distance_km)
+        if radius_km is not None and radius_km < MAX_DISTANCE_KM:
+            query = self.within_radius(query, lat, lon, radius_km)
+        if after is not None:
+            after_distance, after_id = after
+            query = query.filter(or_(distance > after_distance, and_(distance == after_distance, EVCharger.id > after_id)))
+        order = self.order(lat, lon)
+        query = query.order_by(order if order is not None else distance_km, EVCharger.id)
+        return query.limit(k) if k is not None else query
+
+    def nearest(self, query: Query, lat: float, lon: float, k: int = None, radius_km: float = None,
+                after=None, filtered: bool = True):
+        if k == 0:
+            return []
+        self.prepare(query.session)
+        if k is None or radius_km is not None:
+            return [tuple(row) for row in self.nearest_query(query, lat, lon, k, radius_km, after)]
+
+        # Without a radius, search growing circles: once one holds k chargers,
+        # none outside of it can be closer
+        search_km = KNN_START_RADIUS_KM + (after[0] if after is not None else 0.0)
+        for _ in range(KNN_MAX_ROUNDS - 1):
+            rows = self.nearest_query(query, lat, lon, k, search_km, after).all()
+            if len(rows) == k or search_km >= MAX_DISTANCE_KM:
+                return [tuple(row) for row in rows]
+            # Grow to the radius expected to hold k chargers at the density seen so far
+            growth = KNN_MARGIN * sqrt(k / len(rows)) if rows else KNN_GROWTH
+            search_km = min(search_km * min(max(growth, KNN_MARGIN), KNN_GROWTH), MAX_DISTANCE_KM)
+        # Sparse matches, order every filtered charger rather than growing further
+        return [tuple(row) for row in self.nearest_query(query, lat, lon, k, None, after)]
+
+
+class RTreeSpatialBackend(DatabaseSpatialBackend):
+    """
+    SQLite backend over the `charger_rtree` R*Tree virtual table.
+
+    The R*Tree narrows a query to the chargers in a bounding box, exact
+    distances are computed by a `haversine_km` SQL function registered on every
+    connection. R*Tree coordinates are 32-bit floats rounded outwards, so boxes
+    are rechecked against the coordinate columns.
+    """
+
+    name = "rtree"
+
+    def _join_box(self, query: Query, south: float, west: float, north: float, east: float) -> Query:
+        return query.join(charger_rtree, charger_rtree.c.id == EVCharger.id).filter(
+            charger_rtree.c.max_lat >= south, charger_rtree.c.min_lat <= north,
+            charger_rtree.c.max_lon >= west, charger_rtree.c.min_lon <= east,
+        )
+
+    def within_bounds(self, query, north_east, south_west):
+        query = self._join_box(query, south_west[0], south_west[1], north_east[0], north_east[1])
+        # `+ 0` keeps the planner on the R*Tree, the recheck is then done on the fetched rows
+        # instead of walking the latitude index
+        return query.filter(
+            (EVCharger.latitude + 0).between(south_west[0], north_east[0]),
+            (EVCharger.longitude + 0).between(south_west[1], north_east[1])
+        )
+
+    def within_radius(self, query, lat, lon, radius_km):
+        query = self._join_box(query, *bounding_box(lat, lon, radius_km))
+        return query.filter(self.distance(lat, lon) <= radius_km)
+
+
+class PostGISSpatialBackend(DatabaseSpatialBackend):
+    """
+    PostgreSQL backend over the `ev_chargers.geog` geography column.
+
+    Radius queries use ST_DWithin and nearest queries order by the `<->`
+    operator, both answered by the GiST index on `geog`. Bounding boxes use the
+    `&&` operator on the GiST index of `geog::geometry`, which matches the
+    latitude/longitude box rather than the geodesic one. Distances are on the
+    sphere used by PostGIS, which differs from the haversine ones by parts per
+    million.
+    """
+
+    name = "postgis"
+
+    def __init__(self, dialect: str = "postgresql"):
+        super().__init__(dialect)
+
+    @staticmethod
+    def point(lat, lon):
+        return func.geography(func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326))
+
+    def order(self, lat, lon):
+        return GEOGRAPHY.op("<->", return_type=Float)(self.point(lat, lon))
+
+    def distance(self, lat, lon):
+        return self.order(lat, lon) / 1000.0
+
+    def within_bounds(self, query, north_east, south_west):
+        envelope = func.ST_MakeEnvelope(south_west[1], south_west[0], north_east[1], north_east[0], 4326)
+        return super().within_bounds(query.filter(GEOMETRY.op("&&")(envelope)), north_east, south_west)
+
+    def within_radius(self, query, lat, lon, radius_km):
+        return query.filter(func.ST_DWithin(GEOGRAPHY, self.point(lat, lon), radius_km * 1000.0, False))
+
+    def nearest(self, query, lat, lon, k=None, radius_km=None, after=None, filtered=True):
+        if k == 0:
+            return []
+        # The GiST index returns chargers in distance order, no search radius is needed
+        return [tuple(row) for row in self.nearest_query(query, lat, lon, k, radius_km, after)]
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (SpatialBackend, RTreeSpatialBackend, PostGISSpatialBackend)
+}
+
+
+def detect_spatial_backend(engine: Engine) -> SpatialBackend:
+    """
+    Picks the backend for a database: the one named by SPATIAL_BACKEND, or in
+    `auto` mode the native index installed by the migrations, the in-process
+    one when there is none.
+    """
+    if SPATIAL_BACKEND != "auto":
+        return BACKENDS[SPATIAL_BACKEND](engine.dialect.name)
+
+    if engine.dialect.name == "sqlite" and inspect(engine).has_table(charger_rtree.name):
+        return RTreeSpatialBackend(engine.dialect.name)
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            has_geography = conn.execute(text(
+                "SELECT 1 FROM information_schema.columns WHERE table_name = 'ev_chargers' AND column_name = 'geog'"
+            )).first()
+        if has_geography:
+            return PostGISSpatialBackend(engine.dialect.name)
+    return SpatialBackend(engine.dialect.name)
+
+
+# Engine -> backend
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_spatial_backend(session: Session) -> SpatialBackend:
+    """
+    Returns the backend of the session's database, detected on first use.
+    """
+    engine = session.get_bind()
+    backend = _backends.get(engine)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(engine)
+            if backend is None:
+                backend = _backends[engine] = detect_spatial_backend(engine)
+    return backend
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+API_KEY = os.getenv("API_KEY")
+TOMTOM_API_URL = os.getenv("TOMTOM_API_URL", "https://api.tomtom.com")
+AVAILABILITY_PATH = "/search/2/chargingAvailability.json"
+AVAILABILITY_CACHE_TTL = float(os.getenv("AVAILABILITY_CACHE_TTL", "30"))
+AVAILABILITY_CACHE_SIZE = 10000
+# Upper bound of upstream requests one batch lookup keeps in flight
+BATCH_CONCURRENCY = int(os.getenv("TOMTOM_BATCH_CONCURRENCY", "8"))
+
+UPSTREAM_TIMEOUT = httpx.Timeout(float(os.getenv("TOMTOM_TIMEOUT", "5")), connect=2.0)
+UPSTREAM_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0)
+
+
+def parse_availability(availability_data: dict) -> dict:
+    """
+    Converts a chargingAvailability response to a status per connector type.
+    """
+    status = {}
+    for connector in availability_data.get("connectors", []):
+        connector_type = connector.get("type")
+        availability = connector.get("availability", {}).get("current", {})
+        status[connector_type] = {
+            "available": availability.get("available"),
+            "occupied": availability.get("occupied"),
+            "reserved": availability.get("reserved"),
+            "outOfService": availability.get("outOfService")
+        }
+    return status
+
+
+class AvailabilityClient:
+    """
+    Async client for the TomTom chargingAvailability endpoint.
+
+    Keeps one keep-alive connection pool, caches results for a short TTL and
+    coalesces concurrent lookups of the same availability ID into a single
+    upstream request.
+    """
+
+    def __init__(self, base_url: str = TOMTOM_API_URL, api_key: str = API_KEY,
+                 ttl: float = AVAILABILITY_CACHE_TTL, timeout: httpx.Timeout = UPSTREAM_TIMEOUT):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.ttl = ttl
+        self.timeout = timeout
+        self.upstream_requests = 0
+        self._client = None
+        self._loop = None
+        self._closer = None
+        self._cache = OrderedDict()
+        self._inflight = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # The pool is bound to the event loop it was created on
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=UPSTREAM_LIMITS)
+            self._loop = loop
+            self._inflight = {}
+            # A pool left on a previous loop was closed when that loop shut down
+            self._closer = loop.create_task(self._close_with_loop(self._client))
+        return self._client
+
+    @staticmethod
+    async def _close_with_loop(client: httpx.AsyncClient):
+        """
+        Closes `client` when its event loop shuts down: asyncio.run and anyio
+        cancel the tasks still pending at exit and wait for them, while the
+        connections can still be closed on that loop.
+        """
+        try:
+            await asyncio.get_running_loop().create_future()
+        finally:
+            await client.aclose()
+
+    def _cached(self, availability_id: str):
+        entry = self._cache.get(availability_id)
+        if entry is None:
+            return None
+        expires_at, status = entry
+        if expires_at < time.monotonic():
+            del self._cache[availability_id]
+            return None
+        return status
+
+    def _store(self, availability_id: str, status: dict):
+        self._cache[availability_id] = (time.monotonic() + self.ttl, status)
+        self._cache.move_to_end(availability_id)
+        while len(self._cache) > AVAILABILITY_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    async def _fetch(self, availability_id: str) -> dict:
+        client = self._get_client()
+        self.upstream_requests += 1
+        response = await client.get(AVAILABILITY_PATH, params={
+            "key": self.api_key,
+            "chargingAvailability": availability_id,
+        })
+        response.raise_for_status()
+        status = parse_availability(response.json())
+        self._store(availability_id, status)
+        return status
+
+    async def get_status(self, availability_id: str) -> dict:
+        """
+        Returns the current status per connector type for an availability ID.
+
+        :param availability_id: Value of `EVCharger.charging_availability`.
+        :raises httpx.HTTPError: When the upstream request fails or times out.
+        """
+        status = self._cached(availability_id)
+        if status is not None:
+            return status
+
+        self._get_client()
+        task = self._inflight.get(availability_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(availability_id))
+            self._inflight[availability_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(availability_id, None))
+        # Shield the shared request so one cancelled caller does not cancel it for the others
+        return await asyncio.shield(task)
+
+    async def get_statuses(self, availability_ids, concurrency: int = BATCH_CONCURRENCY) -> dict:
+        """
+        Looks up many availability IDs concurrently, with at most `concurrency` in flight.
+
+        :param availability_ids: Iterable of availability IDs, duplicates are looked up once.
+        :return: Dictionary mapping each ID to its status, or to the exception raised for it.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def lookup(availability_id):
+            async with semaphore:
+                return await self.get_status(availability_id)
+
+        unique_ids = list(dict.fromkeys(availability_ids))
+        outcomes = await asyncio.gather(*(lookup(i) for i in unique_ids), return_exceptions=True)
+        return dict(zip(unique_ids, outcomes))
+
+    async def aclose(self):
+        if self._client is not None:
+            self._closer.cancel()
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+            self._closer = None
+
+
+availability_client = AvailabilityClient()
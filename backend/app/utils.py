@@ -1,43 +1,33 @@
-import random
-import string
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from dotenv import load_dotenv
+import hashlib
 import os
+import secrets
+import string
+from sqlalchemy.orm import Session
+from app.mailer import queue_email
+
+RESET_CODE_LENGTH = 8
+RESET_CODE_EXPIRE_MINUTES = int(os.getenv("RESET_CODE_EXPIRE_MINUTES", "30"))
+# Without look-alike characters, the code is typed in by hand
+RESET_CODE_ALPHABET = "".join(c for c in string.ascii_uppercase + string.digits if c not in "0O1I")
 
-def generate_random_password(length=8):
-    """Generates a random password of a given length."""
-    characters = string.ascii_letters + string.digits
-    return ''.join(random.choice(characters) for i in range(length))
+def generate_reset_code(length=RESET_CODE_LENGTH):
+    """Generates a random single-use password reset code."""
+    return ''.join(secrets.choice(RESET_CODE_ALPHABET) for i in range(length))
 
-def send_reset_email(email: str, new_password: str):
-    """Sends a password reset email to the user."""
+def hash_reset_code(code: str) -> str:
+    """Hash a reset code is stored and looked up by, codes are compared case-insensitively."""
+    return hashlib.sha256(code.strip().upper().encode()).hexdigest()
+
+def queue_reset_email(session: Session, email: str, code: str, expire_minutes: int = RESET_CODE_EXPIRE_MINUTES):
+    """Queues a password reset email to the user, it is sent once the session commits."""
 
-    load_dotenv()
-    SENDER_EMAIL = os.getenv("SENDER_EMAIL")
-    SENDER_SMTP = os.getenv("SENDER_SMTP")
-    SENDER_PASSWORD = os.getenv("SENDER_PASSWORD")
-    sender_email = SENDER_EMAIL
-    receiver_email = email
     subject = "WattWay Password Reset"
     body = f"""
     Hello,
-    we've received a request to reset your password. Your new password is: {new_password}. Please change it after logging in.
+    we've received a request to reset your password. Your reset code is: {code}. Enter it in the app together with a new password within {expire_minutes} minutes. If you did not ask for a reset, you can ignore this email.
     
     Best regards,
     WattWay Team
     """
 
-    msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = receiver_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain'))
-
-    try:
-        with smtplib.SMTP_SSL(SENDER_SMTP, 465) as server:
-            server.login(sender_email, SENDER_PASSWORD)
-            server.sendmail(sender_email, receiver_email, msg.as_string())
-    except Exception as e:
-        raise Exception(f"Error sending email: {str(e)}")
+    queue_email(session, email, subject, body)
@@ -0,0 +1,57 @@
+import numpy as np
+from app.geo import calculate_distance, haversine_km, top_k
+from scripts.benchmark import timed
+
+USER_POSITION = (52.23, 21.01)
+SIZES = [10_000, 100_000, 1_000_000]
+TOP_K = 100
+
+
+def random_points(n, seed=0):
+    """
+    Generates `n` random points inside the Poland bounding box.
+    """
+    rng = np.random.default_rng(seed)
+    lats = np.ascontiguousarray(rng.uniform(49.0, 55.0, n))
+    lons = np.ascontiguousarray(rng.uniform(14.0, 24.0, n))
+    return lats, lons
+
+
+def scalar_sort(lats, lons):
+    """
+    The previous approach: one haversine call per point, then a full sort.
+    """
+    lat, lon = USER_POSITION
+    distances = [
+        (i, calculate_distance(lat, lon, c_lat, c_lon))
+        for i, (c_lat, c_lon) in enumerate(zip(lats.tolist(), lons.tolist()))
+    ]
+    distances.sort(key=lambda x: x[1])
+    return distances
+
+
+def vectorized_sort(lats, lons):
+    distances = haversine_km(*USER_POSITION, lats, lons)
+    return top_k(distances)
+
+
+def vectorized_top_k(lats, lons):
+    distances = haversine_km(*USER_POSITION, lats, lons)
+    return top_k(distances, TOP_K)
+
+
+def run_benchmark():
+    print(f"{'points':>10} {'scalar sort':>14} {'numpy sort':>14} {'numpy top-' + str(TOP_K):>14} {'speedup':>9}")
+    for n in SIZES:
+        lats, lons = random_points(n)
+        scalar = timed(lambda: scalar_sort(lats, lons), repeat=1 if n >= 1_000_000 else 3)
+        vector = timed(lambda: vectorized_sort(lats, lons))
+        partial = timed(lambda: vectorized_top_k(lats, lons))
+        print(
+            f"{n:>10} {n / scalar:>10.0f} p/s {n / vector:>10.0f} p/s {n / partial:>10.0f} p/s "
+            f"{scalar / partial:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    run_benchmark()
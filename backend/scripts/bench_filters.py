@@ -0,0 +1,97 @@
+import argparse
+import numpy as np
+from sqlalchemy import and_
+from app.capabilities import summarize_connectors
+from app.crud import query_chargers
+from app.models import Connector, EVCharger
+from scripts.benchmark import memory_session, timed
+
+CONNECTOR_TYPES = [
+    ("IEC62196Type2CCS", "DC"), ("IEC62196Type2Outlet", "AC3"), ("IEC62196Type2CableAttached", "AC3"),
+    ("Chademo", "DC"), ("IEC62196Type3", "AC3"), ("Tesla", "DC"),
+]
+# Most chargers are slow AC ones, fast DC chargers are rare
+POWERS = [3.7, 11, 22, 50, 100, 150, 350]
+POWER_SHARES = [0.05, 0.35, 0.3, 0.15, 0.05, 0.07, 0.03]
+FILTERS = [
+    ("min_power=150", {"min_power": 150}),
+    ("min_power=350", {"min_power": 350}),
+    ("max_power=11", {"max_power": 11}),
+    ("connector_types=Chademo", {"connector_types": ["Chademo"]}),
+    ("connector_types=Tesla,Chademo", {"connector_types": ["Tesla", "Chademo"]}),
+    ("min_power=100&connector_types=Chademo", {"min_power": 100, "connector_types": ["Chademo"]}),
+]
+PAGE_SIZE = 50
+
+
+def make_session(n, seed=0):
+    """
+    Creates an in-memory database with `n` chargers of one to four connectors each.
+    """
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(1, 5, size=n)
+    charger_ids = np.repeat(np.arange(1, n + 1), counts).tolist()
+    types = rng.integers(0, len(CONNECTOR_TYPES), size=len(charger_ids)).tolist()
+    powers = rng.choice(POWERS, size=len(charger_ids), p=POWER_SHARES).tolist()
+    connectors = [
+        {
+            "charger_id": charger_id, "connector_type": CONNECTOR_TYPES[t][0], "current_type": CONNECTOR_TYPES[t][1],
+            "rated_power_kw": power, "voltage_v": 400, "current_a": 32,
+        }
+        for charger_id, t, power in zip(charger_ids, types, powers)
+    ]
+    lats = rng.uniform(49.0, 55.0, n).tolist()
+    lons = rng.uniform(14.0, 24.0, n).tolist()
+    ends = np.cumsum(counts).tolist()
+    chargers = [
+        {
+            "id": i + 1, "external_id": f"bench-{i}", "name": f"Charger {i}", "latitude": lats[i], "longitude": lons[i],
+            **summarize_connectors(connectors[end - count:end]),
+        }
+        for i, (end, count) in enumerate(zip(ends, counts.tolist()))
+    ]
+    return memory_session((EVCharger.__table__, chargers), (Connector.__table__, connectors))
+
+
+def semi_join_query(session, min_power=None, max_power=None, connector_types=None):
+    """
+    The previous approach: every filter is an EXISTS semi-join against `connectors`.
+    """
+    conditions = []
+    if min_power is not None:
+        conditions.append(Connector.rated_power_kw >= min_power)
+    if max_power is not None:
+        conditions.append(Connector.rated_power_kw <= max_power)
+    if connector_types is not None:
+        conditions.append(Connector.connector_type.in_(connector_types))
+    return session.query(EVCharger).filter(EVCharger.connectors.any(and_(*conditions)))
+
+
+def run_benchmark(n):
+    session = make_session(n)
+    print(f"{n} chargers, {session.query(Connector).count()} connectors")
+    # All matching IDs (the set handed to the spatial index), then the first keyset page
+    print(f"{'filter':<40} {'matches':>8} {'ids before':>11} {'ids after':>10} {'speedup':>8} "
+          f"{'page before':>12} {'page after':>11} {'speedup':>8}")
+    for label, kwargs in FILTERS:
+        before_query = semi_join_query(session, **kwargs)
+        after_query = query_chargers(session, **kwargs)
+        matches = len(after_query.with_entities(EVCharger.id).all())
+        assert matches == len(before_query.with_entities(EVCharger.id).all())
+
+        ids_before = timed(lambda: before_query.with_entities(EVCharger.id).all(), repeat=5)
+        ids_after = timed(lambda: after_query.with_entities(EVCharger.id).all(), repeat=5)
+        page_before = timed(lambda: before_query.with_entities(EVCharger.id).order_by(EVCharger.id).limit(PAGE_SIZE).all(), repeat=5)
+        page_after = timed(lambda: after_query.with_entities(EVCharger.id).order_by(EVCharger.id).limit(PAGE_SIZE).all(), repeat=5)
+        print(
+            f"{label:<40} {matches:>8} {ids_before * 1000:>8.1f} ms {ids_after * 1000:>7.1f} ms {ids_before / ids_after:>7.1f}x "
+            f"{page_before * 1000:>9.2f} ms {page_after * 1000:>8.2f} ms {page_before / page_after:>7.1f}x"
+        )
+    session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare connector filter latency with and without the capability summary.")
+    parser.add_argument("--chargers", type=int, default=200_000)
+    args = parser.parse_args()
+    run_benchmark(args.chargers)
@@ -0,0 +1,61 @@
+import argparse
+import os
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import EVCharger, Connector
+from scripts import update_db as crawl
+from scripts.mock_tomtom import MockTomTom
+
+
+def run_benchmark(chargers, latency, error_rate, workers, rate, runs, database_url=None):
+    """
+    Crawls the mock TomTom server `runs` times into a fresh database and prints one line per run.
+
+    The first run measures a full import, later runs measure an update of an unchanged
+    dataset planned from the density map of the previous run.
+    """
+    workdir = tempfile.mkdtemp(prefix="bench_ingestion_")
+    database_url = database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    engine = create_engine(database_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+
+    with MockTomTom(chargers=chargers, latency=latency, error_rate=error_rate) as mock:
+        crawl.BASE_URL = f"{mock.start()}/search/2/poiSearch"
+        print(f"{chargers} chargers, latency {latency * 1000:.0f} ms, error rate {error_rate:.0%}, "
+              f"{workers} workers, {rate:.0f} req/s")
+        print(f"{'run':>4} {'requests':>9} {'saved':>6} {'errors':>7} {'inserted':>9} {'updated':>8} "
+              f"{'unchanged':>10} {'rows':>7} {'wall':>8} {'rows/s':>8}")
+        for run in range(1, runs + 1):
+            errors_before = mock.requests["errors"]
+            start = time.perf_counter()
+            stats = crawl.fetch_and_save_ev_chargers_in_poland(
+                workers=workers, rate=rate, checkpoint_path=os.path.join(workdir, "checkpoint.json"),
+                session_factory=session_factory, density_path=os.path.join(workdir, "density.json"),
+            )
+            wall = time.perf_counter() - start
+            session = session_factory()
+            rows = session.query(EVCharger).count() + session.query(Connector).count()
+            session.close()
+            written = stats["inserted"] + stats["updated"]
+            print(f"{run:>4} {stats['requests']:>9} {stats['requests_saved']:>6} "
+                  f"{mock.requests['errors'] - errors_before:>7} {stats['inserted']:>9} {stats['updated']:>8} "
+                  f"{stats['unchanged']:>10} {rows:>7} {wall:>7.2f}s {written / wall:>8.0f}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark a full crawl against the local TomTom mock.")
+    parser.add_argument("--chargers", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.05, help="mock response delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=crawl.CRAWL_WORKERS)
+    parser.add_argument("--rate", type=float, default=1000, help="client rate limit, requests per second")
+    parser.add_argument("--runs", type=int, default=2)
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite database")
+    args = parser.parse_args()
+    run_benchmark(args.chargers, args.latency, args.error_rate, args.workers, args.rate, args.runs, args.database_url)
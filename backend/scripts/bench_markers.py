@@ -0,0 +1,39 @@
+import gzip
+import json
+import numpy as np
+from app.serialization import dumps
+from app.markers import MarkerFeed, decode_marker_columns, decode_marker_feed
+from scripts.benchmark import timed
+
+SIZES = [10_000, 100_000]
+BRANDS = ["Orlen Charge", "GreenWay", "Ionity", "Tesla Supercharger", "PKN Orlen", "Elocity", "Powerdot", "EV+"]
+
+
+def random_rows(n, seed=0):
+    """
+    Generates `n` chargers inside the Poland bounding box, most of them named after a brand.
+    """
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(49.0, 55.0, n)
+    lons = rng.uniform(14.0, 24.0, n)
+    names = [BRANDS[i % len(BRANDS)] if i % 4 else f"Charger {i}" for i in range(n)]
+    return [(i + 1, names[i], round(float(lats[i]), 6), round(float(lons[i]), 6)) for i in range(n)]
+
+
+def run_benchmark():
+    print(f"{'markers':>8} {'json':>10} {'json gz':>10} {'feed':>10} {'feed gz':>10} {'json decode':>12} "
+          f"{'feed decode':>12} {'as columns':>12}")
+    for n in SIZES:
+        rows = random_rows(n)
+        json_body = dumps([{"id": i, "latitude": lat, "longitude": lon, "name": name} for i, name, lat, lon in rows])
+        feed_body = MarkerFeed(rows).body
+        json_time = timed(lambda: json.loads(json_body))
+        feed_time = timed(lambda: decode_marker_feed(feed_body))
+        columns_time = timed(lambda: decode_marker_columns(feed_body))
+        print(f"{n:>8} {len(json_body) / 1024:>7.0f} KB {len(gzip.compress(json_body)) / 1024:>7.0f} KB "
+              f"{len(feed_body) / 1024:>7.0f} KB {len(gzip.compress(feed_body)) / 1024:>7.0f} KB "
+              f"{json_time * 1000:>9.1f} ms {feed_time * 1000:>9.1f} ms {columns_time * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,59 @@
+import argparse
+import time
+import numpy as np
+from app.corridor import chargers_along_route, decode_polyline, encode_polyline
+from app.geo import haversine_km
+from app.spatial import ChargerIndex
+
+# Szczecin - Poznań - Warszawa - Kraków - Wrocław, about 1000 km
+WAYPOINTS = [(53.43, 14.55), (52.41, 16.93), (52.23, 21.01), (50.06, 19.94), (51.11, 17.03)]
+
+
+def make_route(step_km, seed=0):
+    """
+    Densifies the waypoints into a winding road with a point every `step_km`.
+    """
+    rng = np.random.default_rng(seed)
+    points = []
+    for (lat1, lon1), (lat2, lon2) in zip(WAYPOINTS, WAYPOINTS[1:]):
+        steps = int(haversine_km(lat1, lon1, np.array([lat2]), np.array([lon2]))[0] / step_km)
+        fractions = np.arange(steps) / steps
+        # Smooth bends of up to a few kilometres, like a road between towns
+        along = fractions * steps * step_km
+        wiggle = sum(
+            amplitude * np.sin(2 * np.pi * along / wavelength + phase) * np.sin(np.pi * fractions)
+            for amplitude, wavelength, phase in zip(rng.uniform(0.002, 0.02, 4), rng.uniform(2, 40, 4), rng.uniform(0, 6, 4))
+        )
+        points.extend(zip(lat1 + (lat2 - lat1) * fractions + wiggle, lon1 + (lon2 - lon1) * fractions - wiggle))
+    points.append(WAYPOINTS[-1])
+    return points
+
+
+def run_benchmark(chargers, step_km, repeat=5):
+    rng = np.random.default_rng(1)
+    points = zip(range(1, chargers + 1), rng.uniform(49.0, 55.0, chargers), rng.uniform(14.0, 24.0, chargers))
+    index = ChargerIndex(points)
+    encoded = encode_polyline(make_route(step_km))
+
+    start = time.perf_counter()
+    lats, lons = decode_polyline(encoded)
+    decode_time = time.perf_counter() - start
+    length = float(haversine_km(lats[:-1], lons[:-1], lats[1:], lons[1:]).sum())
+    print(f"{chargers} chargers, route of {length:.0f} km with {len(lats)} points ({len(encoded)} characters),"
+          f" decoded in {decode_time * 1000:.1f} ms")
+    print(f"{'corridor':>10} {'chargers':>9} {'p50':>10} {'max':>10}")
+    for corridor_km in (1.0, 5.0, 20.0, 50.0):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            found = chargers_along_route(index, lats, lons, corridor_km)
+            times.append(time.perf_counter() - start)
+        print(f"{corridor_km:>7.0f} km {len(found):>9} {np.median(times) * 1000:>7.1f} ms {max(times) * 1000:>7.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the corridor search along a long route.")
+    parser.add_argument("--chargers", type=int, default=200_000)
+    parser.add_argument("--step-km", type=float, default=0.05, help="Distance between route points")
+    args = parser.parse_args()
+    run_benchmark(args.chargers, args.step_km)
@@ -0,0 +1,76 @@
+import argparse
+import time
+import numpy as np
+from app.models import EVCharger
+from app.routers.chargers import search_chargers
+from app.search import TextSearchBackend, _backends, search_terms
+from scripts.benchmark import memory_session
+
+BRANDS = ["Orlen", "GreenWay", "Ionity", "Tesla", "Elocity", "Powerdot", "EV+", "Circle K", "Shell Recharge", "Lidl"]
+MUNICIPALITIES = ["Warszawa", "Kraków", "Łódź", "Wrocław", "Poznań", "Gdańsk", "Szczecin", "Bydgoszcz", "Lublin", "Białystok"]
+STREETS = ["Marszałkowska", "Puławska", "Grunwaldzka", "Piłsudskiego", "Mickiewicza", "Słowackiego", "Kościuszki",
+           "Długa", "Polna", "Leśna", "Ogrodowa", "Lipowa", "Kwiatowa", "Szkolna", "Parkowa", "Zielona"]
+QUERIES = ["o", "or", "orl", "orlen", "orlen war", "orlen warszawa puł", "gre", "lidl gd", "00-6", "kości", "tesla łódź"]
+
+
+def make_session(n, seed=0):
+    """
+    Creates a migrated in-memory database with `n` chargers with names and addresses.
+    """
+    rng = np.random.default_rng(seed)
+    brands = rng.integers(0, len(BRANDS), n).tolist()
+    towns = rng.integers(0, len(MUNICIPALITIES), n).tolist()
+    streets = rng.integers(0, len(STREETS), n).tolist()
+    numbers = rng.integers(1, 200, n).tolist()
+    postal_codes = rng.integers(0, 100_000, n).tolist()
+    lats = rng.uniform(49.0, 55.0, n).tolist()
+    lons = rng.uniform(14.0, 24.0, n).tolist()
+    rows = []
+    for i in range(n):
+        postal_code = f"{postal_codes[i] // 1000:02d}-{postal_codes[i] % 1000:03d}"
+        street, town = STREETS[streets[i]], MUNICIPALITIES[towns[i]]
+        rows.append({
+            "id": i + 1, "external_id": f"bench-{i}", "name": f"{BRANDS[brands[i]]} {town} {street}",
+            "brand_name": BRANDS[brands[i]], "street_name": street, "municipality": town, "postal_code": postal_code,
+            "freeform_address": f"{street} {numbers[i]}, {postal_code} {town}", "latitude": lats[i], "longitude": lons[i],
+        })
+    # Migrated after the insert, which builds the text index over the inserted rows
+    return memory_session((EVCharger.__table__, rows), migrated=True)
+
+
+def latencies(session, text, location, repeat=20):
+    """
+    Returns the median and the worst wall time of `repeat` searches, and the number of results.
+    """
+    lat, lon = location if location is not None else (None, None)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = search_chargers(session, search_terms(text), lat, lon, None, None, None, 10)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), max(times), len(rows)
+
+
+def run_benchmark(n):
+    session = make_session(n)
+    engine = session.get_bind()
+    print(f"{n} chargers")
+    print(f"{'query':<22} {'location':>8} {'fts5 p50':>10} {'fts5 max':>10} {'like p50':>10} {'speedup':>8}")
+    for text in QUERIES:
+        if not search_terms(text):
+            continue
+        for location in (None, (52.23, 21.01)):
+            _backends.pop(engine, None)
+            fts_median, fts_max, _ = latencies(session, text, location)
+            _backends[engine] = TextSearchBackend()
+            like_median, _, _ = latencies(session, text, location, repeat=3)
+            print(f"{text:<22} {'yes' if location else 'no':>8} {fts_median * 1000:>7.2f} ms {fts_max * 1000:>7.2f} ms "
+                  f"{like_median * 1000:>7.1f} ms {like_median / fts_median:>7.1f}x")
+    session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare text search latency with and without the FTS5 index.")
+    parser.add_argument("--chargers", type=int, default=200_000)
+    args = parser.parse_args()
+    run_benchmark(args.chargers)
@@ -0,0 +1,67 @@
+import json
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from app.models import EVCharger
+from app.routers.chargers import CHARGER_FIELDS, select_columns
+from app.serialization import dumps, to_rows
+from scripts.benchmark import memory_session, timed
+
+SIZES = [10_000, 100_000]
+
+
+def make_session(n, seed=0):
+    """
+    Creates an in-memory database with `n` chargers inside the Poland bounding box.
+    """
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(49.0, 55.0, n).tolist()
+    lons = rng.uniform(14.0, 24.0, n).tolist()
+    rows = [
+        {
+            "external_id": f"bench-{i}", "name": f"Charger {i}", "brand_name": "Brand", "url": None,
+            "latitude": lats[i], "longitude": lons[i], "street_name": "Main", "municipality": "Warszawa",
+            "postal_code": "00-001", "freeform_address": f"Main {i}, Warszawa",
+            "charging_availability": f"availability-{i}", "content_hash": "0" * 64, "change_version": 1,
+        }
+        for i in range(n)
+    ]
+    return memory_session((EVCharger.__table__, rows))
+
+
+def orm_path(session):
+    """
+    The previous approach: hydrated ORM objects, dictionaries, jsonable_encoder and json.dumps.
+    """
+    session.expunge_all()
+    chargers = session.query(EVCharger).order_by(EVCharger.id).all()
+    payload = [{key: getattr(charger, key) for key in CHARGER_FIELDS} for charger in chargers]
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(session):
+    rows = select_columns(session.query(EVCharger).order_by(EVCharger.id), CHARGER_FIELDS)
+    return dumps(to_rows((values for _, values in rows), CHARGER_FIELDS))
+
+
+def run_benchmark():
+    # Query and serialize, then serialize only
+    print(f"{'chargers':>9} {'orm + json':>14} {'rows + orjson':>14} {'speedup':>8} "
+          f"{'dicts + json':>14} {'rows + orjson':>14} {'speedup':>8}")
+    for n in SIZES:
+        session = make_session(n)
+        before = timed(lambda: orm_path(session))
+        after = timed(lambda: fast_path(session))
+
+        dict_payload = [{key: getattr(charger, key) for key in CHARGER_FIELDS} for charger in session.query(EVCharger)]
+        row_payload = to_rows((values for _, values in select_columns(session.query(EVCharger), CHARGER_FIELDS)), CHARGER_FIELDS)
+        encode_before = timed(lambda: json.dumps(jsonable_encoder(dict_payload), separators=(",", ":")))
+        encode_after = timed(lambda: dumps(row_payload))
+        print(
+            f"{n:>9} {n / before:>10.0f} r/s {n / after:>10.0f} r/s {before / after:>7.1f}x "
+            f"{n / encode_before:>10.0f} r/s {n / encode_after:>10.0f} r/s {encode_before / encode_after:>7.1f}x"
+        )
+        session.close()
+
+
+if __name__ == "__main__":
+    run_benchmark()
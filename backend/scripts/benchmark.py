@@ -0,0 +1,36 @@
+import time
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+from app.migrations import migrate
+
+
+def timed(fn, repeat=3):
+    """
+    Returns the best wall time of `repeat` runs of `fn`.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def memory_session(*tables, migrated=False):
+    """
+    Creates an in-memory database filled with the given rows.
+
+    :param tables: (table, list of row dictionaries) pairs, inserted in order.
+    :param migrated: Run the migrations after the insert, to build the indexes they maintain over existing rows.
+    :return: Session bound to the database.
+    """
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for table, rows in tables:
+            connection.execute(insert(table), rows)
+    if migrated:
+        migrate(engine)
+    return sessionmaker(bind=engine)()
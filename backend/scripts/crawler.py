@@ -0,0 +1,204 @@
+import json
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting how many requests start per second.
+    """
+
+    def __init__(self, rate: float, capacity: int = None):
+        """
+        :param rate: Tokens added per second, i.e. the sustained request rate.
+        :param capacity: Maximal burst size, defaults to one second worth of tokens.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a token is available and takes it.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def rectangle_key(top_left, btm_right) -> str:
+    return f"{top_left[0]:.6f},{top_left[1]:.6f},{btm_right[0]:.6f},{btm_right[1]:.6f}"
+
+
+def _write_json(path: str, data):
+    # Write to a temporary file first so an interrupted write never corrupts the file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class Checkpoint:
+    """
+    Persistent record of crawl progress, stored as JSON.
+
+    `done` holds rectangles (or result pages of a rectangle) whose chargers were
+    saved, `split` holds rectangles that were found to be too dense and were
+    divided into quadrants. A resumed crawl skips the former and recurses into
+    the latter without a request.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done = set()
+        self.split = set()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.done = set(data.get("done", []))
+            self.split = set(data.get("split", []))
+
+    @staticmethod
+    def key(top_left, btm_right) -> str:
+        return rectangle_key(top_left, btm_right)
+
+    @staticmethod
+    def _done_key(top_left, btm_right, offset: int) -> str:
+        key = rectangle_key(top_left, btm_right)
+        return f"{key}+{offset}" if offset else key
+
+    def mark_done(self, top_left, btm_right, offset: int = 0):
+        with self._lock:
+            self.done.add(self._done_key(top_left, btm_right, offset))
+            self._save()
+
+    def mark_split(self, top_left, btm_right):
+        with self._lock:
+            self.split.add(self.key(top_left, btm_right))
+            self._save()
+
+    def is_done(self, top_left, btm_right, offset: int = 0) -> bool:
+        return self._done_key(top_left, btm_right, offset) in self.done
+
+    def is_split(self, top_left, btm_right) -> bool:
+        return self.key(top_left, btm_right) in self.split
+
+    def _save(self):
+        if not self.path:
+            return
+        _write_json(self.path, {"done": sorted(self.done), "split": sorted(self.split)})
+
+    def clear(self):
+        with self._lock:
+            self.done.clear()
+            self.split.clear()
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class DensityMap:
+    """
+    Number of chargers seen in dense rectangles during previous crawls, stored as JSON.
+
+    Keys are the cells produced by `generate_grid_with_corners` and the quadrants
+    they were split into. Only rectangles holding more than one page of results
+    are kept, everything else is planned as a single request anyway.
+    """
+
+    def __init__(self, path: str, page_size: int = 100):
+        self.path = path
+        self.page_size = page_size
+        self.totals = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.totals = json.load(f)
+
+    def get(self, top_left, btm_right) -> int:
+        """
+        Returns the last seen number of chargers in the rectangle, 0 if unknown.
+        """
+        return self.totals.get(rectangle_key(top_left, btm_right), 0)
+
+    def record(self, top_left, btm_right, total: int):
+        key = rectangle_key(top_left, btm_right)
+        with self._lock:
+            if total > self.page_size:
+                if self.totals.get(key) == total:
+                    return
+                self.totals[key] = total
+            elif self.totals.pop(key, None) is None:
+                return
+            if self.path:
+                _write_json(self.path, self.totals)
+
+
+class TomTomClient:
+    """
+    HTTP client shared by all crawl workers.
+
+    Reuses pooled connections, waits for the rate limiter before every request
+    and retries throttled or failed requests with exponential backoff.
+    """
+
+    def __init__(self, rate_limiter: TokenBucket, pool_size: int = 10, max_retries: int = 5,
+                 backoff: float = 0.5, timeout: float = 10.0):
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.requests_sent = 0
+        self._counter_lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _retry_delay(self, attempt: int, response=None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff * 2 ** attempt * (1 + random.random())
+
+    def get_json(self, url: str, params: dict) -> dict:
+        """
+        Sends a GET request and returns the decoded JSON body.
+
+        :raises requests.RequestException: When the request still fails after all retries.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            with self._counter_lock:
+                self.requests_sent += 1
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._retry_delay(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                time.sleep(self._retry_delay(attempt, response))
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def close(self):
+        self.session.close()
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DECIMAL, ForeignKey, TIMESTAMP
+from sqlalchemy import create_engine, Column, Integer, String, Text, Float, ForeignKey, TIMESTAMP, Index, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import sessionmaker
@@ -14,13 +14,26 @@ class EVCharger(Base):
     name = Column(String(255))
     brand_name = Column(String(255))
     url = Column(Text)
-    latitude = Column(DECIMAL(9, 6), nullable=False)
-    longitude = Column(DECIMAL(9, 6), nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
     street_name = Column(String(255))
     municipality = Column(String(255))
     postal_code = Column(String(10))
     freeform_address = Column(Text)
     charging_availability = Column(Text)
+    content_hash = Column(String(64))
+    change_version = Column(Integer, index=True)
+    max_power_kw = Column(Float)
+    min_power_kw = Column(Float)
+    connector_mask = Column(Integer, default=0)
+    has_ac = Column(Boolean, default=False)
+    has_dc = Column(Boolean, default=False)
+
+    __table_args__ = (
+        Index("ix_ev_chargers_lat_lon", "latitude", "longitude"),
+        Index("ix_ev_chargers_max_power", "max_power_kw"),
+        Index("ix_ev_chargers_min_power", "min_power_kw"),
+    )
 
 class Connector(Base):
     __tablename__ = 'connectors'
@@ -28,13 +41,19 @@ class Connector(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     charger_id = Column(Integer, ForeignKey('ev_chargers.id', ondelete='CASCADE'))
     connector_type = Column(String(50), nullable=False)
-    rated_power_kw = Column(DECIMAL(5, 2))
+    rated_power_kw = Column(Float)
     voltage_v = Column(Integer)
     current_a = Column(Integer)
     current_type = Column(String(10))
     
     charger = relationship('EVCharger', backref='connectors')
 
+    __table_args__ = (
+        Index("ix_connectors_charger_type_power", "charger_id", "connector_type", "rated_power_kw"),
+        Index("ix_connectors_type_power", "connector_type", "rated_power_kw", "charger_id"),
+        Index("ix_connectors_power", "rated_power_kw", "charger_id"),
+    )
+
 class User(Base):
     __tablename__ = 'users'
     
@@ -54,6 +73,56 @@ class Favorite(Base):
     user = relationship("User", back_populates="favorites")
     charger = relationship("EVCharger", back_populates="favorited_by")
 
+    __table_args__ = (
+        Index("uq_favorites_user_charger", "user_id", "charger_id", unique=True),
+        Index("ix_favorites_charger_id", "charger_id"),
+    )
+
+class PasswordReset(Base):
+    __tablename__ = "password_resets"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    code_hash = Column(String(64), nullable=False)
+    expires_at = Column(TIMESTAMP, nullable=False)
+    used_at = Column(TIMESTAMP)
+
+    __table_args__ = (
+        Index("ix_password_resets_user_code", "user_id", "code_hash"),
+    )
+
+class DatasetVersion(Base):
+    __tablename__ = "dataset_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP)
+
+class ChargerTombstone(Base):
+    __tablename__ = "charger_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    external_id = Column(String(255), nullable=False)
+    deleted_version = Column(Integer, nullable=False, index=True)
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True)
+    recipient = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body = Column(Text)
+    status = Column(String(10), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(TIMESTAMP, nullable=False)
+    last_error = Column(Text)
+    created_at = Column(TIMESTAMP)
+    sent_at = Column(TIMESTAMP)
+
+    __table_args__ = (
+        Index("ix_email_outbox_due", "status", "next_attempt_at"),
+    )
+
 
 DATABASE_URL = "sqlite:///" + os.path.join(os.path.dirname(os.path.dirname(__file__)), "ev_chargers.db")
 engine = create_engine(DATABASE_URL, echo=True)
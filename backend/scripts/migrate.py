@@ -0,0 +1,19 @@
+import argparse
+from app.database import engine, create_db_engine
+from app.migrations import applied_versions, available_migrations, migrate
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations.")
+    parser.add_argument("--target", type=int, help="last migration version to apply")
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    parser.add_argument("--status", action="store_true", help="list migrations without applying them")
+    args = parser.parse_args()
+
+    db_engine = create_db_engine(args.database_url) if args.database_url else engine
+    if args.status:
+        applied = applied_versions(db_engine)
+        for version, name, _ in available_migrations():
+            print(f"{version:04d} {name:<30} {'applied' if version in applied else 'pending'}")
+    else:
+        done = migrate(db_engine, args.target)
+        print(f"Applied {len(done)} migration(s)" + (f": {', '.join(f'{v:04d}' for v in done)}" if done else ""))
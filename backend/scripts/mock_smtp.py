@@ -0,0 +1,215 @@
+import argparse
+import base64
+import socketserver
+import threading
+from email import message_from_bytes, policy
+
+
+class MockSMTP:
+    """
+    Local stand-in for an SMTP server that keeps delivered messages in memory.
+
+    Speaks enough plain-text ESMTP for smtplib: EHLO/HELO, AUTH PLAIN/LOGIN,
+    MAIL, RCPT, DATA, RSET, NOOP and QUIT. It can refuse the next messages with
+    a temporary error and drop open connections, to exercise the retries of the
+    outbox sender.
+    """
+
+    def __init__(self, username: str = None, password: str = None):
+        """
+        :param username: Login required before sending, no authentication if None.
+        :param password: Password of `username`.
+        """
+        self.username = username
+        self.password = password
+        self.messages = []
+        self.connections = 0
+        self.logins = 0
+        # Number of upcoming messages refused with "451 Try again later"
+        self.fail_next = 0
+        self._handlers = set()
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _check_login(self, username: str, password: str) -> bool:
+        if username == self.username and password == self.password:
+            with self._lock:
+                self.logins += 1
+            return True
+        return False
+
+    def disconnect_all(self):
+        """
+        Closes every open client connection, like a server dropping idle sessions.
+        """
+        with self._lock:
+            handlers = list(self._handlers)
+        for handler in handlers:
+            handler.close_connection()
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> tuple[str, int]:
+        """
+        Starts serving in a background thread.
+
+        :return: Tuple (host, port) to use as SENDER_SMTP and SMTP_PORT.
+        """
+        mock = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                with mock._lock:
+                    mock.connections += 1
+                    mock._handlers.add(self)
+
+            def finish(self):
+                with mock._lock:
+                    mock._handlers.discard(self)
+                try:
+                    super().finish()
+                except OSError:
+                    pass
+
+            def close_connection(self):
+                try:
+                    self.connection.shutdown(2)
+                except OSError:
+                    pass
+
+            def reply(self, line: str):
+                self.wfile.write(f"{line}\r\n".encode())
+
+            def read_line(self) -> str:
+                line = self.rfile.readline()
+                if not line:
+                    raise EOFError()
+                return line.decode("utf-8", "replace").rstrip("\r\n")
+
+            def read_data(self) -> bytes:
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in (b".\r\n", b".\n"):
+                        break
+                    # Undo the dot-stuffing of lines starting with "."
+                    lines.append(line[1:] if line.startswith(b".") else line)
+                return b"".join(lines)
+
+            def authenticate(self, args: list[str]) -> bool:
+                mechanism = args[0].upper() if args else ""
+                if mechanism == "PLAIN":
+                    if len(args) > 1:
+                        response = args[1]
+                    else:
+                        self.reply("334 ")
+                        response = self.read_line()
+                    _, username, password = base64.b64decode(response).decode().split("\0")
+                elif mechanism == "LOGIN":
+                    self.reply("334 VXNlcm5hbWU6")
+                    username = base64.b64decode(self.read_line()).decode()
+                    self.reply("334 UGFzc3dvcmQ6")
+                    password = base64.b64decode(self.read_line()).decode()
+                else:
+                    return False
+                return mock._check_login(username, password)
+
+            def handle(self):
+                authenticated = mock.username is None
+                sender, recipients = None, []
+                self.reply("220 mock ESMTP ready")
+                while True:
+                    try:
+                        line = self.read_line()
+                    except (EOFError, OSError):
+                        return
+                    if not line.strip():
+                        self.reply("500 Empty command")
+                        continue
+                    verb, *args = line.split()
+                    verb = verb.upper()
+
+                    if verb == "EHLO":
+                        self.reply("250-mock")
+                        self.reply("250-AUTH PLAIN LOGIN")
+                        self.reply("250 8BITMIME")
+                    elif verb == "HELO":
+                        self.reply("250 mock")
+                    elif verb == "AUTH":
+                        try:
+                            authenticated = self.authenticate(args)
+                        except EOFError:
+                            return
+                        except ValueError:
+                            authenticated = False
+                        self.reply("235 Authentication successful" if authenticated else "535 Authentication failed")
+                    elif verb == "MAIL":
+                        if not authenticated:
+                            self.reply("530 Authentication required")
+                            continue
+                        with mock._lock:
+                            refuse = mock.fail_next > 0
+                            mock.fail_next -= refuse
+                        if refuse:
+                            self.reply("451 Try again later")
+                            continue
+                        sender, recipients = line.split(":", 1)[1].split()[0].strip("<>"), []
+                        self.reply("250 OK")
+                    elif verb == "RCPT":
+                        recipients.append(line.split(":", 1)[1].split()[0].strip("<>"))
+                        self.reply("250 OK")
+                    elif verb == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        message = message_from_bytes(self.read_data(), policy=policy.default)
+                        with mock._lock:
+                            mock.messages.append({"sender": sender, "recipients": recipients, "message": message})
+                        sender, recipients = None, []
+                        self.reply("250 OK")
+                    elif verb == "RSET":
+                        sender, recipients = None, []
+                        self.reply("250 OK")
+                    elif verb == "NOOP":
+                        self.reply("250 OK")
+                    elif verb == "QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 Command not implemented")
+
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return host, self._server.server_address[1]
+
+    def stop(self):
+        if self._server is not None:
+            self.disconnect_all()
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accept SMTP messages locally and print them.")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--username", help="login required before sending")
+    parser.add_argument("--password")
+    args = parser.parse_args()
+
+    mock = MockSMTP(args.username, args.password)
+    host, port = mock.start(port=args.port)
+    print(f"Accepting mail at {host}:{port}, set SENDER_SMTP={host} SMTP_PORT={port} SMTP_SECURITY=none")
+    try:
+        seen = 0
+        while not threading.Event().wait(1):
+            for item in mock.messages[seen:]:
+                print(f"--- {item['sender']} -> {', '.join(item['recipients'])}")
+                print(item["message"])
+            seen = len(mock.messages)
+    except KeyboardInterrupt:
+        mock.stop()
@@ -0,0 +1,220 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+
+POI_SEARCH_PATH = "/search/2/poiSearch/"
+AVAILABILITY_PATH = "/search/2/chargingAvailability.json"
+# Search pages only through the first 2000 results
+MAX_RESULT_WINDOW = 2000
+
+# (latitude, longitude, weight) of the cities most chargers are placed around
+CITIES = [
+    (52.23, 21.01, 0.30),  # Warszawa
+    (50.06, 19.94, 0.14),  # Kraków
+    (51.11, 17.03, 0.12),  # Wrocław
+    (52.41, 16.93, 0.10),  # Poznań
+    (54.35, 18.65, 0.10),  # Gdańsk
+    (51.76, 19.46, 0.08),  # Łódź
+    (50.26, 19.02, 0.10),  # Katowice
+    (53.13, 23.16, 0.06),  # Białystok
+]
+CONNECTOR_TYPES = [
+    ("IEC62196Type2CCS", 150, "DC"),
+    ("IEC62196Type2CableAttached", 22, "AC3"),
+    ("IEC62196Type2Outlet", 22, "AC3"),
+    ("Chademo", 50, "DC"),
+]
+
+
+class MockTomTom:
+    """
+    Local stand-in for the TomTom poiSearch and chargingAvailability endpoints.
+
+    Serves a fixed set of synthetic chargers, part of them spread uniformly over
+    Poland and the rest clustered around big cities, with optional latency and
+    randomly failing requests.
+    """
+
+    def __init__(self, chargers: int = 5000, city_share: float = 0.7, latency: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        """
+        :param chargers: Number of synthetic chargers.
+        :param city_share: Fraction of chargers placed around cities.
+        :param latency: Seconds every response is delayed by.
+        :param error_rate: Fraction of requests answered with 503.
+        :param seed: Seed of the generated dataset and of the error injection.
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = {"poiSearch": 0, "chargingAvailability": 0, "errors": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+        rng = np.random.default_rng(seed)
+        in_cities = int(chargers * city_share)
+        weights = np.array([city[2] for city in CITIES])
+        city_index = rng.choice(len(CITIES), size=in_cities, p=weights / weights.sum())
+        centers = np.array([city[:2] for city in CITIES])[city_index]
+        clustered = centers + rng.normal(0.0, 0.08, size=(in_cities, 2))
+        uniform = np.column_stack((
+            rng.uniform(49.0, 55.0, chargers - in_cities),
+            rng.uniform(14.0, 24.0, chargers - in_cities),
+        ))
+        points = np.round(np.vstack((clustered, uniform)), 6)
+        # Keep every charger strictly inside the crawled area
+        points[:, 0] = np.clip(points[:, 0], 49.000001, 55.0)
+        points[:, 1] = np.clip(points[:, 1], 14.0, 23.999999)
+        self.lats = np.ascontiguousarray(points[:, 0])
+        self.lons = np.ascontiguousarray(points[:, 1])
+        self.connector_types = rng.integers(0, len(CONNECTOR_TYPES), size=(chargers, 2))
+
+    def charger(self, i: int) -> dict:
+        """
+        Builds the poiSearch result of the i-th synthetic charger.
+        """
+        return {
+            "id": f"mock-{i}",
+            "poi": {"name": f"Charger {i}", "brands": [{"name": f"Brand {i % 12}"}], "url": None},
+            "position": {"lat": float(self.lats[i]), "lon": float(self.lons[i])},
+            "address": {
+                "streetName": f"Street {i % 500}",
+                "municipality": "Mock",
+                "postalCode": f"{i % 100:02d}-{i % 1000:03d}",
+                "freeformAddress": f"Street {i % 500} {i}, Mock",
+            },
+            "dataSources": {"chargingAvailability": {"id": f"mock-availability-{i}"}},
+            "chargingPark": {"connectors": [
+                {
+                    "connectorType": CONNECTOR_TYPES[t][0],
+                    "ratedPowerKW": CONNECTOR_TYPES[t][1],
+                    "voltageV": 400,
+                    "currentA": 32,
+                    "currentType": CONNECTOR_TYPES[t][2],
+                }
+                for t in sorted(set(self.connector_types[i].tolist()))
+            ]},
+        }
+
+    def search(self, top_left, btm_right, limit: int, offset: int) -> dict:
+        inside = np.flatnonzero(
+            (self.lats <= top_left[0]) & (self.lats > btm_right[0])
+            & (self.lons >= top_left[1]) & (self.lons < btm_right[1])
+        )
+        return {
+            "summary": {"totalResults": len(inside), "numResults": len(inside[offset:offset + limit])},
+            "results": [self.charger(i) for i in inside[offset:offset + limit].tolist()],
+        }
+
+    def availability(self, availability_id: str) -> dict:
+        rng = random.Random(availability_id)
+        return {
+            "chargingAvailability": availability_id,
+            "connectors": [{
+                "type": CONNECTOR_TYPES[0][0],
+                "total": 4,
+                "availability": {"current": {
+                    "available": rng.randint(0, 4), "occupied": rng.randint(0, 4),
+                    "reserved": 0, "outOfService": rng.randint(0, 1),
+                }},
+            }],
+        }
+
+    def _count(self, key: str) -> bool:
+        """
+        Counts a request and decides whether it fails.
+        """
+        with self._lock:
+            self.requests[key] += 1
+            failed = self._random.random() < self.error_rate
+            self.requests["errors"] += failed
+        return failed
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Starts serving in a background thread.
+
+        :return: Base URL to use as TOMTOM_API_URL.
+        """
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if url.path.startswith(POI_SEARCH_PATH):
+                    failed = mock._count("poiSearch")
+                elif url.path == AVAILABILITY_PATH:
+                    failed = mock._count("chargingAvailability")
+                else:
+                    return self._send(404, {"error": "Not found"})
+
+                if mock.latency:
+                    time.sleep(mock.latency)
+                if failed:
+                    return self._send(503, {"error": "Service unavailable"})
+
+                try:
+                    if url.path == AVAILABILITY_PATH:
+                        return self._send(200, mock.availability(query["chargingAvailability"]))
+                    limit = int(query.get("limit", 10))
+                    offset = int(query.get("ofs", 0))
+                    if limit > 100 or offset + limit > MAX_RESULT_WINDOW:
+                        return self._send(400, {"error": "Invalid limit or ofs"})
+                    top_left = tuple(map(float, query["topLeft"].split(",")))
+                    btm_right = tuple(map(float, query["btmRight"].split(",")))
+                except (KeyError, ValueError):
+                    return self._send(400, {"error": "Invalid request"})
+                self._send(200, mock.search(top_left, btm_right, limit, offset))
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self._server.server_port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve synthetic TomTom poiSearch and chargingAvailability responses.")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--chargers", type=int, default=5000, help="number of synthetic chargers")
+    parser.add_argument("--city-share", type=float, default=0.7, help="fraction of chargers around cities")
+    parser.add_argument("--latency", type=float, default=0.0, help="response delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    mock = MockTomTom(args.chargers, args.city_share, args.latency, args.error_rate, args.seed)
+    url = mock.start(port=args.port)
+    print(f"Serving {args.chargers} chargers at {url}, set TOMTOM_API_URL={url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        mock.stop()
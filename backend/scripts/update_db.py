@@ -1,16 +1,51 @@
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import requests
 from sqlalchemy.exc import IntegrityError
 from app.database import SessionLocal
 from app.crud import update_db
+from scripts.crawler import Checkpoint, DensityMap, TokenBucket, TomTomClient
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
 API_KEY = os.getenv("API_KEY")
-BASE_URL = 'https://api.tomtom.com/search/2/poiSearch'
+TOMTOM_API_URL = os.getenv("TOMTOM_API_URL", "https://api.tomtom.com")
+BASE_URL = f"{TOMTOM_API_URL}/search/2/poiSearch"
 
-def fetch_chargers_for_rectangle(top_left, btm_right, limit=100):
+# Crawl settings, the default rate matches the Search API free tier quota
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "4"))
+CRAWL_RATE = float(os.getenv("CRAWL_RATE", "5"))
+CRAWL_CHECKPOINT = os.getenv("CRAWL_CHECKPOINT", "crawl_checkpoint.json")
+CRAWL_DENSITY_MAP = os.getenv("CRAWL_DENSITY_MAP", "crawl_density.json")
+# Search only pages through the first 2000 results (ofs + limit <= 2000), denser rectangles are split
+MAX_RESULT_WINDOW = 2000
+# Rectangles smaller than this (in degrees) are never split further
+MIN_SPLIT_SIZE = 0.001
+
+
+class CrawlState:
+    """
+    State shared by the workers of one crawl.
+    """
+
+    def __init__(self, client, checkpoint, density_map, session_factory, limit=100):
+        self.client = client
+        self.checkpoint = checkpoint
+        self.density_map = density_map
+        self.session_factory = session_factory
+        self.limit = limit
+        self.stats = {"inserted": 0, "updated": 0, "unchanged": 0, "requests_saved": 0}
+        # update_db is not meant to run concurrently on the same rows
+        self.db_lock = threading.Lock()
+
+    def count(self, key, value=1):
+        with self.db_lock:
+            self.stats[key] += value
+
+def fetch_chargers_for_rectangle(client, top_left, btm_right, limit=100, offset=0):
     """
     Fetches chargers for rectangle defined by top left and bottom right coordinates
     """
@@ -22,40 +57,93 @@ def fetch_chargers_for_rectangle(top_left, btm_right, limit=100):
         'btmRight': f"{btm_right[0]},{btm_right[1]}",
         'limit': limit,
     }
-    response = requests.get(url, params=params)
-    if response.status_code == 200:
-        data = response.json()
-        return data.get('results', []), data.get('summary', {}).get('totalResults', 0)
-    else:
-        print(f"Error: {response.status_code} for rectangle {top_left}, {btm_right}")
-        return [], 0
-
-def fetch_with_split_and_update_db(session, top_left, btm_right, step_lat, step_lon, limit=100):
-    """
-    Recursively fetch chargers for a rectangle and save them to the database.
-    """
-    results, total_results = fetch_chargers_for_rectangle(top_left, btm_right, limit)
-    
-    if total_results == limit:  # If we have to divide grid into smaller pieces
-        mid_lat = (top_left[0] + btm_right[0]) / 2
-        mid_lon = (top_left[1] + btm_right[1]) / 2
-        
-        sub_rects = [
-            ((top_left[0], top_left[1]), (mid_lat, mid_lon)),
-            ((top_left[0], mid_lon), (mid_lat, btm_right[1])),
-            ((mid_lat, top_left[1]), (btm_right[0], mid_lon)),
-            ((mid_lat, mid_lon), (btm_right[0], btm_right[1]))
-        ]
-        
-        for sub_rect in sub_rects:
-            fetch_with_split_and_update_db(session, *sub_rect, step_lat / 2, step_lon / 2, limit)
-    else:
-        try:
-            update_db(session, results)
-            print(f"Saved {len(results)} chargers for rectangle {top_left}, {btm_right}")
-        except IntegrityError as e:
-            print(f"Error saving chargers for rectangle {top_left}, {btm_right}: {e}")
-            session.rollback()
+    if offset:
+        params['ofs'] = offset
+    data = client.get_json(url, params)
+    return data.get('results', []), data.get('summary', {}).get('totalResults', 0)
+
+def split_rectangle(top_left, btm_right):
+    """
+    Divides a rectangle into four quadrants.
+    """
+    mid_lat = (top_left[0] + btm_right[0]) / 2
+    mid_lon = (top_left[1] + btm_right[1]) / 2
+    return [
+        ((top_left[0], top_left[1]), (mid_lat, mid_lon)),
+        ((top_left[0], mid_lon), (mid_lat, btm_right[1])),
+        ((mid_lat, top_left[1]), (btm_right[0], mid_lon)),
+        ((mid_lat, mid_lon), (btm_right[0], btm_right[1]))
+    ]
+
+def can_split(top_left, btm_right):
+    return top_left[0] - btm_right[0] >= MIN_SPLIT_SIZE
+
+def page_offsets(total, limit):
+    """
+    Offsets of the result pages needed to read `total` results, within the search window.
+    """
+    return range(0, min(max(total, 1), MAX_RESULT_WINDOW), limit)
+
+def plan_rectangle(state, top_left, btm_right):
+    """
+    Plans the requests for a rectangle from the checkpoint and the density map, without sending any.
+
+    A rectangle known to exceed the search window is split straight away, and one known to
+    hold several pages of results gets all its pages planned at once.
+
+    :return: List of (top_left, btm_right, offset) tasks that still have to be fetched.
+    """
+    if not state.checkpoint.is_split(top_left, btm_right):
+        total = state.density_map.get(top_left, btm_right)
+        if total <= MAX_RESULT_WINDOW or not can_split(top_left, btm_right):
+            return [(top_left, btm_right, offset) for offset in page_offsets(total, state.limit)
+                    if not state.checkpoint.is_done(top_left, btm_right, offset)]
+        # The request would only tell us to split again
+        state.count("requests_saved")
+        state.checkpoint.mark_split(top_left, btm_right)
+    return [task for sub_rect in split_rectangle(top_left, btm_right) for task in plan_rectangle(state, *sub_rect)]
+
+def save_chargers(state, results, top_left, btm_right):
+    session = state.session_factory()
+    try:
+        with state.db_lock:
+            stats = update_db(session, results)
+            for key, value in stats.items():
+                state.stats[key] += value
+        return True
+    except IntegrityError as e:
+        print(f"Error saving chargers for rectangle {top_left}, {btm_right}: {e}")
+        session.rollback()
+        return False
+    finally:
+        session.close()
+
+def fetch_with_split_and_update_db(state, top_left, btm_right, offset=0):
+    """
+    Fetches one page of chargers for a rectangle and saves them to the database.
+
+    Results are saved even when the rectangle turns out to be too dense, so the page is never
+    wasted. The first page of a rectangle also decides how the rest of it is crawled.
+
+    :return: List of (top_left, btm_right, offset) tasks for the remaining pages or quadrants.
+    """
+    results, total_results = fetch_chargers_for_rectangle(state.client, top_left, btm_right, state.limit, offset)
+    if offset == 0:
+        state.density_map.record(top_left, btm_right, total_results)
+    saved = save_chargers(state, results, top_left, btm_right)
+
+    if offset == 0 and total_results > MAX_RESULT_WINDOW and can_split(top_left, btm_right):
+        # If we have to divide grid into smaller pieces
+        state.checkpoint.mark_split(top_left, btm_right)
+        return [task for sub_rect in split_rectangle(top_left, btm_right) for task in plan_rectangle(state, *sub_rect)]
+
+    if saved:
+        state.checkpoint.mark_done(top_left, btm_right, offset)
+        print(f"Saved {len(results)} chargers for rectangle {top_left}, {btm_right} (offset {offset})")
+    if offset != 0:
+        return []
+    return [(top_left, btm_right, next_offset) for next_offset in page_offsets(total_results, state.limit)[1:]
+            if not state.checkpoint.is_done(top_left, btm_right, next_offset)]
 
 def generate_grid_with_corners(min_lat, max_lat, min_lon, max_lon, step_lat, step_lon):
     """
@@ -79,27 +167,85 @@ def generate_grid_with_corners(min_lat, max_lat, min_lon, max_lon, step_lat, ste
         lat += step_lat
     return grid
 
-def fetch_and_save_ev_chargers_in_poland():
+def fetch_and_save_ev_chargers_in_poland(workers=CRAWL_WORKERS, rate=CRAWL_RATE, checkpoint_path=CRAWL_CHECKPOINT,
+                                         fresh=False, session_factory=SessionLocal, density_path=CRAWL_DENSITY_MAP):
     """
     Fetches all EV chargers in Poland and saves them directly to the database.
+
+    Rectangles are crawled by a pool of worker threads sharing one rate-limited HTTP client.
+    Finished rectangles are recorded in the checkpoint file, so an interrupted crawl resumes
+    where it stopped. The checkpoint is removed once the whole area has been crawled.
+    Rectangle densities are kept in the density map file and used to plan the next crawl.
+
+    :param workers: Number of requests sent concurrently.
+    :param rate: Maximal number of requests sent per second.
+    :param checkpoint_path: Path of the checkpoint file.
+    :param fresh: Ignore an existing checkpoint and crawl everything again.
+    :param session_factory: Callable returning a new database session.
+    :param density_path: Path of the density map file.
+    :return: Dictionary with crawl statistics.
     """
     min_lat, max_lat = 49.0, 55.0
     min_lon, max_lon = 14.0, 24.0
     step_lat, step_lon = 0.5, 0.5
 
     grid = generate_grid_with_corners(min_lat, max_lat, min_lon, max_lon, step_lat, step_lon)
-    session = SessionLocal()
-    
-    try:
-        for rectangle in grid:
-            top_left, btm_right = rectangle
-            fetch_with_split_and_update_db(session, top_left, btm_right, step_lat, step_lon)
+    checkpoint = Checkpoint(checkpoint_path)
+    if fresh:
+        checkpoint.clear()
+    client = TomTomClient(TokenBucket(rate), pool_size=workers)
+    state = CrawlState(client, checkpoint, DensityMap(density_path), session_factory)
+    failed = []
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        scheduled = set()
+
+        def submit(tasks):
+            for task in tasks:
+                top_left, btm_right, offset = task
+                key = (Checkpoint.key(top_left, btm_right), offset)
+                if key not in scheduled:
+                    scheduled.add(key)
+                    pending[pool.submit(fetch_with_split_and_update_db, state, *task)] = task
+
+        try:
+            for rectangle in grid:
+                submit(plan_rectangle(state, *rectangle))
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    top_left, btm_right, offset = pending.pop(future)
+                    try:
+                        submit(future.result())
+                    except requests.RequestException as e:
+                        print(f"Error fetching rectangle {top_left}, {btm_right} (offset {offset}): {e}")
+                        failed.append((top_left, btm_right, offset))
+        except BaseException:
+            # Do not start queued rectangles, the checkpoint keeps what already finished
+            for future in pending:
+                future.cancel()
+            raise
+        finally:
+            client.close()
+
+    stats = {**state.stats, "requests": client.requests_sent, "failed": len(failed)}
+    print(f"Sent {stats['requests']} requests, the density map saved {stats['requests_saved']}.")
+    if failed:
+        print(f"{len(failed)} requests failed, run the script again to resume from {checkpoint_path}")
+    else:
+        checkpoint.clear()
         print("All chargers saved successfully.")
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        session.rollback()
-    finally:
-        session.close()
+    return stats
 
 if __name__ == "__main__":
-    fetch_and_save_ev_chargers_in_poland()
+    parser = argparse.ArgumentParser(description="Fetch EV chargers in Poland from TomTom and save them to the database.")
+    parser.add_argument("--workers", type=int, default=CRAWL_WORKERS, help="number of concurrent requests")
+    parser.add_argument("--rate", type=float, default=CRAWL_RATE, help="maximal requests per second")
+    parser.add_argument("--checkpoint", default=CRAWL_CHECKPOINT, help="checkpoint file used to resume a crawl")
+    parser.add_argument("--density-map", default=CRAWL_DENSITY_MAP, help="density map used to plan the crawl")
+    parser.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args()
+    fetch_and_save_ev_chargers_in_poland(args.workers, args.rate, args.checkpoint, args.fresh,
+                                         density_path=args.density_map)
@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+from app.database import engine
+from app.migrations import migrate
+
+
+class StatementCounter:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def reset(self):
+        self.statements.clear()
+
+
+@pytest.fixture
+def statement_counter():
+    counter = StatementCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(engine, "before_cursor_execute", counter)
+
+
+def tomtom_charger(external_id, name="Charger", connectors=None):
+    return {
+        "id": external_id,
+        "poi": {"name": name, "brands": [{"name": "Brand"}], "url": None},
+        "position": {"lat": 52.23, "lon": 21.01},
+        "address": {"streetName": "Main", "municipality": "Warszawa", "postalCode": "00-001", "freeformAddress": "Main 1, Warszawa"},
+        "dataSources": {"chargingAvailability": {"id": f"availability-{external_id}"}},
+        "chargingPark": {"connectors": connectors if connectors is not None else [
+            {"connectorType": "IEC62196Type2CCS", "ratedPowerKW": 150, "voltageV": 400, "currentA": 375, "currentType": "DC"},
+            {"connectorType": "IEC62196Type2Outlet", "ratedPowerKW": 22, "voltageV": 400, "currentA": 32, "currentType": "AC3"},
+        ]},
+    }
+
+
+DC = [{"connectorType": "IEC62196Type2CCS", "ratedPowerKW": 150, "voltageV": 400, "currentA": 375, "currentType": "DC"}]
+AC = [{"connectorType": "IEC62196Type2Outlet", "ratedPowerKW": 22, "voltageV": 400, "currentA": 32, "currentType": "AC3"}]
+
+
+def charger(external_id, name, brand, street, municipality, postal_code, lat, lon, connectors):
+    data = tomtom_charger(external_id, name, connectors)
+    data["poi"]["brands"] = [{"name": brand}]
+    data["position"] = {"lat": lat, "lon": lon}
+    data["address"] = {
+        "streetName": street, "municipality": municipality, "postalCode": postal_code,
+        "freeformAddress": f"{street} 1, {postal_code} {municipality}",
+    }
+    return data
+
+
+@pytest.fixture
+def migrated_engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    migrate(engine)
+    yield engine
+    engine.dispose()
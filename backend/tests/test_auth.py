@@ -1,5 +1,7 @@
 from fastapi.testclient import TestClient
+import time
 from app.main import app
+from app.auth import AuthenticatedUser, UserCache, create_access_token, user_cache
 
 client = TestClient(app)
 
@@ -35,4 +37,40 @@ def test_non_existing_login_user():
         "password": "nonexistingpassword"
     })
     assert response.status_code == 401
-    assert response.json() == {"detail": "Invalid credentials"}
\ No newline at end of file
+    assert response.json() == {"detail": "Invalid credentials"}
+
+def test_user_cache_expiry():
+    cache = UserCache(ttl=60)
+    user = AuthenticatedUser(1, "testuser", "testuser@example.com")
+    cache.put("valid", user, time.time() + 3600)
+    cache.put("expired", user, time.time() - 1)
+    assert cache.get("valid") == user
+    assert cache.get("expired") is None
+
+def test_user_cache_is_bounded():
+    cache = UserCache(max_entries=2)
+    for i in range(3):
+        cache.put(f"token-{i}", AuthenticatedUser(i, f"user{i}", f"user{i}@example.com"), time.time() + 3600)
+    assert len(cache) == 2
+    assert cache.get("token-0") is None
+
+def test_user_cache_forget_user():
+    cache = UserCache()
+    cache.put("a", AuthenticatedUser(1, "one", "one@example.com"), time.time() + 3600)
+    cache.put("b", AuthenticatedUser(2, "two", "two@example.com"), time.time() + 3600)
+    cache.forget_user(1)
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+
+def test_authenticated_request_uses_cache(statement_counter):
+    token = create_access_token({"sub": "testuser"})
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/api/favorites/", headers=headers)
+    statement_counter.reset()
+    client.get("/api/favorites/", headers=headers)
+    assert statement_counter.count == 1
+    assert user_cache.get(token).username == "testuser"
+
+def test_invalid_token_is_rejected():
+    response = client.get("/api/favorites/", headers={"Authorization": "Bearer invalid"})
+    assert response.status_code == 401
@@ -1,5 +1,11 @@
+import json
 from fastapi.testclient import TestClient
 from app.main import app
+from app.cache import response_cache
+from app.database import SessionLocal
+from app.dataset import bump_dataset_version, forget_dataset_version
+from app.markers import MEDIA_TYPE as MARKERS_MEDIA_TYPE, decode_marker_feed
+from app.spatial_backend import KNN_MAX_ROUNDS
 
 client = TestClient(app)
 
@@ -58,3 +64,217 @@ def test_get_charging_status():
 def test_get_charging_status_not_found():
     response = client.get("/api/charging-status/9999")
     assert response.status_code == 404
+
+def test_get_chargers_with_limit():
+    response = client.get("/api/chargers/?user_latitude=52.0&user_longitude=21.0&limit=5")
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 5
+    distances = [charger["distance_km"] for charger in data]
+    assert distances == sorted(distances)
+
+def test_get_chargers_with_radius():
+    response = client.get("/api/chargers/?user_latitude=52.23&user_longitude=21.01&radius_km=10")
+    assert response.status_code == 200
+    assert all(charger["distance_km"] <= 10 for charger in response.json())
+
+def test_get_chargers_with_radius_without_location():
+    response = client.get("/api/chargers/?radius_km=10")
+    assert response.status_code == 400
+
+def test_get_chargers_in_viewport_clustered():
+    response = client.get("/api/chargers/viewport?ne_lat=55.0&ne_lon=24.0&sw_lat=49.0&sw_lon=14.0&zoom=5")
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["clusters"]) > 0
+    assert all(cluster["count"] > 1 for cluster in data["clusters"])
+
+def test_get_chargers_in_viewport_individual():
+    response = client.get("/api/chargers/viewport?ne_lat=52.3&ne_lon=21.1&sw_lat=52.1&sw_lon=20.9&zoom=15")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["clusters"] == []
+    assert all({"id", "name", "latitude", "longitude"} <= charger.keys() for charger in data["chargers"])
+
+def test_get_chargers_in_viewport_invalid_bounds():
+    response = client.get("/api/chargers/viewport?ne_lat=49.0&ne_lon=14.0&sw_lat=55.0&sw_lon=24.0&zoom=5")
+    assert response.status_code == 400
+
+def test_get_chargers_pagination():
+    first_page = client.get("/api/chargers/?limit=10")
+    assert first_page.status_code == 200
+    cursor = first_page.headers["X-Next-Cursor"]
+    second_page = client.get(f"/api/chargers/?limit=10&cursor={cursor}")
+    assert second_page.status_code == 200
+    first_ids = [charger["id"] for charger in first_page.json()]
+    second_ids = [charger["id"] for charger in second_page.json()]
+    assert max(first_ids) < min(second_ids)
+
+def test_get_chargers_pagination_by_distance():
+    url = "/api/chargers/?user_latitude=52.0&user_longitude=21.0&limit=10"
+    first_page = client.get(url)
+    second_page = client.get(f"{url}&cursor={first_page.headers['X-Next-Cursor']}")
+    assert second_page.status_code == 200
+    assert first_page.json()[-1]["distance_km"] <= second_page.json()[0]["distance_km"]
+    assert not {c["id"] for c in first_page.json()} & {c["id"] for c in second_page.json()}
+
+def test_get_chargers_with_fields():
+    response = client.get("/api/chargers/?fields=id,latitude,longitude,name")
+    assert response.status_code == 200
+    assert all(set(charger.keys()) == {"id", "latitude", "longitude", "name"} for charger in response.json())
+
+def test_get_chargers_with_unknown_field():
+    response = client.get("/api/chargers/?fields=id,password")
+    assert response.status_code == 400
+
+def test_get_chargers_hides_internal_columns():
+    assert client.get("/api/chargers/?fields=id,content_hash").status_code == 400
+    charger = client.get("/api/chargers/?limit=1").json()[0]
+    assert not {"content_hash", "change_version", "connector_mask", "max_power_kw"} & charger.keys()
+
+def test_get_chargers_with_invalid_cursor():
+    response = client.get("/api/chargers/?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+def test_get_chargers_with_filters_returns_unique_chargers():
+    response = client.get("/api/chargers/?min_power=11&connector_types=IEC62196Type2CCS,IEC62196Type3,Chademo&limit=1000")
+    assert response.status_code == 200
+    ids = [charger["id"] for charger in response.json()]
+    assert len(ids) == len(set(ids))
+
+def test_get_chargers_with_filters_statement_count(statement_counter):
+    url = "/api/chargers/?min_power=22&connector_types=IEC62196Type2CCS"
+    client.get(url)
+    response_cache.clear()
+    statement_counter.reset()
+    response = client.get(url)
+    assert response.status_code == 200
+    assert statement_counter.count == 1
+
+def test_get_chargers_by_distance_statement_count(statement_counter):
+    client.get("/api/chargers/?user_latitude=52.0&user_longitude=21.0&limit=1")
+    response_cache.clear()
+    statement_counter.reset()
+    response = client.get("/api/chargers/?user_latitude=52.0&user_longitude=21.0&min_power=22")
+    assert response.status_code == 200
+    # The nearest query, then the page. A database backend may grow its search circle a bounded number of times.
+    assert 2 <= statement_counter.count <= KNN_MAX_ROUNDS + 1
+
+def test_get_charger_details_statement_count(statement_counter):
+    client.get("/api/chargers/1")
+    response_cache.clear()
+    statement_counter.reset()
+    response = client.get("/api/chargers/1")
+    assert response.status_code == 200
+    assert statement_counter.count == 1
+
+def test_get_chargers_etag():
+    response = client.get("/api/chargers/?limit=20")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    cached = client.get("/api/chargers/?limit=20", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+def test_get_charger_details_etag():
+    etag = client.get("/api/chargers/1").headers["ETag"]
+    response = client.get("/api/chargers/1", headers={"If-None-Match": f'"other", {etag}'})
+    assert response.status_code == 304
+
+def test_get_chargers_served_from_cache(statement_counter):
+    client.get("/api/chargers/?limit=30")
+    statement_counter.reset()
+    response = client.get("/api/chargers/?limit=30")
+    assert response.status_code == 200
+    assert statement_counter.count == 0
+
+def test_get_chargers_cache_invalidated_by_dataset_version(statement_counter):
+    etag = client.get("/api/chargers/?limit=40").headers["ETag"]
+    session = SessionLocal()
+    try:
+        bump_dataset_version(session)
+        session.commit()
+        forget_dataset_version()
+    finally:
+        session.close()
+    statement_counter.reset()
+    response = client.get("/api/chargers/?limit=40", headers={"If-None-Match": etag})
+    assert statement_counter.count > 0
+    assert response.status_code == 304
+
+def test_get_charging_status_batch():
+    response = client.post("/api/charging-status/batch", json={"charger_ids": [7, 8, 9999]})
+    assert response.status_code == 200
+    data = response.json()
+    assert set(data["results"]) | set(data["errors"]) == {"7", "8", "9999"}
+    assert data["errors"]["9999"] == "Charger not found"
+
+def test_get_charging_status_batch_empty():
+    response = client.post("/api/charging-status/batch", json={"charger_ids": []})
+    assert response.status_code == 422
+
+
+def test_get_charger_changes_full():
+    response = client.get("/api/chargers/changes")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["version"] > 0
+    assert len(data["chargers"]) > 0
+    assert "content_hash" not in data["chargers"][0]
+    assert data["deleted"] == []
+
+def test_get_charger_changes_up_to_date():
+    version = client.get("/api/chargers/changes").json()["version"]
+    response = client.get(f"/api/chargers/changes?since={version}")
+    assert response.status_code == 200
+    assert response.json() == {"version": version, "chargers": [], "deleted": []}
+
+def test_get_charger_changes_ahead_of_server():
+    full = client.get("/api/chargers/changes").json()
+    response = client.get(f"/api/chargers/changes?since={full['version'] + 100}")
+    assert response.status_code == 200
+    assert response.json() == full
+
+def test_get_charger_markers():
+    response = client.get("/api/chargers/markers")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == MARKERS_MEDIA_TYPE
+    markers = decode_marker_feed(response.content)
+    chargers = client.get("/api/chargers/?limit=5&fields=id,latitude,longitude,name").json()
+    by_id = {marker["id"]: marker for marker in markers}
+    for charger in chargers:
+        assert by_id[charger["id"]]["name"] == charger["name"]
+        assert abs(by_id[charger["id"]]["latitude"] - charger["latitude"]) < 1e-6
+
+def test_get_charger_markers_with_filters():
+    markers = decode_marker_feed(client.get("/api/chargers/markers?min_power=100").content)
+    all_markers = decode_marker_feed(client.get("/api/chargers/markers").content)
+    chargers = client.get("/api/chargers/?min_power=100&limit=1000&fields=id").json()
+    assert 0 < len(markers) < len(all_markers)
+    assert {marker["id"] for marker in markers} >= {charger["id"] for charger in chargers}
+
+def test_get_charger_markers_etag():
+    etag = client.get("/api/chargers/markers").headers["ETag"]
+    response = client.get("/api/chargers/markers", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+def test_export_chargers():
+    response = client.get("/api/chargers/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.text.splitlines()
+    chargers = [json.loads(line) for line in lines]
+    assert len(chargers) == len(decode_marker_feed(client.get("/api/chargers/markers").content))
+    assert [charger["id"] for charger in chargers] == sorted(charger["id"] for charger in chargers)
+    assert "external_id" in chargers[0]
+
+def test_export_chargers_with_fields_and_filters():
+    response = client.get("/api/chargers/export?fields=id,name&min_power=100")
+    chargers = [json.loads(line) for line in response.text.splitlines()]
+    markers = decode_marker_feed(client.get("/api/chargers/markers?min_power=100").content)
+    assert {charger["id"] for charger in chargers} == {marker["id"] for marker in markers}
+    assert set(chargers[0]) == {"id", "name"}
+
+def test_export_chargers_with_unknown_field():
+    response = client.get("/api/chargers/export?fields=id,distance_km")
+    assert response.status_code == 400
@@ -0,0 +1,43 @@
+import random
+from sqlalchemy.orm import sessionmaker
+from app import crud
+from app.clustering import ClusterGrid, build_cluster_grid
+from tests.conftest import AC, DC, charger
+
+random.seed(7)
+ROWS = [
+    (i, f"Charger {i}", random.uniform(49.0, 55.0), random.uniform(14.0, 24.0), random.choice([None, 11.0, 22.0, 150.0]))
+    for i in range(1, 1001)
+]
+grid = ClusterGrid(ROWS)
+
+def test_every_zoom_level_accounts_for_all_chargers():
+    for zoom in range(grid.max_zoom + 1):
+        clusters, chargers = grid.query(zoom, -90.0, -180.0, 90.0, 180.0)
+        assert sum(cluster["count"] for cluster in clusters) + len(chargers) == len(ROWS)
+
+def test_cluster_max_power():
+    clusters, _ = grid.query(0, -90.0, -180.0, 90.0, 180.0)
+    assert clusters[0]["max_power_kw"] == 150.0
+
+def test_single_chargers_keep_their_identity():
+    _, chargers = grid.query(grid.max_zoom, -90.0, -180.0, 90.0, 180.0)
+    by_id = {row[0]: row for row in ROWS}
+    for charger in chargers:
+        assert charger["name"] == by_id[charger["id"]][1]
+        assert charger["latitude"] == by_id[charger["id"]][2]
+
+def test_empty_grid():
+    assert ClusterGrid([]).query(5, -90.0, -180.0, 90.0, 180.0) == ([], [])
+
+def test_grid_uses_capability_summary(migrated_engine):
+    session = sessionmaker(bind=migrated_engine)()
+    crud.update_db(session, [
+        charger("a", "Orlen Konin", "Orlen", "Poznańska", "Konin", "62-500", 52.22, 18.25, DC + AC),
+        charger("b", "GreenWay Konin", "GreenWay", "Kolska", "Konin", "62-500", 52.21, 18.26, AC),
+    ])
+    clusters, chargers = build_cluster_grid(session).query(0, -90.0, -180.0, 90.0, 180.0)
+    session.close()
+    assert chargers == []
+    assert clusters[0]["count"] == 2
+    assert clusters[0]["max_power_kw"] == 150.0
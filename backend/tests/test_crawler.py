@@ -0,0 +1,202 @@
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pytest
+import requests
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+from app.models import EVCharger
+from scripts import update_db as crawl
+from scripts.crawler import Checkpoint, TokenBucket, TomTomClient
+from scripts.mock_tomtom import MockTomTom
+from tests.conftest import tomtom_charger
+
+HOTSPOT = (52.25, 21.25)
+
+
+def make_points():
+    rng = random.Random(7)
+    points = [(f"dense-{i}", HOTSPOT[0] + rng.uniform(-0.05, 0.05), HOTSPOT[1] + rng.uniform(-0.05, 0.05))
+              for i in range(150)]
+    points += [(f"sparse-{i}", rng.uniform(49.1, 54.9), rng.uniform(14.1, 23.9)) for i in range(40)]
+    return points
+
+
+class PoiHandler(BaseHTTPRequestHandler):
+    points = make_points()
+    requests = []
+    # Number of upcoming requests answered with 503
+    throttled = 0
+    # Rectangles containing this point are answered with 404
+    broken_point = None
+    lock = threading.Lock()
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        top, left = map(float, query["topLeft"][0].split(","))
+        bottom, right = map(float, query["btmRight"][0].split(","))
+        limit = int(query["limit"][0])
+        offset = int(query.get("ofs", ["0"])[0])
+        with PoiHandler.lock:
+            PoiHandler.requests.append((top, left, bottom, right))
+            throttled = PoiHandler.throttled > 0
+            PoiHandler.throttled -= throttled
+
+        broken = PoiHandler.broken_point
+        if throttled:
+            self.send_response(503)
+            self.end_headers()
+            return
+        if broken and bottom <= broken[0] < top and left <= broken[1] < right:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        inside = [p for p in self.points if bottom <= p[1] < top and left <= p[2] < right]
+        results = []
+        for external_id, lat, lon in inside[offset:offset + limit]:
+            charger = tomtom_charger(external_id)
+            charger["position"] = {"lat": lat, "lon": lon}
+            results.append(charger)
+        body = json.dumps({"summary": {"totalResults": len(inside)}, "results": results}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def poi_server(monkeypatch):
+    PoiHandler.requests = []
+    PoiHandler.throttled = 0
+    PoiHandler.broken_point = None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PoiHandler)
+    server.daemon_threads = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setattr(crawl, "BASE_URL", f"{url}/search/2/poiSearch")
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=20, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # The first token is available at once, the other five take 1/20 s each
+    assert time.monotonic() - start >= 0.24
+
+
+def test_client_retries_throttled_requests(poi_server):
+    PoiHandler.throttled = 2
+    client = TomTomClient(TokenBucket(rate=1000), backoff=0.01)
+    data = client.get_json(crawl.BASE_URL + "/x.json", {"topLeft": "50,20", "btmRight": "49,21", "limit": 10})
+    client.close()
+    assert "results" in data
+    assert client.requests_sent == 3
+
+
+def test_client_gives_up_after_max_retries(poi_server):
+    PoiHandler.throttled = 10
+    client = TomTomClient(TokenBucket(rate=1000), max_retries=2, backoff=0.01)
+    with pytest.raises(requests.HTTPError):
+        client.get_json(crawl.BASE_URL + "/x.json", {"topLeft": "50,20", "btmRight": "49,21", "limit": 10})
+    client.close()
+    assert client.requests_sent == 3
+
+
+def run_crawl(tmp_path, session_factory):
+    return crawl.fetch_and_save_ev_chargers_in_poland(
+        workers=8, rate=1000, checkpoint_path=str(tmp_path / "checkpoint.json"),
+        session_factory=session_factory, density_path=str(tmp_path / "density.json")
+    )
+
+
+def charger_count(session_factory):
+    session = session_factory()
+    try:
+        return session.query(EVCharger).count()
+    finally:
+        session.close()
+
+
+GRID_SIZE = len(crawl.generate_grid_with_corners(49.0, 55.0, 14.0, 24.0, 0.5, 0.5))
+
+
+def test_crawl_saves_all_chargers(poi_server, session_factory, tmp_path):
+    stats = run_crawl(tmp_path, session_factory)
+
+    assert charger_count(session_factory) == len(PoiHandler.points)
+    assert stats["inserted"] == len(PoiHandler.points)
+    assert stats["failed"] == 0
+    assert stats["requests"] == len(PoiHandler.requests)
+    # The dense cell is read in two pages
+    assert stats["requests"] == GRID_SIZE + 1
+    assert not os.path.exists(tmp_path / "checkpoint.json")
+
+
+def test_density_map_plans_splits(poi_server, session_factory, tmp_path, monkeypatch):
+    monkeypatch.setattr(crawl, "MAX_RESULT_WINDOW", 120)
+    first = run_crawl(tmp_path, session_factory)
+    assert first["requests_saved"] == 0
+    assert charger_count(session_factory) == len(PoiHandler.points)
+
+    PoiHandler.requests = []
+    second = run_crawl(tmp_path, session_factory)
+    # The dense cell is split without asking for it first
+    assert second["requests_saved"] == 1
+    assert second["requests"] == first["requests"] - 1
+    assert second["unchanged"] == len(PoiHandler.points)
+    assert (52.5, 21.0, 52.0, 21.5) not in PoiHandler.requests
+
+
+def test_interrupted_crawl_resumes_from_checkpoint(poi_server, session_factory, tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    PoiHandler.broken_point = HOTSPOT
+    stats = run_crawl(tmp_path, session_factory)
+    assert stats["failed"] == 1
+    checkpoint = Checkpoint(checkpoint_path)
+    assert len(checkpoint.done) == GRID_SIZE - 1
+
+    PoiHandler.broken_point = None
+    PoiHandler.requests = []
+    stats = run_crawl(tmp_path, session_factory)
+    assert stats["failed"] == 0
+    # Only the failed cell is requested again
+    assert all(bottom >= 52.0 and top <= 52.5 and left >= 21.0 and right <= 21.5
+               for top, left, bottom, right in PoiHandler.requests)
+    assert charger_count(session_factory) == len(PoiHandler.points)
+    assert not os.path.exists(checkpoint_path)
+
+
+def test_crawl_against_mock_tomtom(session_factory, tmp_path, monkeypatch):
+    with MockTomTom(chargers=3000, error_rate=0.02) as mock:
+        monkeypatch.setattr(crawl, "BASE_URL", f"{mock.start()}/search/2/poiSearch")
+        monkeypatch.setattr(crawl, "MAX_RESULT_WINDOW", 300)
+        stats = run_crawl(tmp_path, session_factory)
+
+    assert mock.requests["errors"] > 0
+    assert stats["failed"] == 0
+    assert stats["inserted"] == 3000
+    assert charger_count(session_factory) == 3000
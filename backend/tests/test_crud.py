@@ -0,0 +1,176 @@
+import copy
+import random
+import time
+import pytest
+from sqlalchemy import and_, create_engine, event, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+from app.models import EVCharger, Connector, ChargerTombstone, DatasetVersion
+from app.crud import update_db, delete_charger, get_changes, update_user_data, query_chargers
+from app.crud import add_user, complete_password_reset, create_password_reset, get_password_reset
+from app.dataset import bump_dataset_version
+from app.capabilities import CONNECTOR_BITS, OTHER_CONNECTOR_BIT
+from app.auth import AuthenticatedUser, user_cache
+from tests.conftest import tomtom_charger
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def test_update_db_inserts_chargers(session):
+    stats = update_db(session, [tomtom_charger("a"), tomtom_charger("b")])
+    assert stats == {"inserted": 2, "updated": 0, "unchanged": 0}
+    assert session.query(EVCharger).count() == 2
+    assert session.query(Connector).count() == 4
+
+
+def test_update_db_skips_unchanged_chargers(session):
+    update_db(session, [tomtom_charger("a"), tomtom_charger("b")])
+    statements = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    stats = update_db(session, [tomtom_charger("a"), tomtom_charger("b")])
+    assert stats == {"inserted": 0, "updated": 0, "unchanged": 2}
+    assert len(statements) == 1
+
+
+def test_update_db_diffs_connectors(session):
+    update_db(session, [tomtom_charger("a")])
+    kept_id = session.query(Connector.id).filter(Connector.connector_type == "IEC62196Type2CCS").scalar()
+
+    changed = tomtom_charger("a", name="Renamed")
+    changed["chargingPark"]["connectors"][1] = {
+        "connectorType": "Chademo", "ratedPowerKW": 50, "voltageV": 500, "currentA": 125, "currentType": "DC"
+    }
+    stats = update_db(session, [changed])
+
+    assert stats == {"inserted": 0, "updated": 1, "unchanged": 0}
+    charger = session.query(EVCharger).one()
+    assert charger.name == "Renamed"
+    assert sorted(c.connector_type for c in charger.connectors) == ["Chademo", "IEC62196Type2CCS"]
+    assert session.query(Connector.id).filter(Connector.connector_type == "IEC62196Type2CCS").scalar() == kept_id
+
+
+def test_update_db_maintains_capability_summary(session):
+    update_db(session, [tomtom_charger("a")])
+    charger = session.query(EVCharger).one()
+    assert (charger.max_power_kw, charger.min_power_kw) == (150, 22)
+    assert charger.connector_mask == CONNECTOR_BITS["IEC62196Type2CCS"] | CONNECTOR_BITS["IEC62196Type2Outlet"]
+    assert charger.has_ac and charger.has_dc
+
+    update_db(session, [tomtom_charger("a", connectors=[
+        {"connectorType": "Chademo", "ratedPowerKW": 50, "voltageV": 500, "currentA": 125, "currentType": "DC"},
+        {"connectorType": "Unknown", "ratedPowerKW": None, "voltageV": None, "currentA": None, "currentType": "DC"},
+    ])])
+    session.expire_all()
+    charger = session.query(EVCharger).one()
+    assert (charger.max_power_kw, charger.min_power_kw) == (50, 50)
+    assert charger.connector_mask == CONNECTOR_BITS["Chademo"] | OTHER_CONNECTOR_BIT
+    assert not charger.has_ac and charger.has_dc
+
+
+def test_query_chargers_matches_connector_semi_join(session):
+    rng = random.Random(3)
+    types = ["IEC62196Type2CCS", "IEC62196Type2Outlet", "Chademo", "Unknown"]
+    update_db(session, [
+        tomtom_charger(f"c{i}", connectors=[
+            {"connectorType": rng.choice(types), "ratedPowerKW": rng.choice([None, 11, 22, 50, 150]),
+             "voltageV": 400, "currentA": 32, "currentType": rng.choice(["AC3", "DC"])}
+            for _ in range(rng.randint(0, 3))
+        ])
+        for i in range(200)
+    ])
+
+    filters = [
+        {"min_power": 50}, {"max_power": 22}, {"min_power": 22, "max_power": 50},
+        {"connector_types": ["Chademo"]}, {"connector_types": ["Chademo", "IEC62196Type2Outlet"]},
+        {"connector_types": ["Unknown"]}, {"min_power": 50, "connector_types": ["IEC62196Type2Outlet"]},
+        {"max_power": 11, "connector_types": ["IEC62196Type2CCS", "Unknown"]},
+    ]
+    for kwargs in filters:
+        conditions = []
+        if "min_power" in kwargs:
+            conditions.append(Connector.rated_power_kw >= kwargs["min_power"])
+        if "max_power" in kwargs:
+            conditions.append(Connector.rated_power_kw <= kwargs["max_power"])
+        if "connector_types" in kwargs:
+            conditions.append(Connector.connector_type.in_(kwargs["connector_types"]))
+        expected = session.query(EVCharger.id).filter(EVCharger.connectors.any(and_(*conditions)))
+        actual = query_chargers(session, **kwargs).with_entities(EVCharger.id)
+        assert sorted(actual) == sorted(expected), kwargs
+
+
+def test_update_db_keeps_charger_ids(session):
+    update_db(session, [tomtom_charger("a")])
+    charger_id = session.query(EVCharger.id).scalar()
+    update_db(session, [tomtom_charger("a", name="Renamed")])
+    assert session.query(EVCharger.id).scalar() == charger_id
+
+
+def test_update_db_deduplicates_batch(session):
+    first = tomtom_charger("a", name="First")
+    second = copy.deepcopy(first)
+    second["poi"]["name"] = "Second"
+    stats = update_db(session, [first, second])
+    assert stats["inserted"] == 1
+    assert session.query(EVCharger.name).scalar() == "Second"
+
+
+def test_get_changes_since_version(session):
+    update_db(session, [tomtom_charger("a"), tomtom_charger("b"), tomtom_charger("c")])
+    version = session.query(EVCharger.change_version).filter(EVCharger.external_id == "a").scalar()
+
+    update_db(session, [tomtom_charger("a"), tomtom_charger("b", name="Renamed"), tomtom_charger("c")])
+    deleted_id = session.query(EVCharger.id).filter(EVCharger.external_id == "c").scalar()
+    delete_charger(session, "c")
+
+    chargers, deleted = get_changes(session, version)
+    assert [charger.external_id for charger in chargers] == ["b"]
+    assert deleted == [deleted_id]
+
+    latest = session.query(func.max(ChargerTombstone.deleted_version)).scalar()
+    assert get_changes(session, latest) == ([], [])
+
+
+def test_get_changes_full_snapshot(session):
+    update_db(session, [tomtom_charger("a"), tomtom_charger("b")])
+    delete_charger(session, "a")
+    chargers, deleted = get_changes(session, 0)
+    assert [charger.external_id for charger in chargers] == ["b"]
+    assert deleted == []
+
+
+def test_bump_dataset_version_creates_the_row(session):
+    assert [bump_dataset_version(session), bump_dataset_version(session)] == [1, 2]
+    assert session.query(DatasetVersion.version).scalar() == 2
+
+
+def test_update_user_data_invalidates_user_cache(session):
+    user = add_user(session, "cached", "cached@example.com", "not-a-real-hash")
+    user_cache.put("cached-token", AuthenticatedUser(user.id, user.username, user.email), time.time() + 3600)
+    update_user_data(session, user.id, username="renamed")
+    assert user_cache.get("cached-token") is None
+
+
+def test_password_reset_codes(session):
+    user = add_user(session, "resetting", "resetting@example.com", "hashed")
+    create_password_reset(session, user.id, "AAAA2222")
+    create_password_reset(session, user.id, "BBBB3333", expire_minutes=-1)
+    create_password_reset(session, user.id, "CCCC4444")
+    session.commit()
+    # A new code replaces the earlier ones, an expired one never matches
+    assert get_password_reset(session, "resetting@example.com", "AAAA2222") is None
+    assert get_password_reset(session, "resetting@example.com", "BBBB3333") is None
+    assert get_password_reset(session, "other@example.com", "CCCC4444") is None
+    reset = get_password_reset(session, "resetting@example.com", " cccc4444")
+    assert complete_password_reset(session, reset.id, user.id, "new-hash")
+    assert not complete_password_reset(session, reset.id, user.id, "other-hash")
+    session.refresh(user)
+    assert user.hashed_password == "new-hash"
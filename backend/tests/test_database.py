@@ -0,0 +1,74 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import exc, text
+from app.auth import create_access_token
+from app.database import create_db_engine
+from app.db_metrics import DatabaseMetrics
+from app.main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'pool.db'}"
+
+
+def test_pool_settings_are_applied(database_url):
+    engine = create_db_engine(database_url, pool_size=3, max_overflow=2, pool_timeout=5, pool_recycle=600)
+    assert engine.pool.size() == 3
+    assert engine.pool._max_overflow == 2
+    assert engine.pool._timeout == 5
+    assert engine.pool._recycle == 600
+    assert engine.pool._pre_ping
+    engine.dispose()
+
+
+def test_checkouts_are_measured(database_url):
+    metrics = DatabaseMetrics()
+    engine = create_db_engine(database_url, pool_size=1, max_overflow=0, pool_timeout=0.1, metrics=metrics)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert metrics.snapshot(engine.pool)["pool"]["in_use"] == 1
+        # The only connection is taken, the next checkout times out
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+
+    snapshot = metrics.snapshot(engine.pool)
+    assert snapshot["checkouts"] == 1
+    assert snapshot["checkout_timeouts"] == 1
+    assert snapshot["mean_checkout_ms"] >= 0
+    assert snapshot["pool"]["in_use"] == 0
+    engine.dispose()
+
+
+def test_sqlite_statement_timeout(database_url):
+    engine = create_db_engine(database_url, statement_timeout=0.05)
+    slow = text("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT count(*) FROM n")
+    with engine.connect() as conn:
+        with pytest.raises(exc.OperationalError, match="interrupted"):
+            conn.execute(slow)
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+    engine.dispose()
+
+
+def test_queries_are_counted_per_route():
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'testuser'})}"}
+    # Loads the user into the cache, the metrics requests then run no query
+    client.get("/api/favorites/", headers=headers)
+    client.get("/api/chargers/1")
+    client.get("/api/chargers/1")
+    client.get("/api/metrics", headers=headers)
+    # A request is recorded when it completes, so this one sees the previous ones
+    response = client.get("/api/metrics", headers=headers)
+    assert response.status_code == 200
+    database = response.json()["database"]
+    route = database["routes"]["/api/chargers/{charger_id}"]
+    assert route["requests"] >= 2
+    assert route["max_queries"] >= 1
+    assert database["routes"]["/api/metrics"]["max_queries"] == 0
+    assert database["pool"]["in_use"] == 0
+
+
+def test_metrics_require_authentication():
+    assert client.get("/api/metrics").status_code == 401
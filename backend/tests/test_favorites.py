@@ -45,3 +45,25 @@ def test_adding_non_existing_charger(access_token):
     
     assert response.status_code == 404
     assert response.json() == {"detail": "Charger not found"}
+
+def test_get_favorites_statement_count(access_token, statement_counter):
+    response = client.get(
+        "/api/favorites/",
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+
+    assert response.status_code == 200
+    # The user of a token issued by /api/login is already cached
+    assert statement_counter.count == 1
+
+def test_add_to_favorites_statement_count(access_token, statement_counter):
+    response = client.post(
+        "/api/favorites/",
+        json={"charger_id": 124},
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+
+    assert response.status_code == 200
+    # Existence and duplicate checks are part of the INSERT itself
+    assert statement_counter.count == 1
+    client.delete("/api/favorites/124", headers={"Authorization": f"Bearer {access_token}"})
@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from app.auth import create_access_token
+from app.main import app
+from app.hashing import PasswordHasher, PasswordHashingOverloaded
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(workers=1, max_pending=2)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hash_and_verify(hasher):
+    async def run():
+        hashed = await hasher.hash("password123")
+        return hashed, await hasher.verify("password123", hashed), await hasher.verify("wrong", hashed)
+
+    hashed, valid, invalid = asyncio.run(run())
+    assert hashed.startswith("$2b$")
+    assert valid and not invalid
+    assert hasher.verify_sync("password123", hashed)
+    assert hasher.metrics()["completed"] == 4
+
+
+def test_overload_is_rejected(hasher):
+    hasher.hash_sync("warm-up")
+
+    async def run():
+        tasks = [asyncio.ensure_future(hasher.hash(f"password{i}")) for i in range(2)]
+        # Let both tasks submit their hash
+        await asyncio.sleep(0)
+        with pytest.raises(PasswordHashingOverloaded):
+            await hasher.hash("one too many")
+        assert hasher.metrics()["queued"] == 1
+        return await asyncio.gather(*tasks)
+
+    assert len(asyncio.run(run())) == 2
+    metrics = hasher.metrics()
+    assert metrics["rejected"] == 1
+    assert metrics["pending"] == 0
+    assert metrics["peak_pending"] == 2
+
+
+def test_metrics_endpoint():
+    token = create_access_token({"sub": "testuser"})
+    response = client.get("/api/metrics", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert {"pending", "queued", "rejected"} <= set(response.json()["password_hashing"])
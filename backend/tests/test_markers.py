@@ -0,0 +1,45 @@
+import pytest
+from app.markers import MarkerFeed, decode_marker_feed, decode_varints, encode_varints
+
+ROWS = [
+    (7, "Orlen Charge", 52.229676, 21.012229),
+    (3, "GreenWay", 50.064650, 19.944980),
+    (1000, None, 54.352025, 18.646638),
+    (200000, "Orlen Charge", 51.107883, 17.038538),
+    (4, "Zażółć", 49.0, 14.0),
+]
+
+
+def test_varints_round_trip():
+    values = [0, 1, 127, 128, 300, 16383, 16384, 2 ** 31, 2 ** 40]
+    decoded, offset = decode_varints(encode_varints(values), len(values), 0)
+    assert decoded.tolist() == values
+    assert offset == len(encode_varints(values))
+
+
+def test_marker_feed_round_trip():
+    markers = decode_marker_feed(MarkerFeed(ROWS).body)
+    assert [marker["id"] for marker in markers] == [3, 4, 7, 1000, 200000]
+    by_id = {marker["id"]: marker for marker in markers}
+    for charger_id, name, lat, lon in ROWS:
+        assert by_id[charger_id]["name"] == (name or "")
+        assert by_id[charger_id]["latitude"] == pytest.approx(lat, abs=1e-6)
+        assert by_id[charger_id]["longitude"] == pytest.approx(lon, abs=1e-6)
+
+
+def test_marker_feed_subset():
+    feed = MarkerFeed(ROWS)
+    markers = decode_marker_feed(feed.encode([200000, 7, 12345]))
+    assert [(marker["id"], marker["name"]) for marker in markers] == [(7, "Orlen Charge"), (200000, "Orlen Charge")]
+
+
+def test_marker_feed_empty():
+    assert decode_marker_feed(MarkerFeed([]).body) == []
+    assert decode_marker_feed(MarkerFeed(ROWS).encode([])) == []
+
+
+def test_marker_feed_is_smaller_than_json():
+    rows = [(i, f"Brand {i % 10}", 49 + i / 10000, 14 + i / 10000) for i in range(1, 5001)]
+    body = MarkerFeed(rows).body
+    # Header, two int32 columns, one byte ID deltas, one byte name indexes and the string table
+    assert len(body) < 16 + 5000 * 10 + 100
@@ -0,0 +1,184 @@
+import re
+import time
+from datetime import datetime
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base, SessionLocal
+from app.main import app
+from app.mailer import OutboxSender, SMTPPool, queue_email
+from app.models import EmailOutbox, PasswordReset, User
+from scripts.mock_smtp import MockSMTP
+
+SENDER = "wattway@test.com"
+PASSWORD = "smtp-secret"
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def smtp_server():
+    with MockSMTP(SENDER, PASSWORD) as server:
+        server.address = server.start()
+        yield server
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def make_sender(smtp_server, session_factory, **kwargs) -> OutboxSender:
+    host, port = smtp_server.address
+    pool = SMTPPool(host, port, SENDER, PASSWORD, security="none")
+    return OutboxSender(session_factory, pool, SENDER, **kwargs)
+
+
+def queue(session_factory, count: int = 1):
+    with session_factory() as session:
+        for i in range(count):
+            queue_email(session, f"user{i}@test.com", "Hello", f"Message {i}")
+        session.commit()
+
+
+def outbox(session_factory) -> list[EmailOutbox]:
+    with session_factory() as session:
+        return session.query(EmailOutbox).order_by(EmailOutbox.id).all()
+
+
+def test_sender_reuses_one_connection(smtp_server, session_factory):
+    queue(session_factory, 3)
+    sender = make_sender(smtp_server, session_factory)
+    assert sender.run_once() == 3
+    queue(session_factory, 2)
+    assert sender.run_once() == 2
+    sender.stop()
+
+    assert smtp_server.connections == 1
+    assert smtp_server.logins == 1
+    assert [m["recipients"] for m in smtp_server.messages[:3]] == [["user0@test.com"], ["user1@test.com"], ["user2@test.com"]]
+    assert smtp_server.messages[0]["message"]["Subject"] == "Hello"
+    assert smtp_server.messages[0]["message"].get_content().strip() == "Message 0"
+    emails = outbox(session_factory)
+    assert all(email.status == "sent" and email.sent_at and email.body is None for email in emails)
+
+
+def test_sender_retries_refused_messages(smtp_server, session_factory):
+    queue(session_factory)
+    smtp_server.fail_next = 1
+    sender = make_sender(smtp_server, session_factory, backoff=0)
+    sender.run_once()
+    email = outbox(session_factory)[0]
+    assert email.status == "pending"
+    assert email.attempts == 1
+    assert "Try again later" in email.last_error
+
+    sender.run_once()
+    sender.stop()
+    assert outbox(session_factory)[0].status == "sent"
+    assert len(smtp_server.messages) == 1
+    assert smtp_server.connections == 1
+
+
+def test_sender_backs_off_between_attempts(smtp_server, session_factory):
+    queue(session_factory)
+    smtp_server.fail_next = 1
+    sender = make_sender(smtp_server, session_factory, backoff=30)
+    sender.run_once()
+    assert sender.run_once() == 0
+    sender.stop()
+    assert outbox(session_factory)[0].next_attempt_at > datetime.utcnow()
+
+
+def test_sender_gives_up_after_max_attempts(smtp_server, session_factory):
+    queue(session_factory)
+    smtp_server.fail_next = 5
+    sender = make_sender(smtp_server, session_factory, backoff=0, max_attempts=2)
+    sender.run_once()
+    sender.run_once()
+    assert sender.run_once() == 0
+    sender.stop()
+    email = outbox(session_factory)[0]
+    assert email.status == "failed"
+    assert email.attempts == 2
+    assert email.body is None
+
+
+def test_sender_reconnects_after_disconnect(smtp_server, session_factory):
+    sender = make_sender(smtp_server, session_factory)
+    queue(session_factory)
+    sender.run_once()
+    smtp_server.disconnect_all()
+    queue(session_factory)
+    sender.run_once()
+    sender.stop()
+
+    assert [email.status for email in outbox(session_factory)] == ["sent", "sent"]
+    assert smtp_server.connections == 2
+    assert smtp_server.logins == 2
+
+
+def test_sender_keeps_messages_when_server_is_down(session_factory):
+    queue(session_factory)
+    pool = SMTPPool("127.0.0.1", 9, SENDER, PASSWORD, security="none", timeout=1)
+    sender = OutboxSender(session_factory, pool, SENDER, backoff=0)
+    sender.run_once()
+    email = outbox(session_factory)[0]
+    assert email.status == "pending"
+    assert email.attempts == 1
+
+
+def test_worker_sends_in_background(smtp_server, session_factory):
+    sender = make_sender(smtp_server, session_factory, poll_interval=10)
+    sender.start()
+    queue(session_factory)
+    sender.notify()
+    for _ in range(100):
+        if smtp_server.messages:
+            break
+        time.sleep(0.05)
+    sender.stop()
+    assert len(smtp_server.messages) == 1
+    assert not sender.metrics()["running"]
+
+
+def test_reset_password_queues_email():
+    client.post("/api/register", json={
+        "username": "outboxuser",
+        "email": "outboxuser@example.com",
+        "password": "password123"
+    })
+    response = client.post("/api/reset-password", json={"email": "outboxuser@example.com"})
+    assert response.status_code == 200
+    assert response.json() == {"message": "Password reset code sent."}
+
+    with SessionLocal() as session:
+        emails = session.query(EmailOutbox).filter(EmailOutbox.recipient == "outboxuser@example.com").all()
+        assert len(emails) == 1
+        assert emails[0].status == "pending"
+        # The outbox holds a single-use code, never a password
+        code = re.search(r"Your reset code is: (\w+)\.", emails[0].body).group(1)
+        resets = session.query(PasswordReset).join(User).filter(User.username == "outboxuser").all()
+        assert len(resets) == 1
+        assert code not in resets[0].code_hash
+
+    confirm = {"email": "outboxuser@example.com", "code": code.lower(), "password": "new-password1"}
+    assert client.post("/api/login", json={"username": "outboxuser", "password": "new-password1"}).status_code == 401
+    response = client.post("/api/reset-password/confirm", json=confirm)
+    assert response.status_code == 200
+    assert client.post("/api/login", json={"username": "outboxuser", "password": "new-password1"}).status_code == 200
+    # Used up
+    response = client.post("/api/reset-password/confirm", json={**confirm, "password": "other-password1"})
+    assert response.status_code == 400
+
+    with SessionLocal() as session:
+        session.query(EmailOutbox).filter(EmailOutbox.recipient == "outboxuser@example.com").delete()
+        user_id = session.query(User.id).filter(User.username == "outboxuser").scalar()
+        session.query(PasswordReset).filter(PasswordReset.user_id == user_id).delete()
+        session.query(User).filter(User.id == user_id).delete()
+        session.commit()
@@ -0,0 +1,228 @@
+import os
+import re
+import pytest
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app import crud
+from app.auth import AuthenticatedUser
+from app.capabilities import CONNECTOR_BITS
+from app.database import Base
+from app.migrations import migrate
+from app.models import Favorite, User
+from app.routers.chargers import list_chargers, search_chargers
+from app.routers.favorites import add_to_favorites, remove_from_favorites
+from app.schemas.favorites import FavoriteRequest
+from app.search import get_search_backend
+from app.spatial_backend import get_spatial_backend
+from tests.conftest import tomtom_charger
+
+# "SCAN ev_chargers", "SCAN TABLE ev_chargers" (older SQLite) or "SCAN c USING COVERING INDEX ..."
+FULL_SCAN = re.compile(r"SCAN (?:TABLE )?(\w+)")
+# Subqueries evaluated on the fly, scanning their (already filtered) rows is not a table scan
+SUBQUERY = re.compile(r"(?:CO-ROUTINE|MATERIALIZE) (\w+)")
+# R*Tree lookup by rowid (1) or search with box constraints (2:<constraints>), FTS5 MATCH (M)
+INDEXED_VIRTUAL_TABLE = re.compile(r"VIRTUAL TABLE INDEX (?:1:|2:\w+|\d+:\S*M)")
+# Database the PostgreSQL migrations are checked against, in a throwaway schema
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+def charger(i: int, connectors=None) -> dict:
+    data = tomtom_charger(f"ext-{i}", f"Charger {i}", connectors)
+    data["position"] = {"lat": 52.0 + i / 100, "lon": 21.0 + i / 100}
+    return data
+
+
+@pytest.fixture
+def session(migrated_engine):
+    session = sessionmaker(bind=migrated_engine)()
+    crud.update_db(session, [charger(i) for i in range(20)])
+    session.add(User(id=1, username="planner", email="planner@example.com", hashed_password="x"))
+    session.add(Favorite(user_id=1, charger_id=1))
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def captured(migrated_engine):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith("EXPLAIN"):
+            statements.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(migrated_engine, "before_cursor_execute", capture)
+    yield statements
+    event.remove(migrated_engine, "before_cursor_execute", capture)
+
+
+def full_scans(engine, statements) -> dict:
+    """
+    Runs EXPLAIN QUERY PLAN on every statement.
+
+    :return: Dictionary mapping each statement with a full scan to the scanned tables.
+    """
+    scans = {}
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+            subqueries = {match.group(1) for step in plan if (match := SUBQUERY.match(step))}
+            tables = {
+                match.group(1) for step in plan
+                if (match := FULL_SCAN.match(step)) and "CONSTANT ROW" not in step and not INDEXED_VIRTUAL_TABLE.search(step)
+            } - subqueries
+            if tables:
+                scans[statement] = tables
+    return scans
+
+
+def test_migrations_match_models(migrated_engine):
+    expected = create_engine("sqlite://")
+    Base.metadata.create_all(expected)
+    for table in Base.metadata.tables:
+        migrated = inspect(migrated_engine)
+        created = inspect(expected)
+        assert {c["name"] for c in migrated.get_columns(table)} == {c["name"] for c in created.get_columns(table)}
+        assert {i["name"] for i in migrated.get_indexes(table)} >= {i["name"] for i in created.get_indexes(table)}
+
+
+def test_migrations_are_recorded(migrated_engine):
+    assert migrate(migrated_engine) == []
+
+
+def test_capability_summary_is_backfilled():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    migrate(engine, target=4)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO ev_chargers (id, external_id, latitude, longitude) VALUES (1, 'a', 52, 21), (2, 'b', 52, 21)")
+        conn.exec_driver_sql(
+            "INSERT INTO connectors (charger_id, connector_type, rated_power_kw, current_type) "
+            "VALUES (1, 'Chademo', 50, 'DC'), (1, 'IEC62196Type2Outlet', 22, 'AC3')"
+        )
+    assert migrate(engine) == [5, 6, 7, 8, 9]
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT max_power_kw, min_power_kw, connector_mask, has_ac, has_dc FROM ev_chargers ORDER BY id"
+        ).all()
+    assert rows == [(50, 22, CONNECTOR_BITS["Chademo"] | CONNECTOR_BITS["IEC62196Type2Outlet"], 1, 1), (None, None, 0, 0, 0)]
+    engine.dispose()
+
+
+def test_connectors_cascade_with_their_charger():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    migrate(engine, target=7)
+    assert [fk["options"].get("ondelete") for fk in inspect(engine).get_foreign_keys("connectors")] == [None]
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO ev_chargers (id, external_id, latitude, longitude) VALUES (1, 'a', 52, 21), (2, 'b', 52, 21)")
+        conn.exec_driver_sql(
+            "INSERT INTO connectors (charger_id, connector_type, rated_power_kw) VALUES (1, 'Chademo', 50), (2, 'Chademo', 50)"
+        )
+    assert migrate(engine, target=8) == [8]
+
+    inspector = inspect(engine)
+    assert [fk["options"].get("ondelete") for fk in inspector.get_foreign_keys("connectors")] == ["CASCADE"]
+    assert "ix_connectors_power" in {index["name"] for index in inspector.get_indexes("connectors")}
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA foreign_keys = ON")
+        conn.exec_driver_sql("DELETE FROM ev_chargers WHERE id = 1")
+        assert conn.exec_driver_sql("SELECT charger_id FROM connectors").scalars().all() == [2]
+        conn.commit()
+    engine.dispose()
+
+
+@pytest.mark.skipif(TEST_POSTGRES_URL is None, reason="TEST_POSTGRES_URL is not set")
+def test_postgresql_migrations():
+    schema = "migrations_test"
+    admin = create_engine(TEST_POSTGRES_URL)
+    with admin.begin() as conn:
+        conn.exec_driver_sql(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        conn.exec_driver_sql(f"CREATE SCHEMA {schema}")
+    # PostGIS functions stay reachable through `public`
+    engine = create_engine(TEST_POSTGRES_URL, connect_args={"options": f"-csearch_path={schema},public"})
+    try:
+        assert migrate(engine) == list(range(1, 10))
+        with engine.connect() as conn:
+            indexes = dict(conn.exec_driver_sql(
+                "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema() "
+                "AND tablename = 'ev_chargers'"
+            ).all())
+        assert "USING gin (search_vector)" in indexes["ix_ev_chargers_search"]
+        # v0006 is skipped on servers without PostGIS
+        if "geog" in {column["name"] for column in inspect(engine).get_columns("ev_chargers")}:
+            assert "USING gist (geog)" in indexes["ix_ev_chargers_geog"]
+            assert "USING gist" in indexes["ix_ev_chargers_geom"]
+
+        assert [fk["options"].get("ondelete") for fk in inspect(engine).get_foreign_keys("connectors")] == ["CASCADE"]
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                "INSERT INTO ev_chargers (id, external_id, latitude, longitude) VALUES (1, 'a', 52, 21), (2, 'b', 52, 21)"
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO connectors (charger_id, connector_type, rated_power_kw) "
+                "VALUES (1, 'Chademo', 50), (2, 'Chademo', 50)"
+            )
+            conn.exec_driver_sql("DELETE FROM ev_chargers WHERE id = 1")
+            assert conn.exec_driver_sql("SELECT charger_id FROM connectors").scalars().all() == [2]
+    finally:
+        engine.dispose()
+        with admin.begin() as conn:
+            conn.exec_driver_sql(f"DROP SCHEMA {schema} CASCADE")
+        admin.dispose()
+
+
+def test_crud_reads_use_indexes(migrated_engine, session, captured):
+    # The spatial backend is detected once per engine
+    get_spatial_backend(session)
+    captured.clear()
+    crud.get_chargers_in_bounds(session, (52.1, 21.1), (52.0, 21.0))
+    crud.get_charger_by_id(session, 3)
+    crud.get_charger_with_connectors(session, 3)
+    crud.get_charger_by_external_id(session, "ext-3")
+    crud.get_charging_availability_ids(session, [1, 2, 3])
+    crud.get_favorite_chargers(session, 1)
+    crud.get_changes(session, 1)
+    crud.get_user_by_username(session, "planner")
+    crud.get_user_by_email(session, "planner@example.com")
+    crud.query_chargers(session, min_power=50, connector_types=["IEC62196Type2CCS"]).filter(
+        crud.EVCharger.latitude.between(52.0, 52.1), crud.EVCharger.longitude.between(21.0, 21.1)
+    ).all()
+
+    assert len(captured) == 11
+    assert full_scans(migrated_engine, captured) == {}
+
+
+def test_crud_writes_use_indexes(migrated_engine, session, captured):
+    connectors = [{"connectorType": "Chademo", "ratedPowerKW": 50, "voltageV": 400, "currentA": 125, "currentType": "DC"}]
+    crud.update_db(session, [charger(i, connectors) for i in range(5)])
+    crud.delete_charger(session, "ext-4")
+    assert full_scans(migrated_engine, captured) == {}
+
+
+def test_favorites_routes_use_indexes(migrated_engine, session, captured):
+    user = AuthenticatedUser(1, "planner", "planner@example.com")
+    add_to_favorites(FavoriteRequest(charger_id=2), session, user)
+    remove_from_favorites(2, session, user)
+    assert full_scans(migrated_engine, captured) == {}
+
+
+def test_search_uses_text_index(migrated_engine, session, captured):
+    # The text backend is detected once per engine
+    get_search_backend(session)
+    captured.clear()
+    search_chargers(session, ["charg", "1"], None, None, 50, None, None, 10)
+    search_chargers(session, ["charg"], 52.0, 21.0, None, None, None, 10)
+    # The second search reads the matches, then the page
+    assert len(captured) == 3
+    assert full_scans(migrated_engine, captured) == {}
+
+
+def test_filtered_listing_only_walks_primary_key(migrated_engine, session, captured):
+    list_chargers(session, None, None, 50, None, ["IEC62196Type2CCS"], 10, None, None, None)
+    # A keyset page reads chargers in ID order and stops after `limit` matches,
+    # the connector filter of every charger is an index lookup
+    assert all(tables == {"ev_chargers"} for tables in full_scans(migrated_engine, captured).values())
+    with migrated_engine.connect() as conn:
+        statement, parameters = captured[-1]
+        plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+    assert any("connectors USING COVERING INDEX ix_connectors_charger_type_power" in step for step in plan)
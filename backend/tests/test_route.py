@@ -0,0 +1,165 @@
+import random
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+from app import corridor, crud, spatial
+from app.corridor import chargers_along_route, decode_polyline, encode_polyline, project
+from app.geo import haversine_km
+from app.main import app
+from app.routers.chargers import route_chargers
+from app.spatial import ChargerIndex
+from tests.conftest import AC, DC, charger
+
+client = TestClient(app)
+
+random.seed(11)
+POINTS = [(i, random.uniform(50.0, 53.0), random.uniform(16.0, 22.0)) for i in range(1, 5001)]
+index = ChargerIndex(POINTS)
+
+# Poznań - Warszawa - Kraków, with a detour that crosses itself near Łódź
+ROUTE = [(52.41, 16.93), (52.0, 18.2), (51.75, 19.5), (52.23, 21.01), (51.3, 19.9), (51.9, 19.2), (50.06, 19.94)]
+
+
+def densify(points, step_km):
+    lats, lons = [], []
+    for (lat1, lon1), (lat2, lon2) in zip(points, points[1:]):
+        steps = max(1, int(haversine_km(lat1, lon1, np.array([lat2]), np.array([lon2]))[0] / step_km))
+        fractions = np.arange(steps) / steps
+        # Bends, so the route is not a few straight lines
+        bend = 0.01 * np.sin(fractions * 40)
+        lats.extend(lat1 + (lat2 - lat1) * fractions + bend)
+        lons.extend(lon1 + (lon2 - lon1) * fractions)
+    return np.array([*lats, points[-1][0]]), np.array([*lons, points[-1][1]])
+
+
+def brute_force(lats, lons, corridor_km, points=POINTS):
+    """
+    Measures every charger against every segment of the route.
+    """
+    lengths = haversine_km(lats[:-1], lons[:-1], lats[1:], lons[1:])
+    offsets = np.concatenate(([0.0], np.cumsum(lengths)[:-1]))
+    found = []
+    for charger_id, lat, lon in points:
+        distances, fractions = project(
+            np.full(len(lengths), lat), np.full(len(lengths), lon), lats[:-1], lons[:-1], np.diff(lats), np.diff(lons)
+        )
+        closest = distances.min()
+        if closest <= corridor_km:
+            route_km = (offsets + fractions * lengths)[distances == closest].min()
+            found.append((charger_id, float(route_km), float(closest)))
+    found.sort(key=lambda item: (item[1], item[0]))
+    return found
+
+
+def assert_same_result(found, expected):
+    assert [charger_id for charger_id, _, _ in found] == [charger_id for charger_id, _, _ in expected]
+    assert [route_km for _, route_km, _ in found] == pytest.approx([route_km for _, route_km, _ in expected])
+    assert [distance for _, _, distance in found] == pytest.approx([distance for _, _, distance in expected])
+
+
+def test_decode_polyline():
+    # Example of the format documentation
+    lats, lons = decode_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@")
+    assert lats.tolist() == pytest.approx([38.5, 40.7, 43.252])
+    assert lons.tolist() == pytest.approx([-120.2, -120.95, -126.453])
+
+    points = [(52.229676, 21.012229), (50.064651, 19.944981), (-33.8688, 151.2093)]
+    for precision in (5, 6):
+        lats, lons = decode_polyline(encode_polyline(points, precision), precision)
+        assert lats.tolist() == pytest.approx([lat for lat, _ in points], abs=10 ** -precision)
+        assert lons.tolist() == pytest.approx([lon for _, lon in points], abs=10 ** -precision)
+
+
+@pytest.mark.parametrize("encoded", ["_p~iF~ps|U_ulL", "_p~iF~ps|", "_p~iF ~ps|U", "ąę", "~~~~~~~~~~?"])
+def test_decode_rejects_malformed_polylines(encoded):
+    with pytest.raises(ValueError):
+        decode_polyline(encoded)
+
+
+@pytest.mark.parametrize("corridor_km", [0.5, 3.0, 15.0])
+def test_corridor_matches_brute_force(monkeypatch, corridor_km):
+    lats, lons = densify(ROUTE, 0.5)
+    # Small batches, so the chargers are measured in several of them
+    monkeypatch.setattr(corridor, "PAIR_BATCH", 1000)
+    assert_same_result(chargers_along_route(index, lats, lons, corridor_km), brute_force(lats, lons, corridor_km))
+
+
+def test_distances_are_great_circle_distances():
+    lats, lons = densify(ROUTE, 2.0)
+    samples = np.linspace(0, 1, 2001)
+    dense_lats = np.concatenate([lat1 + (lat2 - lat1) * samples for lat1, lat2 in zip(lats, lats[1:])])
+    dense_lons = np.concatenate([lon1 + (lon2 - lon1) * samples for lon1, lon2 in zip(lons, lons[1:])])
+    for charger_id, _, distance in chargers_along_route(index, lats, lons, 30.0)[::50]:
+        _, lat, lon = POINTS[charger_id - 1]
+        assert distance == pytest.approx(haversine_km(lat, lon, dense_lats, dense_lons).min(), abs=0.005)
+
+
+def test_charger_is_placed_at_its_closest_pass():
+    # Out along one parallel and back along another, the charger is closer to the way back
+    lats = np.array([52.0, 52.0, 52.02, 52.02])
+    lons = np.array([20.0, 20.5, 20.5, 20.0])
+    found = chargers_along_route(ChargerIndex([(1, 52.015, 20.1), (2, 52.005, 20.4)]), lats, lons, 2.0)
+    assert [charger_id for charger_id, _, _ in found] == [2, 1]
+    assert found[1][1] > haversine_km(52.0, 20.0, np.array([52.0]), np.array([20.5]))[0]
+
+
+def test_pages_and_filters():
+    lats, lons = densify(ROUTE, 0.5)
+    allowed = {i for i, _, _ in POINTS if i % 3 == 0}
+    expected = brute_force(lats, lons, 5.0, [point for point in POINTS if point[0] in allowed])
+    first = chargers_along_route(index, lats, lons, 5.0, allowed=allowed, k=10)
+    assert_same_result(first, expected[:10])
+    after = (first[-1][1], first[-1][0])
+    assert_same_result(chargers_along_route(index, lats, lons, 5.0, allowed=allowed, k=10, after=after), expected[10:20])
+
+
+def test_single_point_route():
+    found = chargers_along_route(index, np.array([51.5]), np.array([19.0]), 10.0)
+    assert found == sorted(found, key=lambda item: (item[1], item[0]))
+    assert {charger_id for charger_id, _, _ in found} == {
+        i for i, lat, lon in POINTS if haversine_km(51.5, 19.0, np.array([lat]), np.array([lon]))[0] <= 10.0
+    }
+
+
+@pytest.fixture
+def session(monkeypatch, migrated_engine):
+    # The shared charger index may have been built from another database
+    monkeypatch.setattr(spatial, "_index", None)
+    session = sessionmaker(bind=migrated_engine)()
+    crud.update_db(session, [
+        charger("a", "Orlen Konin", "Orlen", "Poznańska", "Konin", "62-500", 52.22, 18.25, DC),
+        charger("b", "GreenWay Stryków", "GreenWay", "Łódzka", "Stryków", "95-010", 51.90, 19.60, AC),
+        charger("c", "Ionity Łowicz", "Ionity", "Warszawska", "Łowicz", "99-400", 52.0, 20.0, DC),
+        charger("d", "Lidl Gdańsk", "Lidl", "Grunwaldzka", "Gdańsk", "80-001", 54.37, 18.62, DC),
+    ])
+    yield session
+    session.close()
+
+
+def test_route_chargers_pages_with_cursor(session):
+    lats, lons = decode_polyline(encode_polyline([(52.41, 16.93), (52.22, 18.3), (51.9, 19.6), (52.23, 21.01)]))
+    rows, headers = route_chargers(session, lats, lons, 10.0, None, None, None, 2, None)
+    assert [row.name for row in rows] == ["Orlen Konin", "GreenWay Stryków"]
+    assert rows[0].route_km < rows[1].route_km
+    rows, headers = route_chargers(session, lats, lons, 10.0, None, None, None, 2, headers["X-Next-Cursor"])
+    assert [row.name for row in rows] == ["Ionity Łowicz"]
+    assert "X-Next-Cursor" not in headers
+
+    rows, _ = route_chargers(session, lats, lons, 10.0, 50, None, None, 10, None)
+    assert [row.name for row in rows] == ["Orlen Konin", "Ionity Łowicz"]
+
+
+def test_route_endpoint_rejects_invalid_polyline():
+    response = client.post("/api/chargers/route", json={"polyline": "_p~iF~ps|", "corridor_km": 5})
+    assert response.status_code == 400
+    response = client.post("/api/chargers/route", json={"polyline": "_p~iF~ps|U", "corridor_km": 500})
+    assert response.status_code == 422
+
+
+def test_route_endpoint():
+    response = client.post("/api/chargers/route", json={"polyline": encode_polyline(ROUTE), "corridor_km": 5, "limit": 3})
+    assert response.status_code == 200
+    rows = response.json()
+    assert len(rows) <= 3
+    assert [row["route_km"] for row in rows] == sorted(row["route_km"] for row in rows)
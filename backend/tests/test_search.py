@@ -0,0 +1,148 @@
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session, sessionmaker
+from app import crud
+from app.main import app
+from app.models import EVCharger
+from app.routers.chargers import get_chargers_search, search_chargers
+from app import search as app_search
+from app.geo import calculate_distance
+from app.search import (
+    SEARCH_COLUMNS, FTS5SearchBackend, TSVectorSearchBackend, TextSearchBackend, detect_search_backend, nearest_matches,
+    search_terms
+)
+from tests.conftest import AC, DC, charger
+
+client = TestClient(app)
+
+CHARGERS = [
+    charger("a", "Orlen Marszałkowska", "Orlen", "Marszałkowska", "Warszawa", "00-624", 52.22, 21.01, DC),
+    charger("b", "Galeria Mokotów", "GreenWay", "Wołoska", "Warszawa", "02-675", 52.18, 21.00, AC),
+    charger("c", "Orlen Kraków Opolska", "Orlen", "Opolska", "Kraków", "31-323", 50.09, 19.93, DC),
+    charger("d", "Łódź Manufaktura", "Ionity", "Drewnowska", "Łódź", "91-002", 51.78, 19.45, DC),
+]
+
+
+@pytest.fixture
+def session(migrated_engine):
+    session = sessionmaker(bind=migrated_engine)()
+    crud.update_db(session, CHARGERS)
+    yield session
+    session.close()
+
+
+def names(rows):
+    return [row.name for row in rows]
+
+
+def search(session, text, lat=None, lon=None, min_power=None, connector_types=None, limit=10):
+    return search_chargers(session, search_terms(text), lat, lon, min_power, None, connector_types, limit)
+
+
+def test_search_terms():
+    assert search_terms("Orlen, ul. Opolska 12") == ["orlen", "ul", "opolska", "12"]
+    assert search_terms('a "b" c_d*') == []
+
+
+def test_fts5_is_detected(session):
+    assert isinstance(detect_search_backend(session.get_bind()), FTS5SearchBackend)
+
+
+def test_prefix_autocomplete(session):
+    assert names(search(session, "orl")) == ["Orlen Marszałkowska", "Orlen Kraków Opolska"]
+    assert names(search(session, "orlen krak")) == ["Orlen Kraków Opolska"]
+    assert names(search(session, "02-6")) == ["Galeria Mokotów"]
+    # Diacritics are optional
+    assert names(search(session, "mokotow")) == ["Galeria Mokotów"]
+    assert names(search(session, "łódź manuf")) == ["Łódź Manufaktura"]
+    assert search(session, "orlen gdańsk") == []
+
+
+def test_proximity_ranking(session):
+    rows = search(session, "orlen", lat=50.06, lon=19.94)
+    assert names(rows) == ["Orlen Kraków Opolska", "Orlen Marszałkowska"]
+    assert rows[0].distance_km == pytest.approx(3.4, abs=0.1)
+
+
+@pytest.mark.parametrize("walk_cost", [0, 10 ** 9])
+def test_proximity_strategies_agree(session, monkeypatch, walk_cost):
+    # More chargers than the probe holds, walked by distance (cost 0) or all ordered
+    brands = ["Orlen", "GreenWay", "Ionity"]
+    towns = ["Warszawa", "Kraków", "Gdańsk", "Łódź"]
+    crud.update_db(session, [
+        charger(f"g{i}", f"{brands[i % 3]} {i}", brands[i % 3], "Polna", towns[i % 4], f"{i:02d}-100",
+                49.0 + (i * 37 % 100) / 20, 14.0 + (i * 53 % 100) / 10, DC if i % 2 else AC)
+        for i in range(300)
+    ])
+    monkeypatch.setattr(app_search, "PROBE_SIZE", 5)
+    monkeypatch.setattr(app_search, "WALK_COST", walk_cost)
+    for text, min_power in [("orlen", None), ("green krak", None), ("ionity", 50), ("gdańsk polna", None)]:
+        query = crud.query_chargers(session, min_power=min_power)
+        terms = search_terms(text)
+        expected = [
+            (charger.id, calculate_distance(52.0, 19.0, charger.latitude, charger.longitude))
+            for charger in TextSearchBackend().match(query, terms)
+            if FTS5SearchBackend().matches([getattr(charger, column) for column in SEARCH_COLUMNS], terms)
+        ]
+        expected.sort(key=lambda item: (item[1], item[0]))
+        found = nearest_matches(session, query, terms, 52.0, 19.0, 7, filtered=min_power is not None)
+        assert [charger_id for charger_id, _ in found] == [charger_id for charger_id, _ in expected[:7]]
+
+
+def test_relevance_ranking(session):
+    plaza = charger("e", "Mokotów Plaza", "Elocity", "Mokotowska", "Warszawa", "00-640", 52.21, 21.02, AC)
+    crud.update_db(session, [*CHARGERS, plaza])
+    # Named and addressed after the searched word, ahead of the charger with a lower ID
+    assert names(search(session, "mokot")) == ["Mokotów Plaza", "Galeria Mokotów"]
+
+    # The fallback puts names starting with a term first
+    backend = TextSearchBackend()
+    terms = search_terms("warszawa mokot")
+    query = backend.match(session.query(EVCharger), terms).order_by(*backend.relevance(terms))
+    assert [charger.name for charger in query] == ["Mokotów Plaza", "Galeria Mokotów"]
+
+
+def test_search_applies_filters(session):
+    assert names(search(session, "warszawa", min_power=50)) == ["Orlen Marszałkowska"]
+    assert names(search(session, "warszawa", connector_types=["IEC62196Type2Outlet"])) == ["Galeria Mokotów"]
+
+
+def test_index_follows_update_db(session):
+    renamed = charger("b", "Galeria Północna", "GreenWay", "Światowida", "Warszawa", "03-144", 52.32, 20.96, AC)
+    crud.update_db(session, [*CHARGERS[:1], renamed, *CHARGERS[2:]])
+    assert search(session, "mokot") == []
+    assert names(search(session, "półn")) == ["Galeria Północna"]
+
+    crud.delete_charger(session, "b")
+    assert search(session, "galeria") == []
+
+
+def test_fallback_matches_without_index(session):
+    backend = TextSearchBackend()
+    query = backend.match(session.query(EVCharger), search_terms("orlen opol"))
+    assert [charger.name for charger in query] == ["Orlen Kraków Opolska"]
+
+
+def test_tsvector_query():
+    backend = TSVectorSearchBackend()
+    compiled = backend.match(Session().query(EVCharger), ["orlen", "kra"]).statement.compile(dialect=postgresql.dialect())
+    assert "ev_chargers.search_vector @@ to_tsquery(" in str(compiled)
+    assert "orlen:* & kra:*" in compiled.params.values()
+    ordered = backend.match(Session().query(EVCharger), ["orlen"]).order_by(*backend.relevance(["orlen"]))
+    compiled = ordered.statement.compile(dialect=postgresql.dialect())
+    assert "ORDER BY ts_rank(ev_chargers.search_vector, to_tsquery(" in str(compiled)
+
+
+def test_search_requires_a_word():
+    with pytest.raises(HTTPException) as error:
+        get_chargers_search(q="a -", db=None)
+    assert error.value.status_code == 400
+
+
+def test_search_route():
+    # The test database has no text index, the fallback answers
+    response = client.get("/api/chargers/search", params={"q": "charger", "limit": 3})
+    assert response.status_code == 200
+    assert len(response.json()) <= 3
@@ -0,0 +1,30 @@
+from datetime import datetime
+from decimal import Decimal
+import json
+from app.serialization import FastJSONResponse, dumps, row_class, to_rows
+
+
+def test_row_class_is_cached_and_slotted():
+    cls = row_class(("id", "name"))
+    assert row_class(("id", "name")) is cls
+    row = cls(1, "Charger")
+    assert not hasattr(row, "__dict__")
+
+
+def test_dumps_rows():
+    rows = to_rows([(1, "Zażółć", 52.2), (2, None, 50.1)], ("id", "name", "latitude"))
+    assert json.loads(dumps(rows)) == [
+        {"id": 1, "name": "Zażółć", "latitude": 52.2},
+        {"id": 2, "name": None, "latitude": 50.1},
+    ]
+
+
+def test_dumps_falls_back_to_jsonable_encoder():
+    payload = {1: Decimal("22.5"), "at": datetime(2024, 1, 2, 3, 4, 5)}
+    assert json.loads(dumps(payload)) == {"1": 22.5, "at": "2024-01-02T03:04:05"}
+
+
+def test_fast_json_response():
+    response = FastJSONResponse(to_rows([(1,)], ("id",)))
+    assert response.body == b'[{"id":1}]'
+    assert response.media_type == "application/json"
@@ -0,0 +1,73 @@
+import random
+import numpy as np
+import pytest
+from app.spatial import ChargerIndex
+from app.geo import calculate_distance, haversine_km, top_k
+
+random.seed(42)
+POINTS = [(i, random.uniform(49.0, 55.0), random.uniform(14.0, 24.0)) for i in range(2000)]
+index = ChargerIndex(POINTS)
+
+def brute_force(lat, lon, k=None, radius_km=None, allowed=None):
+    result = sorted(
+        ((charger_id, calculate_distance(lat, lon, c_lat, c_lon)) for charger_id, c_lat, c_lon in POINTS
+         if allowed is None or charger_id in allowed),
+        key=lambda item: item[1]
+    )
+    if radius_km is not None:
+        result = [item for item in result if item[1] <= radius_km]
+    return result[:k] if k is not None else result
+
+def assert_same_result(found, expected):
+    assert [charger_id for charger_id, _ in found] == [charger_id for charger_id, _ in expected]
+    assert [distance for _, distance in found] == pytest.approx([distance for _, distance in expected])
+
+def test_nearest_matches_brute_force():
+    for lat, lon in [(52.23, 21.01), (50.06, 19.94), (54.35, 18.65), (60.0, 30.0)]:
+        assert_same_result(index.nearest(lat, lon, k=10), brute_force(lat, lon, k=10))
+
+def test_radius_matches_brute_force():
+    assert_same_result(index.nearest(52.23, 21.01, radius_km=40), brute_force(52.23, 21.01, radius_km=40))
+
+def test_nearest_with_allowed_ids():
+    allowed = set(range(0, 2000, 7))
+    assert_same_result(index.nearest(51.1, 17.03, k=5, allowed=allowed), brute_force(51.1, 17.03, k=5, allowed=allowed))
+
+def test_empty_index():
+    assert ChargerIndex([]).nearest(52.0, 21.0, k=5) == []
+
+def test_haversine_matches_scalar_distance():
+    lats = np.array([p[1] for p in POINTS])
+    lons = np.array([p[2] for p in POINTS])
+    expected = [calculate_distance(52.23, 21.01, lat, lon) for _, lat, lon in POINTS]
+    assert haversine_km(52.23, 21.01, lats, lons).tolist() == pytest.approx(expected)
+
+def test_top_k_returns_smallest_in_order():
+    distances = np.array([5.0, 1.0, 4.0, 2.0, 3.0])
+    assert top_k(distances, 3).tolist() == [1, 3, 4]
+    assert top_k(distances).tolist() == [1, 3, 4, 2, 0]
+
+def test_nearest_pages_continue_after_cursor():
+    first_page = index.nearest(52.23, 21.01, k=20)
+    last_id, last_distance = first_page[-1]
+    second_page = index.nearest(52.23, 21.01, k=20, after=(last_distance, last_id))
+    assert [charger_id for charger_id, _ in first_page + second_page] == \
+        [charger_id for charger_id, _ in brute_force(52.23, 21.01, k=40)]
+
+def test_top_k_breaks_ties_by_id():
+    distances = np.array([2.0, 1.0, 1.0, 1.0, 1.0, 0.5])
+    ids = np.array([6, 5, 2, 4, 3, 1])
+    assert top_k(distances, 3, ids).tolist() == [5, 2, 4]
+
+def test_nearest_pages_through_tied_chargers():
+    # Many chargers at one spot, the cursor has to step through them by ID
+    tied = ChargerIndex([(i, 52.0, 19.0) for i in range(40, 0, -1)] + [(41, 52.01, 19.0)])
+    seen = []
+    after = None
+    while True:
+        page = tied.nearest(52.0, 19.0, k=5, after=after)
+        if not page:
+            break
+        seen.extend(charger_id for charger_id, _ in page)
+        after = (page[-1][1], page[-1][0])
+    assert seen == list(range(1, 42))
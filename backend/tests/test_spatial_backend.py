@@ -0,0 +1,164 @@
+import random
+from math import asin, atan2, cos, degrees, radians, sin
+import pytest
+from sqlalchemy import create_engine, event, insert, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app import crud
+from app.geo import EARTH_RADIUS_KM
+from app.migrations import migrate
+from app.models import EVCharger
+from app.routers.chargers import list_chargers
+from app.spatial import build_charger_index
+from app.spatial_backend import (
+    KNN_MAX_ROUNDS, DatabaseSpatialBackend, PostGISSpatialBackend, RTreeSpatialBackend, SpatialBackend, bounding_box,
+    charger_rtree, detect_spatial_backend
+)
+
+random.seed(7)
+POINTS = [(i, random.uniform(49.0, 55.0), random.uniform(14.0, 24.0)) for i in range(1, 2001)]
+backend = RTreeSpatialBackend()
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(EVCharger.__table__), [
+            {"id": i, "external_id": f"ext-{i}", "name": f"Charger {i}", "latitude": lat, "longitude": lon,
+             "max_power_kw": 50.0 if i % 3 == 0 else 22.0, "min_power_kw": 22.0, "connector_mask": 0}
+            for i, lat, lon in POINTS
+        ])
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.rollback()
+    session.close()
+
+
+def assert_same_result(found, expected):
+    assert [charger_id for charger_id, _ in found] == [charger_id for charger_id, _ in expected]
+    assert [distance for _, distance in found] == pytest.approx([distance for _, distance in expected])
+
+
+def test_rtree_is_detected(engine):
+    assert isinstance(detect_spatial_backend(engine), RTreeSpatialBackend)
+    assert type(detect_spatial_backend(create_engine("sqlite://"))) is SpatialBackend
+
+
+def test_nearest_matches_in_process_index(session):
+    index = build_charger_index(session)
+    query = session.query(EVCharger)
+    # The last point is far outside the data, the search circle has to grow several times
+    for lat, lon in [(52.23, 21.01), (50.06, 19.94), (49.0, 14.0), (60.0, 30.0)]:
+        assert_same_result(backend.nearest(query, lat, lon, k=10), index.nearest(lat, lon, k=10))
+    assert_same_result(backend.nearest(query, 52.23, 21.01, radius_km=40), index.nearest(52.23, 21.01, radius_km=40))
+    assert_same_result(backend.nearest(query, 52.23, 21.01, k=5, radius_km=40), index.nearest(52.23, 21.01, k=5, radius_km=40))
+
+
+def test_generic_database_backend_matches_in_process_index(session):
+    index = build_charger_index(session)
+    generic = DatabaseSpatialBackend()
+    query = session.query(EVCharger)
+    assert_same_result(generic.nearest(query, 52.23, 21.01, k=10), index.nearest(52.23, 21.01, k=10))
+    assert_same_result(generic.nearest(query, 50.06, 19.94, radius_km=30), index.nearest(50.06, 19.94, radius_km=30))
+
+
+def test_nearest_applies_filters_and_keyset(session):
+    index = build_charger_index(session)
+    query = crud.query_chargers(session, min_power=50)
+    allowed = {i for i, _, _ in POINTS if i % 3 == 0}
+    first = backend.nearest(query, 51.1, 17.03, k=5)
+    assert_same_result(first, index.nearest(51.1, 17.03, k=5, allowed=allowed))
+    after = (first[-1][1], first[-1][0])
+    assert_same_result(
+        backend.nearest(query, 51.1, 17.03, k=5, after=after),
+        index.nearest(51.1, 17.03, k=5, allowed=allowed, after=after)
+    )
+
+
+def test_nearest_issues_bounded_statements(engine, session):
+    index = build_charger_index(session)
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        # Far from the data and filtered, every grown circle comes back short
+        found = backend.nearest(crud.query_chargers(session, min_power=50), 80.0, -60.0, k=20)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    allowed = {i for i, _, _ in POINTS if i % 3 == 0}
+    assert_same_result(found, index.nearest(80.0, -60.0, k=20, allowed=allowed))
+    assert len(statements) <= KNN_MAX_ROUNDS
+
+
+def test_listing_pages_through_rtree(session):
+    rows, headers = list_chargers(session, 52.23, 21.01, 50, None, None, 3, None, None, ["id", "distance_km"])
+    expected = backend.nearest(crud.query_chargers(session, min_power=50), 52.23, 21.01, k=6)
+    assert [row.id for row in rows] == [charger_id for charger_id, _ in expected[:3]]
+    rows, _ = list_chargers(session, 52.23, 21.01, 50, None, None, 3, None, headers["X-Next-Cursor"], ["id", "distance_km"])
+    assert [row.id for row in rows] == [charger_id for charger_id, _ in expected[3:]]
+
+
+def test_bounds_match_between(session):
+    found = crud.get_chargers_in_bounds(session, (52.5, 21.5), (52.0, 20.5))
+    expected = [i for i, lat, lon in POINTS if 52.0 <= lat <= 52.5 and 20.5 <= lon <= 21.5]
+    assert sorted(charger.id for charger in found) == expected
+
+
+def destination(lat, lon, bearing, distance_km):
+    angle = distance_km / EARTH_RADIUS_KM
+    lat1, lon1, bearing = radians(lat), radians(lon), radians(bearing)
+    lat2 = asin(sin(lat1) * cos(angle) + cos(lat1) * sin(angle) * cos(bearing))
+    lon2 = lon1 + atan2(sin(bearing) * sin(angle) * cos(lat1), cos(angle) - sin(lat1) * sin(lat2))
+    return degrees(lat2), degrees(lon2)
+
+
+def test_bounding_box_holds_the_circle():
+    for lat in (0.0, 54.0, 75.0):
+        south, west, north, east = bounding_box(lat, 18.0, 50)
+        points = [destination(lat, 18.0, bearing / 10, 50) for bearing in range(3600)]
+        assert all(south - 1e-9 <= p_lat <= north + 1e-9 and west - 1e-9 <= p_lon <= east + 1e-9 for p_lat, p_lon in points)
+        # The box is tight: the circle touches every edge
+        assert min(p_lat for p_lat, _ in points) == pytest.approx(south, abs=1e-4)
+        assert max(p_lon for _, p_lon in points) == pytest.approx(east, abs=1e-4)
+    assert bounding_box(89.0, 0.0, 500)[1:] == (-180.0, 90.0, 180.0)
+    assert bounding_box(0.0, 179.9, 50)[1::2] == (-180.0, 180.0)
+    assert bounding_box(0.0, -179.9, 50)[1::2] == (-180.0, 180.0)
+
+
+def test_radius_crosses_antimeridian(session):
+    session.execute(insert(EVCharger.__table__), [
+        {"id": 5001, "external_id": "ext-5001", "name": "Taveuni", "latitude": -16.8, "longitude": -179.95,
+         "max_power_kw": 22.0, "min_power_kw": 22.0, "connector_mask": 0},
+    ])
+    for nearest in (backend.nearest, DatabaseSpatialBackend().nearest):
+        found = nearest(session.query(EVCharger), -16.8, 179.95, radius_km=20)
+        assert [charger_id for charger_id, _ in found] == [5001]
+        assert found[0][1] == pytest.approx(10.65, abs=0.01)
+
+
+def test_triggers_keep_rtree_in_sync(session):
+    session.execute(update(EVCharger).where(EVCharger.id == 1).values(latitude=10.0, longitude=10.0))
+    session.execute(EVCharger.__table__.delete().where(EVCharger.id == 2))
+    rows = dict(session.execute(charger_rtree.select().with_only_columns(charger_rtree.c.id, charger_rtree.c.min_lat)).all())
+    assert rows[1] == pytest.approx(10.0)
+    assert 2 not in rows
+    assert backend.nearest(session.query(EVCharger), 10.0, 10.0, k=1)[0] == (1, 0.0)
+
+
+def test_postgis_pushes_ordering_into_the_database(session):
+    statement = PostGISSpatialBackend().nearest_query(
+        session.query(EVCharger), 52.23, 21.01, k=10, radius_km=40, after=(1.5, 7)
+    ).statement
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert "ST_DWithin(ev_chargers.geog" in sql
+    assert "ORDER BY ev_chargers.geog <-> geography(ST_SetSRID(ST_MakePoint(" in sql
+    assert "LIMIT" in sql
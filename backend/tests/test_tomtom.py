@@ -0,0 +1,166 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import httpx
+import pytest
+from app.tomtom import AvailabilityClient, AVAILABILITY_PATH
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.2
+    requests = []
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        availability_id = parse_qs(url.query)["chargingAvailability"][0]
+        with StubHandler.lock:
+            StubHandler.requests.append(availability_id)
+            StubHandler.active += 1
+            StubHandler.max_active = max(StubHandler.max_active, StubHandler.active)
+        time.sleep(self.delay)
+        with StubHandler.lock:
+            StubHandler.active -= 1
+        if url.path != AVAILABILITY_PATH or availability_id == "broken":
+            self.send_response(500)
+            self.end_headers()
+            return
+        body = json.dumps({
+            "connectors": [{
+                "type": "IEC62196Type2CCS",
+                "availability": {"current": {"available": 1, "occupied": 2, "reserved": 0, "outOfService": 0}},
+            }]
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url():
+    StubHandler.requests = []
+    StubHandler.delay = 0.2
+    StubHandler.max_active = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    # Wait for in-flight handlers on close so they do not leak into the next test
+    server.daemon_threads = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_status(stub_url):
+    client = AvailabilityClient(base_url=stub_url, api_key="test")
+
+    async def run():
+        try:
+            return await client.get_status("abc")
+        finally:
+            await client.aclose()
+
+    status = asyncio.run(run())
+    assert status["IEC62196Type2CCS"]["available"] == 1
+
+
+def test_concurrent_lookups_are_coalesced(stub_url):
+    client = AvailabilityClient(base_url=stub_url, api_key="test")
+
+    async def run():
+        try:
+            return await asyncio.gather(*(client.get_status("abc") for _ in range(10)))
+        finally:
+            await client.aclose()
+
+    results = asyncio.run(run())
+    assert len(results) == 10
+    assert StubHandler.requests == ["abc"]
+
+
+def test_results_are_cached(stub_url):
+    client = AvailabilityClient(base_url=stub_url, api_key="test", ttl=60)
+
+    async def run():
+        try:
+            await client.get_status("abc")
+            await client.get_status("abc")
+            await client.get_status("def")
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+    assert StubHandler.requests == ["abc", "def"]
+
+
+def test_upstream_error(stub_url):
+    client = AvailabilityClient(base_url=stub_url, api_key="test")
+
+    async def run():
+        try:
+            await client.get_status("broken")
+        finally:
+            await client.aclose()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run())
+
+
+def test_upstream_timeout(stub_url):
+    StubHandler.delay = 1.0
+    client = AvailabilityClient(base_url=stub_url, api_key="test", timeout=httpx.Timeout(0.2))
+
+    async def run():
+        try:
+            await client.get_status("abc")
+        finally:
+            await client.aclose()
+
+    with pytest.raises(httpx.TimeoutException):
+        asyncio.run(run())
+
+
+def test_batch_lookup_is_bounded_and_reports_failures(stub_url):
+    StubHandler.delay = 0.1
+    client = AvailabilityClient(base_url=stub_url, api_key="test")
+    availability_ids = [f"id-{i}" for i in range(12)] + ["id-0", "broken"]
+
+    async def run():
+        try:
+            return await client.get_statuses(availability_ids, concurrency=4)
+        finally:
+            await client.aclose()
+
+    statuses = asyncio.run(run())
+    assert len(StubHandler.requests) == 13
+    assert StubHandler.max_active <= 4
+    assert isinstance(statuses["broken"], httpx.HTTPStatusError)
+    assert statuses["id-5"]["IEC62196Type2CCS"]["occupied"] == 2
+
+
+def test_pool_is_closed_with_its_event_loop(stub_url):
+    StubHandler.delay = 0
+    client = AvailabilityClient(base_url=stub_url, api_key="test", ttl=0)
+    pools = []
+
+    async def run(availability_id):
+        await client.get_status(availability_id)
+        pools.append(client._client)
+
+    # A new loop gets a new pool, the one of the finished loop must not be left open
+    asyncio.run(run("abc"))
+    assert pools[0].is_closed
+    asyncio.run(run("def"))
+    assert pools[1] is not pools[0]
+    assert pools[1].is_closed
+    assert StubHandler.requests == ["abc", "def"]
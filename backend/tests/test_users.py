@@ -47,7 +47,7 @@ def test_reset_password():
     assert response.status_code == 200
     data = response.json()
     assert "message" in data
-    assert data["message"] == "Password reset successful, email sent."
+    assert data["message"] == "Password reset code sent."
 
 def test_reset_password_not_found():
     response = client.post("/api/reset-password", json={"email": "random@email.xyz"})
@@ -33,7 +33,11 @@ class ForgotPassword extends StatefulWidget {
 
 class _ForgotPasswordState extends State<ForgotPassword> {
   final TextEditingController _emailController = TextEditingController();
+  final TextEditingController _codeController = TextEditingController();
+  final TextEditingController _passwordController = TextEditingController();
   bool _isLoading = false;
+  // The email with the reset code was sent, the code and a new password are asked for next
+  bool _codeSent = false;
 
   void _resetPassword() async {
     String email = _emailController.text;
@@ -61,6 +65,51 @@ class _ForgotPasswordState extends State<ForgotPassword> {
           message: 'Password reset email sent',
           backgroundColor: Colors.green,
           icon: Icons.check);
+      _codeSent = true;
+    } else {
+      CoolSnackbar.show(context,
+          message: 'Error: ${response.body}',
+          backgroundColor: Colors.redAccent,
+          icon: Icons.error);
+    }
+
+    setState(() {
+      _isLoading = false;
+    });
+  }
+
+  void _confirmReset() async {
+    String code = _codeController.text.trim();
+    String password = _passwordController.text;
+
+    if (code.isEmpty || password.length < 8) {
+      CoolSnackbar.show(context,
+          message: 'Enter the code and a password of at least 8 characters',
+          backgroundColor: Colors.orangeAccent,
+          icon: Icons.warning);
+      return;
+    }
+
+    setState(() {
+      _isLoading = true;
+    });
+
+    final response = await http.post(
+      Uri.parse('${dotenv.env['API_URL']}/api/reset-password/confirm'),
+      headers: {'Content-Type': 'application/json'},
+      body: jsonEncode({
+        'email': _emailController.text,
+        'code': code,
+        'password': password,
+      }),
+    );
+    if (!mounted) return;
+    if (response.statusCode == 200) {
+      CoolSnackbar.show(context,
+          message: 'Password changed, you can log in now',
+          backgroundColor: Colors.green,
+          icon: Icons.check);
+      Navigator.of(context).maybePop();
     } else {
       CoolSnackbar.show(context,
           message: 'Error: ${response.body}',
@@ -118,9 +167,37 @@ class _ForgotPasswordState extends State<ForgotPassword> {
                         prefixIcon: const Icon(Icons.email),
                       ),
                     ),
+                    if (_codeSent) ...[
+                      const SizedBox(height: 16),
+                      TextField(
+                        controller: _codeController,
+                        textCapitalization: TextCapitalization.characters,
+                        decoration: InputDecoration(
+                          labelText: 'Code from the email',
+                          border: OutlineInputBorder(
+                            borderRadius: BorderRadius.circular(12),
+                          ),
+                          prefixIcon: const Icon(Icons.pin),
+                        ),
+                      ),
+                      const SizedBox(height: 16),
+                      TextField(
+                        controller: _passwordController,
+                        obscureText: true,
+                        decoration: InputDecoration(
+                          labelText: 'New password',
+                          border: OutlineInputBorder(
+                            borderRadius: BorderRadius.circular(12),
+                          ),
+                          prefixIcon: const Icon(Icons.lock),
+                        ),
+                      ),
+                    ],
                     const SizedBox(height: 24),
                     OutlinedButton(
-                      onPressed: _isLoading ? null : _resetPassword,
+                      onPressed: _isLoading
+                          ? null
+                          : (_codeSent ? _confirmReset : _resetPassword),
                       style: OutlinedButton.styleFrom(
                         padding: const EdgeInsets.symmetric(
                           horizontal: 32,
@@ -138,9 +215,9 @@ class _ForgotPasswordState extends State<ForgotPassword> {
                           ? const CircularProgressIndicator(
                               color: Colors.green,
                             )
-                          : const Text(
-                              'Reset Password',
-                              style: TextStyle(color: Colors.green),
+                          : Text(
+                              _codeSent ? 'Set New Password' : 'Reset Password',
+                              style: const TextStyle(color: Colors.green),
                             ),
                     ),
                   ],
@@ -13,6 +13,7 @@ import 'filter_view.dart';
 import 'favorites_view.dart';
 import 'charger_details_view.dart';
 import 'account_widget.dart';
+import 'marker_feed.dart';
 
 class MapPage extends StatefulWidget {
   const MapPage({super.key});
@@ -75,26 +76,16 @@ class _MapPageState extends State<MapPage> {
     if (connectorType != null && connectorType!.isNotEmpty) {
       queryParams['connector_types'] = connectorType!;
     }
-
-    final uri = Uri.parse('${dotenv.env['API_URL']}/api/chargers').replace(
-      queryParameters: queryParams,
-    );
+    final uri = Uri.parse('${dotenv.env['API_URL']}/api/chargers/markers')
+        .replace(queryParameters: queryParams);
 
     final response = await http.get(uri);
 
-    if (response.statusCode == 200) {
-      List<dynamic> data = json.decode(response.body);
-      return data.map((charger) {
-        return {
-          'id': charger['id'],
-          'latitude': charger['latitude'],
-          'longitude': charger['longitude'],
-          'name': charger['name'],
-        };
-      }).toList();
-    } else {
+    if (response.statusCode != 200) {
       throw Exception('Failed to load chargers');
     }
+
+    return decodeMarkerFeed(response.bodyBytes);
   }
 
   Future<void> _getCurrentLocation() async {
@@ -0,0 +1,60 @@
+import 'dart:convert';
+import 'dart:typed_data';
+
+const _magic = 'EVMK';
+const _formatVersion = 1;
+const _coordinateScale = 1000000.0;
+
+// Decodes the binary feed served by /api/chargers/markers into
+// maps with id, latitude, longitude and name.
+List<Map<String, dynamic>> decodeMarkerFeed(Uint8List bytes) {
+  final data = ByteData.sublistView(bytes);
+  if (ascii.decode(bytes.sublist(0, 4)) != _magic ||
+      data.getUint16(4, Endian.little) != _formatVersion) {
+    throw const FormatException('Not a marker feed');
+  }
+  final count = data.getUint32(8, Endian.little);
+  final stringCount = data.getUint32(12, Endian.little);
+
+  var offset = 16;
+  int readVarint() {
+    var value = 0;
+    var shift = 0;
+    while (true) {
+      final byte = bytes[offset++];
+      value |= (byte & 0x7F) << shift;
+      if (byte < 0x80) return value;
+      shift += 7;
+    }
+  }
+
+  final latitudesOffset = offset;
+  final longitudesOffset = offset + 4 * count;
+  offset += 8 * count;
+
+  final ids = List<int>.filled(count, 0);
+  var id = 0;
+  for (var i = 0; i < count; i++) {
+    id += readVarint();
+    ids[i] = id;
+  }
+  final nameIndex = List<int>.generate(count, (_) => readVarint());
+
+  final lengths = List<int>.generate(stringCount, (_) => readVarint());
+  final strings = <String>[];
+  for (final length in lengths) {
+    strings.add(utf8.decode(bytes.sublist(offset, offset + length)));
+    offset += length;
+  }
+
+  return List<Map<String, dynamic>>.generate(count, (i) {
+    return {
+      'id': ids[i],
+      'latitude':
+          data.getInt32(latitudesOffset + 4 * i, Endian.little) / _coordinateScale,
+      'longitude':
+          data.getInt32(longitudesOffset + 4 * i, Endian.little) / _coordinateScale,
+      'name': strings[nameIndex[i]],
+    };
+  });
+}